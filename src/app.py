@@ -7,25 +7,42 @@ Description and explanations for the code will be placed her
 - callbacks must be on this module
 - selectors must not have a None default value
 - for debugging mode change the value of DEBUG in the constants.py
-- app.run(debug=DEBUG)  must be commented out when deploying on a server
+- app.run(debug=DEBUG) is the development server, deploy with a WSGI server instead (see wsgi.py)
 """
 
 
-from dash import Dash, html, Input, Output, State, callback, ctx, no_update
+import gc
+import sys
+import traceback
+from functools import wraps, partial
+from itertools import product
+from collections import OrderedDict
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+from dash import Dash, dcc, html, Input, Output, State, callback, ctx, no_update, set_props
+from dash import clientside_callback, ClientsideFunction
 from dash.exceptions import PreventUpdate
 #import dash_bootstrap_components as dbc
 
 from units import css, header, unit_0, unit_1, unit_2, unit_3, unit_4, unit_5, unit_6, unit_7, unit_8, footer
-from data_access import check_account
-from data_processing import get_dataframes
-from data_filtering import subset_data_by_dates, subset_data_by_selector_values
-from table_toolkit import read_json, to_json, to_list_of_dicts
-from table_toolkit import make_statistics_table, make_diary_table, prettify_diary_table, make_probably_bad_foods_table
-from developer_toolkit import get_callback_args, get_default_values, make_handy_namespace
+from units import unit_tabs, unit_tabs_content
+from data_access import check_account, get_sqlalchemy_engine
+from data_processing import load_account, write_store, get_incidence_matrix, get_food_counters, get_day_table
+from data_processing import publish_table, get_published_table, get_diary, write_subset, read_subset
+from counters import FOODS, BASKETS, PAIRS, TRIPLES
+from data_filtering import subset_data_by_dates, subset_data_by_selector_values, subset_incidence_matrix
+from table_toolkit import to_list_of_dicts, query_frame, get_page, DIARY_COLUMNS
+from table_toolkit import make_statistics_table, prettify_diary_table, make_probably_bad_foods_table
+from developer_toolkit import get_callback_args, get_default_values, make_handy_namespace, get_dash_components_from_unit
+from developer_toolkit import get_selector_values
 from computations import get_dates_range
-from plotting_toolkit import make_figure
+from plotting_toolkit import make_figure_3, make_figure_4, make_figure_5, make_figure_6, make_figure_7
+from plotting_toolkit import make_figure_patch, warm_up_plotly
+from caching import figure_cache, background_manager, single_flight, make_fingerprint
+from registry import unit_registry
 
-from constants import DEBUG, ERR_PREFIX, ACCOUNT, A, B, C, D, E  # values of selectors for reference
+from constants import FIGURE_PATCH, BACKGROUND_INTERVAL, PREFETCH, PREFETCH_WORKERS, LAZY_UNITS, APPROXIMATE_MODE
+from constants import DEBUG, ERR_PREFIX, ACCOUNT, DISPLAYNAME, A, B, C, D, E  # values of selectors for reference
 
 
 # Instantiate an application object
@@ -46,6 +63,148 @@ app.layout = html.Div([header,
                        footer], 
                        style=css)
 
+# LAZY_UNITS: units 2-8 on tabs - a unit is in the layout (i.e. its callback fires) only while its tab is open
+# (see update_unit_tabs). The full layout is still used to validate the callbacks
+LAZY_UNITS_BY_ID = {unit.id: unit for unit in (unit_2, unit_3, unit_4, unit_5, unit_6, unit_7, unit_8)}
+if LAZY_UNITS:
+    app.validation_layout = app.layout
+    app.layout = html.Div([header, unit_0, unit_1, unit_tabs, unit_tabs_content, footer], style=css)
+
+
+
+##### HELPER FUNCTIONS #####
+
+def is_new_data(components):
+    """
+    Units 2-8: has the data been (re)loaded, i.e. a new account? (-> reset the selectors, send the whole figure)
+    Must be called from within a callback function (uses dash.ctx)
+    """
+    return ctx.triggered_id in (None, 'store_subset') and components.data_subset['new_data']
+
+
+
+def send_figure(fig, components):
+    """
+    Units 4, 5, 7: the whole figure on (re)load of the data, i.e. its "skeleton" with the template,
+    or if the unit has just been rendered (LAZY_UNITS: its tab opened -> no trigger, its graph is empty),
+    otherwise only the changes (dash.Patch, see make_figure_patch).
+    Must be called from within a callback function (uses dash.ctx)
+    """
+    if FIGURE_PATCH and ctx.triggered_id is not None and not is_new_data(components):
+        return make_figure_patch(fig)
+    return fig
+
+
+
+def make_figure_key(unit, components):
+    """
+    Units 3-7: the key of the unit's figure on the figure cache (the data, the dates, the unit's selectors)
+    components: see make_handy_namespace
+    """
+    i = len(components) - len(get_default_values(unit))
+    return figure_cache.make_key(unit.id, components.data_eating, components.data_symptomreport,
+                                 components.start_date, components.end_date, *components[i:])
+
+
+
+def build_unit_figure(unit, components, progress_id=None):
+    """
+    Units 3-7: makes the unit's figure as registered (see unit_registry.register below and registry.py) and caches it.
+    Made once if the callback and the prefetching (see prefetch_units) ask for it at the same time.
+    progress_id: the progress bar of a background callback (see report_progress)
+    Returns:
+        fig, the df behind it (for the table for debugging)
+    """
+    key = make_figure_key(unit, components)
+
+    def make():
+        fig, df = unit_registry.build(unit.id, components,
+                                      on_step=lambda step, steps: report_progress(progress_id, step, steps))
+        figure_cache.set(key, fig)
+        return fig, df
+
+    return single_flight.do(f"{unit.id}_figure", key, make)
+
+
+
+def get_unit_table(unit, components):
+    """
+    Units 2 and 8: the data of the unit's table (see UNIT_TABLES), from the figure cache or made and cached
+    (keyed like the figures, see make_figure_key), i.e. prefetched too (see prefetch_units).
+    Made once if the callback and the prefetching ask for it at the same time.
+    Returns:
+        list of dicts (the data of the DataTable)
+    """
+    key = make_figure_key(unit, components)
+    data = figure_cache.get(key)
+    if data is not None:
+        return data
+    return single_flight.do(f"{unit.id}_table", key, lambda: figure_cache.set(key, UNIT_TABLES[unit.id](components)))
+
+
+
+# The inputs of the artifacts of units 3-7 (see registry.py): the df subset by dates, the counters
+SUBSET_INPUTS = {'handle': 'data_subset', 'data_eating': 'data_eating', 'data_symptomreport': 'data_symptomreport'}
+COUNTERS_INPUTS = {'data_eating': 'data_eating', 'start_date': 'start_date', 'end_date': 'end_date'}
+
+
+
+def query_counters(data_eating, start_date, end_date, what, **selectors):
+    """
+    Units 4-7: the counts of the per-account counters (counters.py) if the whole history is selected 
+    and they count `what` (e.g. PAIRS, not 4 foods), None otherwise (-> computed by the plotting function)
+    Approximate mode: the pairs/triples are estimated (a CountMinSketch, see make_figure_7)
+    """
+    if what not in (FOODS, BASKETS, PAIRS, TRIPLES):
+        return None
+    counters = get_food_counters(data_eating)
+    if not counters.covers(start_date, end_date):
+        return None
+    if APPROXIMATE_MODE and what in (PAIRS, TRIPLES):
+        return counters.query_sketch(what, **selectors)
+    return counters.query(what, **selectors)
+
+
+
+def background_args(progress_id, **kwargs):
+    """
+    The extra arguments for the `callback` decorator of a heavy callback (units 0 and 7):
+    runs in a background process with a progress bar (html.Progress, hidden otherwise) if there is 
+    a background manager (see BACKGROUND_CALLBACKS on constants.py), in the request as usual otherwise (-> {})
+    """
+    if background_manager is None:
+        return {}
+    return dict(background=True, manager=background_manager, interval=BACKGROUND_INTERVAL,
+                running=[(Output(progress_id, 'style'), {'display': 'inline'}, {'display': 'none'}),
+                         *kwargs.pop('running', [])],
+                **kwargs)
+
+
+
+def report_progress(progress_id, step, steps):
+    """
+    Moves the progress bar of a background callback (see background_args), does nothing otherwise
+    (or if progress_id is None, e.g. the figure is prefetched). 
+    Must be called from within a callback function (uses dash.set_props)
+    """
+    if background_manager is not None and progress_id is not None:
+        set_props(progress_id, {'value': step, 'max': steps})
+
+
+
+def coalesced(func):
+    """
+    Decorator for the callback functions of units 2-8 (under the `callback` decorator):
+    identical calls at the same time (e.g. several tabs on the same account, see SingleFlight on caching.py) 
+    run once - the subsetting, the computations and the plotting included.
+    The key: the arguments and the triggers (the callbacks depend on dash.ctx)
+    """
+    @wraps(func)
+    def wrapper(*components):
+        key = make_fingerprint(sorted(ctx.triggered_prop_ids), *components)
+        return single_flight.do(func.__name__, key, func, *components)
+    return wrapper
+
 
 
 ##### CALLBACK FUNCTIONS #####
@@ -57,13 +216,13 @@ app.layout = html.Div([header,
     Output(component_id='unit_1_selector_1', component_property='min_date_allowed'),       # date picker
     Output(component_id='unit_1_selector_1', component_property='max_date_allowed'),       # date picker
     Output(component_id='unit_1_selector_1', component_property='initial_visible_month'),  # date picker
-    Output(component_id='unit_8_table_1', component_property='data'),
     Output(component_id='store_1', component_property='data'),
     Output(component_id='store_2', component_property='data'),
-    Output(component_id='store_3', component_property='data'),
     Input(component_id='unit_0_button', component_property='n_clicks'),
     State(component_id='unit_0_inputbox', component_property='value'),
-    prevent_initial_call=True)
+    prevent_initial_call=True,
+    **background_args('unit_0_progress', 
+                      running=[(Output('unit_0_button', 'disabled'), True, False)]))  # no double loading
 def update_unit_0(n_clicks, value):
     """
     TODO: docs
@@ -80,38 +239,38 @@ def update_unit_0(n_clicks, value):
         raise PreventUpdate  # plotly-dash thing
     
     # Check the account
+    report_progress('unit_0_progress', 0, 3)
     res = check_account(account_id=value)
 
     if res is ValueError:  # will not be raised - just to tell that the input is bad - to avoid SQl injection
         unit_0_message_1 = "Ungültige Eingabe"
-        return (unit_0_message_1, *([no_update]*8))  # count the Output objects
+        return (unit_0_message_1, *([no_update]*6))  # count the Output objects
     elif res is None:
         unit_0_message_1 = f"{ACCOUNT} {value} nicht gefunden"
-        return (unit_0_message_1, *([no_update]*8))  # count the Output objects
+        return (unit_0_message_1, *([no_update]*6))  # count the Output objects
     elif res is False:
         unit_0_message_1 = f"Keine Informationen für {ACCOUNT} {value} vorhanden"
-        return (unit_0_message_1, *([no_update]*8))  # count the Output objects
+        return (unit_0_message_1, *([no_update]*6))  # count the Output objects
     else:
         unit_0_message_1 = ""
         unit_0_message_2 = f"Informationen über {ACCOUNT} {value}"  # h-tag header
 
 
     # Get the data from the data base
-    df_eating, df_symptoms, *_ = get_dataframes(account_id=value)  # returns two df's
-    
-    # Make the diary table 
-    df_diary = make_diary_table(df_eating, df_symptoms)
+    report_progress('unit_0_progress', 1, 3)
+    frames = load_account(account_id=value)   # {'eating': df_eating, 'symptoms': df_symptoms}
 
     # Get min max dates to prettify the date picker
-    min_date, max_date = get_dates_range(df_eating, df_symptoms)
+    min_date, max_date = get_dates_range(frames['eating'], frames['symptoms'])
 
-    # Get the data for the "Probably bad foods table"
-    data_probably_bad_foods = to_list_of_dicts(make_probably_bad_foods_table(df_eating))
+    # Store the data: on the server (the user's browser session gets a token) 
+    # or as str in json format in the user's browser session (see SERVER_SIDE_STORE on constants.py)
+    report_progress('unit_0_progress', 2, 3)
+    data_eating, data_symptomreport = write_store(value, frames)
 
-    # Store the data (as str in json format) in the user's browser session
-    json_eating = to_json(df_eating)  # str in json format
-    json_symptomreport = to_json(df_symptoms)  # str in json format
-    json_diary = to_json(df_diary)
+    # Make the figures ahead of time (PREFETCH) - not in a background process (its caches are not the app's)
+    if background_manager is None:
+        prefetch_units(data_eating, data_symptomreport, min_date.isoformat(), max_date.isoformat())
 
     # Update the corresponding dash components with these values:
     # (must correspond to the `Output` arguments in the decorator above)
@@ -120,92 +279,61 @@ def update_unit_0(n_clicks, value):
             min_date,                 #Output(component_id='unit_1_selector_1', component_property='min_date_allowed')
             max_date,                 #Output(component_id='unit_1_selector_1', component_property='max_date_allowed')
             max_date,                 #Output(component_id='unit_1_selector_1', component_property='initial_visible_month')
-            data_probably_bad_foods,  #Output(component_id='unit_8_table_1', component_property='data')
-            json_eating,              #Output(component_id='store_1', component_property='data')
-            json_symptomreport,       #Output(component_id='store_2', component_property='data')
-            json_diary)               #Output(component_id='store_3', component_property='data')
+            data_eating,              #Output(component_id='store_1', component_property='data')
+            data_symptomreport)       #Output(component_id='store_2', component_property='data')
 
 
 
 
 
-# UNIT 1: Zeitraum wählen
-@callback(get_callback_args(unit_1, parent=None))
-def update_unit_1(*components):
-    """
-    TODO: docs
-    The 2 selectors (date-range-picker and dropdown) are updated
-    either by the trigger on data saving (into users browser session)
-    or by the user manually
-    """
-    # which unit is this callback function for?
-    UNIT = unit_1
-
-    # initially data = None (before anything is stored into the user's browser session)
-    if None in components: 
-        raise PreventUpdate
-
-    # convert to namespace obejct for handy indexing, attr get/set, mutability and iterability
-    components = make_handy_namespace(components)  # for mutability, attr-access etc, iterability...
- 
-    # Read data fom json stored in user's browser session
-    df_eating = read_json(components.json_eating)
-    df_symptoms = read_json(components.json_symptomreport)
+# LAZY_UNITS: the unit on the open tab (its callbacks fire on its insertion into the layout, without a trigger)
+if LAZY_UNITS:
+    @callback(Output('unit_tabs_content', 'children'),
+              Input('unit_tabs', 'value'))
+    def update_unit_tabs(unit_id):
+        return LAZY_UNITS_BY_ID[unit_id]
 
 
-    ##### Updating the selectors (date range picker and dropdown) #####
-    # these values will be necessary for that:
-    
-    # default values for the selectors dynamically (to reset the selector on data reload)
-    default_values = get_default_values(UNIT)
 
-    # the number of default_values == the number of (updatable) selector in this unit
-    i = len(components) - len(default_values)  # will be used as index later
 
-    # min and max dates of the user's history for the date picker selector
-    min_date, max_date = get_dates_range(df_eating, df_symptoms)
 
-    ### If the function call is triggered by data being saved in the dcc.Store ###
-    # i.e. the user clicked the "Suchen" button and data was saved by `update_unit_0` unction
-    if ctx.triggered_id == 'store_1':
-        components[i:] = default_values
-        # update the date range picker to the min/max of the df at hand
-        components.start_date, components.end_date  = min_date, max_date
-    
-    ### If the function call is triggered by the user manually changing the selectors' values ###
-    # 'unit_1_selector_1' is the date picker
-    if ctx.triggered_id == 'unit_1_selector_1':  # the date picker range is the trigger
-        components.timespan_dropdown = default_values[2]   # reset the dropdown to its default
-    # 'unit_1_selector_2' is the dropdown menu
-    elif ctx.triggered_id == 'unit_1_selector_2':  # the drop down menu for time span
-        dropdown_value = components.timespan_dropdown
-        if dropdown_value == A:  # the date picker range values - the first/default option
-            return (*components[i:], no_update, no_update)
-        elif dropdown_value == B: # all history
-            components.start_date, components.end_date = min_date, max_date
-        elif dropdown_value == C:  # last 7*4*3 days of available data
-            components.start_date, components.end_date = get_dates_range(max_date, 7*4*3)
-        elif dropdown_value == D:  # last 7*4 days of available data
-            components.start_date, components.end_date = get_dates_range(max_date, 7*4)
-        elif dropdown_value == E:  # last 7 days of available data
-            components.start_date, components.end_date = get_dates_range(max_date, 7)
-        elif True:
-            "extend the logic here, in case the dropdown menu is extended with new options"
-    elif ctx.triggered_id == 'unit_1_selector_X':   # for example a new check-box on unit_1
-        "add functionality for unit_1_selector_X"
-        "you will find what you need" in components
-
-    #here? TODO
-    # make and save statistics (df_eating_subset_by_dates, df_symptoms_subset_by_dates)
+# UNIT 1: Zeitraum wählen
+# The 2 selectors (date-range-picker and dropdown) are updated either by the trigger on data saving 
+# (a new account -> the whole history) or by the user manually (the dates picked -> the dropdown reset, 
+# a time span picked -> the dates). In the browser (assets/unit_1.js): no round trip to the server.
+# The min/max dates of the account are published by update_unit_0 (the allowed dates of the date picker)
+clientside_callback(ClientsideFunction(namespace='unit_1', function_name='update_unit_1'),
+                    *get_callback_args(unit_1, parent=None),
+                    State('unit_1_selector_1', 'min_date_allowed'),
+                    State('unit_1_selector_1', 'max_date_allowed'))
+
+
+
+# The df's subset by the selected dates: made once and shared by units 2-8 (they are triggered by its handle)
+@callback(Output('store_subset', 'data'),
+          Input('store_1', 'data'),
+          Input('store_2', 'data'),
+          Input('unit_1_selector_1', 'start_date'),
+          Input('unit_1_selector_1', 'end_date'))
+def update_subset(data_eating, data_symptomreport, start_date, end_date):
+    """
+    output: the handle of the subset df's (see write_subset on data_processing.py)
+    """
+    if None in (data_eating, data_symptomreport, start_date, end_date):
+        raise PreventUpdate
 
-    # update the unit
-    return components[i:]  # the last i elements
+    # a new account -> the units reset their selectors and send the whole figures
+    new_data = bool({'store_1.data', 'store_2.data'} & set(ctx.triggered_prop_ids))
+    if new_data:
+        prefetch_units(data_eating, data_symptomreport, start_date, end_date)   # unless done on update_unit_0
+    return write_subset(data_eating, data_symptomreport, start_date, end_date, new_data=new_data)
  
 
 
 
 # UNIT 2: UNIT 2: Statistics / Usage overview
 @callback(get_callback_args(unit_2, parent=unit_1))
+@coalesced
 def update_unit_2(*components):
     """
     output: 1 element (unit_2_table_1.data)
@@ -218,43 +346,54 @@ def update_unit_2(*components):
         raise PreventUpdate
 
     # for mutability, attr-access etc, iterability
-    components = make_handy_namespace(components)
+    components = make_handy_namespace(components, has_subset=True)
  
     # Get the default values for the selectors (this code block is not needed - just for consistency)
     default_values = get_default_values(UNIT)
     i = len(components) - len(default_values)
     
     # Reset the selectors  (this code block is not needed - just for consistency)
-    if ctx.triggered_id == 'store_1':
+    if is_new_data(components):
         components[i:] = default_values
 
+    # The statistics table (cached, see get_unit_table)
+    data_statistics_table = get_unit_table(UNIT, components)
+
+    # update
+    return (*components[i:],        # []  but is there for consistency
+            data_statistics_table)
 
-    # Read data fom json stored in user's browser session
-    df_eating = read_json(components.json_eating)
-    df_symptoms = read_json(components.json_symptomreport)
 
-    # Subset the data by dates
-    df_eating_subset_dates = subset_data_by_dates(df_eating,
+
+def make_statistics_data(components):
+    """
+    Unit 2: the data of the statistics table (see get_unit_table)
+    """
+    # One row per day (computed once per account), subset by dates
+    df_days = get_day_table(components.data_eating, components.data_symptomreport)
+    df_days_subset_dates = subset_data_by_dates(df_days,
                                                 start_date=components.start_date,
                                                 end_date=components.end_date)
-    df_symptoms_subset_dates = subset_data_by_dates(df_symptoms,
-                                                         start_date=components.start_date,
-                                                         end_date=components.end_date)
+    return to_list_of_dicts(make_statistics_table(df_days_subset_dates))
+    
 
-    # Make the statistics table
-    df_statistics = make_statistics_table(df_eating_subset_dates, df_symptoms_subset_dates)
-    data_statistics_table = to_list_of_dicts(df_statistics)
 
-    # update
-    return (*components[i:],        # []  but is there for consistency
-            data_statistics_table)
-    
 
 
+# UNIT3: Diary - the figure (made by build_unit_figure, see registry.py)
+unit_registry.register(unit_3, make_figure_3,
+                       # The df's subset by dates (made once for units 2-8, see update_subset)
+                       artifacts=[('eating', partial(read_subset, name='eating'), SUBSET_INPUTS),
+                                  ('symptoms', partial(read_subset, name='symptoms'), SUBSET_INPUTS)],
+                       inputs={'df_eating': 'eating', 'df_symptoms': 'symptoms'},
+                       columns=('date', 'daytime', DISPLAYNAME),
+                       table='eating')
+
 
 
 # UNIT3: Diary (graph + table)
 @callback(get_callback_args(unit_3, parent=unit_1))
+@coalesced
 def update_unit_3(*components):
     """
     TODO docs
@@ -268,13 +407,8 @@ def update_unit_3(*components):
         raise PreventUpdate  # not actually raise but cought by plotly-dash
 
     # for mutability, attr get/set etc
-    components = make_handy_namespace(components)  # for mutability, attr-access etc, iterability...
+    components = make_handy_namespace(components, has_subset=True)  # for mutability, attr-access etc, iterability...
  
-    # Read data fom json stored in user's browser session
-    df_eating = read_json(components.json_eating)
-    df_symptoms = read_json(components.json_symptomreport)
-    df_diary = read_json(components.json_diary)
-
     # Get the default values for the selectors
     default_values = get_default_values(unit)   # len(default_values) == 0
     i = len(components) - len(default_values)   # just for consistency
@@ -282,39 +416,111 @@ def update_unit_3(*components):
     # This section would deal with updateing the selectors / setting their default values
     # but on this unit there are no selectors
 
-    # Filter the data in the df's
-    df_eating_subset_by_dates = subset_data_by_dates(df_eating, 
-                                                     start_date=components.start_date,
-                                                     end_date=components.end_date)
-    df_symptoms_subset_by_dates = subset_data_by_dates(df_symptoms, 
-                                                            start_date=components.start_date,
-                                                            end_date=components.end_date)
-    # make the plot
-    fig = make_figure(unit, 
-                      df_eating_subset_by_dates, df_symptoms_subset_by_dates,
-                      debugging_info=components)
-    #Diary table
-    df_diary_subset_by_dates = subset_data_by_dates(df_diary, 
-                                                    start_date=components.start_date,
-                                                    end_date=components.end_date)
-    df_diary_subset_by_dates = prettify_diary_table(df_diary_subset_by_dates)  # must be done exactly here
-    
-    # Convert to list of dicts to be passed into a plotly-dahs DataTable
-    data_diary = to_list_of_dicts(df_diary_subset_by_dates)
+    # Has this figure been made before? -> served from the cache (no pandas, no plotly)
+    fig = figure_cache.get(make_figure_key(unit, components))
+    if fig is not None:
+        return (*components[i:], fig, None)   # the debugging table is used in DEBUG mode only (no cache there)
 
-    # Data for the plotly-dash DataTable (in debug mode)
-    data_debugging_table = to_list_of_dicts(df_eating_subset_by_dates)
+    # Make the plot (as registered above) and cache it
+    fig, df_eating_subset_by_dates = build_unit_figure(unit, components)
+    # The diary table is paged on the server (see update_unit_3_table_0 below)
+
+    # The df for the plotly-dash DataTable (in debug mode) stays on the server, its key is sent
+    data_debugging_table = publish_table(unit.id, df_eating_subset_by_dates)
 
     # update the unit
     return (*components[i:],     # [] but is there for consistency
             fig,
-            data_diary,          # list of dicts for the diary table
             data_debugging_table)
 
 
 
+# UNIT3: the diary table - only the visible page is sent (paged, sorted and filtered on the server)
+@callback(Output('unit_3_table_0', 'data'),
+          Output('unit_3_table_0', 'page_count'),
+          Output('unit_3_table_0', 'page_current'),
+          Input('store_1', 'data'),                        # df_eating
+          Input('store_2', 'data'),                        # df_symptomreport
+          Input('unit_1_selector_1', 'start_date'),
+          Input('unit_1_selector_1', 'end_date'),
+          Input('unit_3_table_0', 'page_current'),
+          Input('unit_3_table_0', 'page_size'),
+          Input('unit_3_table_0', 'sort_by'),
+          Input('unit_3_table_0', 'filter_query'))
+def update_unit_3_table_0(data_eating, data_symptomreport, start_date, end_date, page_current, page_size, sort_by, filter_query):
+    """
+    The first page after new data or dates, otherwise the requested page
+    (the sorting and filtering are applied to the whole diary in the date range)
+    """
+    if None in (data_eating, data_symptomreport, start_date, end_date):
+        raise PreventUpdate
+
+    if ctx.triggered_id in ('store_1', 'store_2', 'unit_1_selector_1'):
+        page_current = 0
+
+    df_diary = get_diary(data_eating, data_symptomreport)   # made once per account
+    df_diary = subset_data_by_dates(df_diary, start_date=start_date, end_date=end_date)
+    df_diary = query_frame(df_diary, sort_by, filter_query, columns=DIARY_COLUMNS)
+    df_page, page_count, page_current = get_page(df_diary, page_current, page_size)
+    df_page = prettify_diary_table(df_page.copy())   # must be done exactly here (on the visible rows only)
+    return to_list_of_dicts(df_page), page_count, page_current
+
+
+
+def make_debug_table_callback(table_id):
+    """
+    The tables for debugging (see instantiate_debug_table on table_toolkit.py):
+    the unit's callback sends the key of the df (dcc.Store "<table id>_key", see publish_table),
+    this callback sends the visible page of that df
+    """
+    @callback(Output(table_id, 'data'),
+              Output(table_id, 'columns'),
+              Output(table_id, 'page_count'),
+              Output(table_id, 'page_current'),
+              Input(f"{table_id}_key", 'data'),
+              Input(table_id, 'page_current'),
+              Input(table_id, 'page_size'),
+              Input(table_id, 'sort_by'),
+              Input(table_id, 'filter_query'))
+    def update_debug_table(key, page_current, page_size, sort_by, filter_query):
+        df = get_published_table(key)
+        if df is None:
+            raise PreventUpdate
+
+        if ctx.triggered_id == f"{table_id}_key":
+            page_current = 0
+
+        df = query_frame(df, sort_by, filter_query)
+        df_page, page_count, page_current = get_page(df, page_current, page_size)
+        columns = [{'name': str(column), 'id': str(column)} for column in df.columns]
+        return to_list_of_dicts(df_page), columns, page_count, page_current
+
+    return update_debug_table
+
+
+for unit in (unit_3, unit_4, unit_5, unit_6, unit_7):
+    for e in get_dash_components_from_unit(unit):
+        if type(e) is dcc.Store and e.id.endswith('_key'):
+            make_debug_table_callback(e.id[:-len('_key')])
+
+
+# UNIT 4: Welche Lebensmittel sind am meisten konsumiert - the figure (made by build_unit_figure, see registry.py)
+unit_registry.register(unit_4, make_figure_4,
+                       selectors=('meals', 'symptoms'),
+                       # The df subset by dates (made once for units 2-8, see update_subset), then by the selectors on this unit
+                       artifacts=[('eating', partial(read_subset, name='eating'), SUBSET_INPUTS),
+                                  ('subset', subset_data_by_selector_values, {'df': 'eating', 'meals_selector': 'meals', 'symptom_selector': 'symptoms'}),
+                                  # The whole history is selected -> use the per-account counters instead of recomputing
+                                  ('counts', partial(query_counters, what=FOODS), {**COUNTERS_INPUTS, 'meals_selector': 'meals', 'symptom_selector': 'symptoms'})],
+                       inputs={'df': 'subset', 'color': 'symptoms', 'counts': 'counts'},
+                       columns=('date', 'daytime', DISPLAYNAME),
+                       table='subset')
+
+
+
 # UNIT 4: Welche Lebensmittel sind am meisten konsumiert
 @callback(get_callback_args(unit_4, parent=unit_1))
+@coalesced
 def update_unit_4(*components):
     """
     Use this code block as a template.
@@ -330,11 +536,12 @@ def update_unit_4(*components):
 
     For this to work:
      - pass your ‘unit‘ into the  ‘get_callback_args‘ function (see above)
+     - declare what its figure is made of with ‘unit_registry.register‘ (see above and registry.py)
      - assign your new unit to the UNIT constant variable below (UNIT = unit_n)
     (The ‘get_callback_args‘ function returns the arguments necessray for the decorator)
 
     Args:
-        data: jsonified pandas.DataFrame as str
+        data: the values of the stores (a token or a jsonified pandas.DataFrame as str)
         component_values: values passed in from the selectors
     
     Returns:
@@ -349,45 +556,52 @@ def update_unit_4(*components):
         raise PreventUpdate
 
     # for mutability, attr-access etc, iterability
-    components = make_handy_namespace(components)
+    components = make_handy_namespace(components, has_subset=True)
  
-    # Read data fom json stored in user's browser session
-    df_eating = read_json(components.json_eating)
-
     # Get the default values for the selectors
     default_values = get_default_values(unit)
     i = len(components) - len(default_values)  # will be used as index later
     
     # Reset the selectors if ‘store‘ is the trigger
-    if ctx.triggered_id == 'store_1':
+    if is_new_data(components):
         components[i:] = default_values
 
-    # Subset the data by dates
-    df_subset_dates = subset_data_by_dates(df_eating,
-                                           start_date=components.start_date,
-                                           end_date=components.end_date)
+    # Has this figure been made before? -> served from the cache (no pandas, no plotly)
+    fig = figure_cache.get(make_figure_key(unit, components))
+    if fig is not None:
+        return (*components[i:], send_figure(fig, components), None)   # the debugging table is used in DEBUG mode only (no cache there)
 
-    # Subset by the two selectors on this unit
-    df_subset_dates_and_selectors = subset_data_by_selector_values(df_subset_dates,
-                                                                   meals_selector=components.selector1,
-                                                                   symptom_selector=components.selector2)
-    # Make the plot
-    fig = make_figure(unit, df_subset_dates_and_selectors,
-                            color=components.selector2,      # all days/days with symptom...
-                            debugging_info=components)       # used in DEBUG mode
+    # Make the plot (as registered above) and cache it
+    fig, df_subset_dates_and_selectors = build_unit_figure(unit, components)
 
-    # Data for the plotly-dash DataTable (in debug mode)
-    data_debugging_table = to_list_of_dicts(df_subset_dates_and_selectors)
+    # The df for the plotly-dash DataTable (in debug mode) stays on the server, its key is sent
+    data_debugging_table = publish_table(unit.id, df_subset_dates_and_selectors)
 
     # update
     return (*components[i:], 
-            fig, 
+            send_figure(fig, components),   # only the changes on a selector change
             data_debugging_table)
 
 
 
+# UNIT 5: Welche Lebensmittel wurden unmittelbar vor der Symptomentstehung gegessen - the figure (made by build_unit_figure, see registry.py)
+unit_registry.register(unit_5, make_figure_5,
+                       selectors=('meals', 'impairment'),
+                       # The df subset by dates (made once for units 2-8, see update_subset), then by the selectors on this unit
+                       artifacts=[('eating', partial(read_subset, name='eating'), SUBSET_INPUTS),
+                                  ('subset', subset_data_by_selector_values, {'df': 'eating', 'meals_selector': 'meals', 'impairment_selector': 'impairment'}),
+                                  # The whole history is selected -> use the per-account counters instead of recomputing
+                                  ('counts', partial(query_counters, what=FOODS), {**COUNTERS_INPUTS, 'meals_selector': 'meals', 'impairment_selector': 'impairment'})],
+                       inputs={'df': 'subset', 'counts': 'counts'},
+                       color='red',   # all red
+                       columns=('date', 'daytime', DISPLAYNAME),
+                       table='subset')
+
+
+
 # UNIT 5: Welche Lebensmittel wurden unmittelbar vor der Symptomentstehung gegessen
 @callback(get_callback_args(unit_5, parent=unit_1))
+@coalesced
 def update_unit_5(*components):
     """
     You can use this as a template fro a new unit
@@ -401,45 +615,51 @@ def update_unit_5(*components):
         raise PreventUpdate
 
     # for mutability, attr-access etc, iterability
-    components = make_handy_namespace(components)
+    components = make_handy_namespace(components, has_subset=True)
  
-    # Read data fom json stored in user's browser session
-    df_eating = read_json(components.json_eating)
-
     # Get the default values for the selectors
     default_values = get_default_values(unit)
     i = len(components) - len(default_values)  # will be used as index later
     
     # Reset the selectors if ‘store‘ is the trigger
-    if ctx.triggered_id == 'store_1':
+    if is_new_data(components):
         components[i:] = default_values
 
-    # Subset the data by dates
-    df_subset_dates = subset_data_by_dates(df_eating,
-                                           start_date=components.start_date,
-                                           end_date=components.end_date)
+    # Has this figure been made before? -> served from the cache (no pandas, no plotly)
+    fig = figure_cache.get(make_figure_key(unit, components))
+    if fig is not None:
+        return (*components[i:], send_figure(fig, components), None)   # the debugging table is used in DEBUG mode only (no cache there)
 
-    # Subset by the two selectors on this unit
-    df_subset_dates_and_selectors = subset_data_by_selector_values(df_subset_dates,
-                                                                   meals_selector=components.selector1,
-                                                                   impairment_selector=components.selector2)
-    # Make the plot
-    fig = make_figure(unit, df_subset_dates_and_selectors,
-                            color='red',                     # all red
-                            debugging_info=components)       # used in DEBUG mode
+    # Make the plot (as registered above) and cache it
+    fig, df_subset_dates_and_selectors = build_unit_figure(unit, components)
 
-    # Data for the plotly-dash DataTable (in debug mode)
-    data_debugging_table = to_list_of_dicts(df_subset_dates_and_selectors)
+    # The df for the plotly-dash DataTable (in debug mode) stays on the server, its key is sent
+    data_debugging_table = publish_table(unit.id, df_subset_dates_and_selectors)
 
     # update the Graph
     return (*components[i:], 
-            fig, 
+            send_figure(fig, components),   # only the changes on a selector change
             data_debugging_table)
 
 
 
+# UNIT 6: Wie sieht ein typisches Frühstück, Mittagessen oder Abendessen aus - the figure (made by build_unit_figure, see registry.py)
+unit_registry.register(unit_6, make_figure_6,
+                       selectors=('meals', 'symptoms'),
+                       # The df subset by dates (made once for units 2-8, see update_subset), then by the selectors on this unit
+                       artifacts=[('eating', partial(read_subset, name='eating'), SUBSET_INPUTS),
+                                  ('subset', subset_data_by_selector_values, {'df': 'eating', 'meals_selector': 'meals', 'symptom_selector': 'symptoms'}),
+                                  # The whole history is selected -> use the per-account counters instead of recomputing
+                                  ('counts', partial(query_counters, what=BASKETS), {**COUNTERS_INPUTS, 'meals_selector': 'meals', 'symptom_selector': 'symptoms'})],
+                       inputs={'df': 'subset', 'color': 'symptoms', 'counts': 'counts'},
+                       columns=('date', 'daytime', DISPLAYNAME),
+                       table='subset')
+
+
+
 # UNIT 6: Wie sieht ein typisches Frühstück, Mittagessen oder Abendessen aus
 @callback(get_callback_args(unit_6, parent=unit_1))
+@coalesced
 def update_unit_6(*components):
     """
     TODO: docs
@@ -453,34 +673,26 @@ def update_unit_6(*components):
         raise PreventUpdate
 
     # for mutability, attr-access etc, iterability
-    components = make_handy_namespace(components)
+    components = make_handy_namespace(components, has_subset=True)
  
-    # Read data fom json stored in user's browser session
-    df_eating = read_json(components.json_eating)
-
     # Get the default values for the selectors
     default_values = get_default_values(unit)
     i = len(components) - len(default_values)  # will be used as index later
     
     # Reset the selectors if ‘store‘ is the trigger
-    if ctx.triggered_id == 'store_1':
+    if is_new_data(components):
         components[i:] = default_values
 
-    # Subset the data by dates
-    df_subset_dates = subset_data_by_dates(df_eating,
-                                           start_date=components.start_date,
-                                           end_date=components.end_date)
-    # Subset by the two selectors on this unit
-    df_subset_dates_and_selectors = subset_data_by_selector_values(df_subset_dates,
-                                                                   meals_selector=components.selector1,
-                                                                   symptom_selector=components.selector2)
-    # Make the plot
-    fig = make_figure(unit, df_subset_dates_and_selectors,
-                            color=components.selector2,
-                            debugging_info=components)
-
-    # Data for the plotly-dash DataTable (in debug mode)
-    data_debugging_table = to_list_of_dicts(df_subset_dates_and_selectors)
+    # Has this figure been made before? -> served from the cache (no pandas, no plotly)
+    fig = figure_cache.get(make_figure_key(unit, components))
+    if fig is not None:
+        return (*components[i:], fig, None)   # the debugging table is used in DEBUG mode only (no cache there)
+
+    # Make the plot (as registered above) and cache it
+    fig, df_subset_dates_and_selectors = build_unit_figure(unit, components)
+
+    # The df for the plotly-dash DataTable (in debug mode) stays on the server, its key is sent
+    data_debugging_table = publish_table(unit.id, df_subset_dates_and_selectors)
 
     # update the Graph
     return (*components[i:], 
@@ -489,8 +701,30 @@ def update_unit_6(*components):
 
 
 
+# UNIT 7: Welche Lebensmittel werden (in einer bestimmten Mahlzeit) kombiniert - the figure (made by build_unit_figure, see registry.py)
+unit_registry.register(unit_7, make_figure_7,
+                       selectors=('meals', 'symptoms', 'n_components'),
+                       # The df subset by dates (made once for units 2-8, see update_subset), then by the selectors on this unit
+                       artifacts=[('eating', partial(read_subset, name='eating'), SUBSET_INPUTS),
+                                  ('subset', subset_data_by_selector_values, {'df': 'eating', 'meals_selector': 'meals', 'symptom_selector': 'symptoms'}),
+                                  # The whole history is selected -> use the per-account counters instead of recomputing
+                                  ('counts', query_counters, {**COUNTERS_INPUTS, 'what': 'n_components', 'meals_selector': 'meals', 'symptom_selector': 'symptoms'}),
+                                  # The same subsetting applied to the rows of the meal x food matrix (built once per account),
+                                  # i.e. the slider reuses the meal baskets and counts the combinations only
+                                  ('incidence_matrix', get_incidence_matrix, {'data_eating': 'data_eating'}),
+                                  ('baskets', subset_incidence_matrix, {'incidence': 'incidence_matrix', 'start_date': 'start_date', 'end_date': 'end_date',
+                                                                        'meals_selector': 'meals', 'symptom_selector': 'symptoms'})],
+                       inputs={'df': 'subset', 'n_components': 'n_components', 'color': 'symptoms',
+                               'incidence': 'baskets', 'counts': 'counts'},
+                       columns=('date', 'daytime', DISPLAYNAME),
+                       table='subset')
+
+
+
 # UNIT 7: Welche Lebensmittel werden (in einer bestimmten Mahlzeit) kombiniert
-@callback(get_callback_args(unit_7, parent=unit_1))
+@callback(get_callback_args(unit_7, parent=unit_1), 
+          **background_args('unit_7_progress', cancel=[Input('unit_0_button', 'n_clicks')]))  # a new account -> cancel
+@coalesced
 def update_unit_7(*components):
     """
     TODO: docs
@@ -504,50 +738,194 @@ def update_unit_7(*components):
         raise PreventUpdate
 
     # for mutability, attr-access etc, iterability
-    components = make_handy_namespace(components)
+    components = make_handy_namespace(components, has_subset=True)
  
-    # Read data fom json stored in user's browser session
-    df_eating = read_json(components.json_eating)
-
     # Get the default values for the selectors
     default_values = get_default_values(unit)
     i = len(components) - len(default_values)  # will be used as index later
     
     # Reset the selectors if ‘store‘ is the trigger
-    if ctx.triggered_id == 'store_1':
+    if is_new_data(components):
         components[i:] = default_values
 
-    # Subset the data by dates
-    df_subset_dates = subset_data_by_dates(df_eating,
-                                           start_date=components.start_date,
-                                           end_date=components.end_date)
-    
-    # Subset by the two selectors on this unit
-    df_subset_dates_and_selectors = subset_data_by_selector_values(df_subset_dates,
-                                                                   meals_selector=components.selector1,
-                                                                   symptom_selector=components.selector2)
-    # Make the plot
-    fig = make_figure(unit, df_subset_dates_and_selectors,
-                            n_components=components.selector3,   # slider
-                            color=components.selector2,          # symptom radio-buttons
-                            debugging_info=components)
-
-    # Data for the plotly-dash DataTable (in debug mode)
-    data_debugging_table = to_list_of_dicts(df_subset_dates_and_selectors)
+    # Has this figure been made before? -> served from the cache (no pandas, no plotly)
+    fig = figure_cache.get(make_figure_key(unit, components))
+    if fig is not None:
+        return (*components[i:], send_figure(fig, components), None)   # the debugging table is used in DEBUG mode only (no cache there)
+
+    # Make the plot (as registered above) and cache it
+    fig, df_subset_dates_and_selectors = build_unit_figure(unit, components, progress_id='unit_7_progress')
+
+    # The df for the plotly-dash DataTable (in debug mode) stays on the server, its key is sent
+    data_debugging_table = publish_table(unit.id, df_subset_dates_and_selectors)
 
     # update
     return (*components[i:], 
-            fig, 
+            send_figure(fig, components),   # only the changes on a selector change
             data_debugging_table)
 
 
 
 # UNIT 8: Die Lebensmittel, die wahrscheinlich die Symptome verursachen
+@callback(get_callback_args(unit_8, parent=unit_1))
+@coalesced
 def update_unit_8(*components):
     """
-    just a dummy for a function (for visual consistency)
-    this unit is not updated, therefore no callback function is needed for it.
+    The "probably bad foods" table for the selected date range
+    output: 1 element (unit_8_table_1.data)
+    """
+    # which unit is this callback function for?
+    UNIT = unit_8
+
+    # initially data = None (before anything is stored into the user's browser session)
+    if None in components: 
+        raise PreventUpdate
+
+    # for mutability, attr-access etc, iterability
+    components = make_handy_namespace(components, has_subset=True)
+
+    # Get the default values for the selectors (this code block is not needed - just for consistency)
+    default_values = get_default_values(UNIT)
+    i = len(components) - len(default_values)
+
+    # The "Probably bad foods table" (cached, see get_unit_table)
+    data_probably_bad_foods = get_unit_table(UNIT, components)
+
+    # update
+    return (*components[i:],        # []  but is there for consistency
+            data_probably_bad_foods)
+
+
+
+def make_probably_bad_foods_data(components):
+    """
+    Unit 8: the data of the "Probably bad foods table" (see get_unit_table)
+    """
+    # The df's subset by dates (made once for units 2-8, see update_subset)
+    df_eating_subset_dates = read_subset(components.data_subset, 'eating', 
+                                         components.data_eating, components.data_symptomreport)
+    df_symptoms_subset_dates = read_subset(components.data_subset, 'symptoms', 
+                                           components.data_eating, components.data_symptomreport)
+    return to_list_of_dicts(make_probably_bad_foods_table(df_eating_subset_dates, df_symptoms_subset_dates))
+
+
+
+# The units with a table (no figure): {unit id: the function making the table's data from the components}
+UNIT_TABLES = {unit_2.id: make_statistics_data, unit_8.id: make_probably_bad_foods_data}
+
+
+
+##### PREFETCHING #####
+
+# The thread pool (made on the first prefetching) and the data + dates prefetched recently
+_PREFETCH = {'pool': None, 'done': OrderedDict(), 'lock': Lock()}
+_PREFETCH_MAX_RECENT = 64
+
+
+
+def prefetch_units(data_eating, data_symptomreport, start_date, end_date):
+    """
+    PREFETCH (constants.py): makes the figures of units 3-7 and the tables of units 2 and 8 (no selectors)
+    for the dates ahead of time on a thread pool, i.e. the callbacks of the units find them on the figure cache.
+    The tables and the default selectors' values of all the units first (the first render), then every other 
+    combination of the selectors' values (see get_selector_values).
+    A figure or table asked for by a callback while it is being made is shared (see build_unit_figure, get_unit_table).
+    Does nothing if the same data and dates have been prefetched recently (e.g. on update_unit_0, then on update_subset)
+
+    data_eating, data_symptomreport: the values of store_1 and store_2
+    start_date, end_date: as sent by the date picker of unit 1 (iso format)
+    """
+    if not PREFETCH or not figure_cache.enabled:
+        return
+
+    fingerprint = make_fingerprint(data_eating, data_symptomreport, start_date, end_date)
+    with _PREFETCH['lock']:
+        if fingerprint in _PREFETCH['done']:
+            return
+        _PREFETCH['done'][fingerprint] = True
+        while len(_PREFETCH['done']) > _PREFETCH_MAX_RECENT:
+            _PREFETCH['done'].popitem(last=False)
+        if _PREFETCH['pool'] is None:
+            _PREFETCH['pool'] = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix='prefetch')
+
+    # the values of the components as the callbacks of units 2-8 get them (see make_handy_namespace)
+    timespan = get_default_values(unit_1)[-1]
+    combinations = [(unit, list(product(*get_selector_values(unit)))) for unit in (spec.unit for spec in unit_registry)]
+    jobs = ([(unit, ()) for unit in (unit_2, unit_8)]                    # the tables (no selectors)
+          + [(unit, values[0]) for unit, values in combinations]          # the defaults first
+          + [(unit, v) for unit, values in combinations for v in values[1:]])
+
+    def prefetch(unit, selector_values):
+        try:
+            handle = write_subset(data_eating, data_symptomreport, start_date, end_date)   # made once
+            components = make_handy_namespace((handle, data_eating, data_symptomreport, 
+                                               start_date, end_date, timespan, *selector_values), has_subset=True)
+            if unit.id in UNIT_TABLES:
+                get_unit_table(unit, components)
+            elif figure_cache.get(make_figure_key(unit, components)) is None:
+                build_unit_figure(unit, components)
+        except Exception as e:   # no one is waiting for it: report it, the data + dates can be prefetched again
+            with _PREFETCH['lock']:
+                _PREFETCH['done'].pop(fingerprint, None)
+            sys.stderr.write(f"{ERR_PREFIX}prefetching {unit.id} {selector_values} failed: {e!r}\n"
+                             f"{traceback.format_exc()}")   # one write: the threads of the pool report at the same time
+
+    for unit, selector_values in jobs:
+        _PREFETCH['pool'].submit(prefetch, unit, selector_values)
+
+
+
+##### PRODUCTION #####
+
+def warm_up_dash():
+    """
+    Dash sets up the server (the callback map, the index page) and serializes the layout
+    on the first requests -> done here by a test client instead of the first user
+    """
+    client = app.server.test_client()
+    for path in ('/', '/_dash-layout', '/_dash-dependencies'):
+        client.get(path)
+
+
+
+def warm_up_imports():
+    """The slow imports deferred for a fast start (see benchmark_startup on benchmarks.py) are done before serving"""
+    import scipy.sparse  # IncidenceMatrix (unit 7), compute_food_associations (unit 8)
+    import scipy.stats   # compute_food_associations (unit 8)
+
+
+
+def warm_up_database():
+    """The sqlalchemy engine is made (i.e. the .env is read, the connection approaches tried) once, before serving"""
+    get_sqlalchemy_engine()
+
+
+
+# Run by create_server in this order (append your own, e.g. to load the data of a demo account)
+WARMUP_HOOKS = [warm_up_dash, warm_up_imports, warm_up_plotly, warm_up_database]
+
+
+
+def create_server(warmup_hooks=WARMUP_HOOKS):
+    """
+    The app factory for the WSGI servers (see wsgi.py): runs the warmup hooks and returns the flask server.
+
+    With `gunicorn --preload` this runs once in the master process before forking, i.e. the layout,
+    the callback metadata, the compiled regex, plotly's validators, the engine configuration are 
+    shared by the workers (copy-on-write) and none of the workers pays the cold start on its first requests.
+    A failing hook (e.g. the database is not reachable yet) is reported and does not stop the server.
     """
+    for hook in warmup_hooks:
+        try:
+            hook()
+        except Exception as e:  # the request that needs it will raise again
+            sys.stderr.write(f"{ERR_PREFIX}warmup hook {hook.__name__} failed: {e!r}\n{traceback.format_exc()}")
+
+    # everything made so far lives as long as the app: keep it out of the garbage collector's
+    # sight, otherwise a gc run in a worker touches (i.e. copies) the memory pages shared with the master
+    gc.collect()
+    gc.freeze()
+    return app.server
 
 
 
@@ -573,7 +951,7 @@ if __name__ == '__main__':
             print(f"default values for the selectors: {get_default_values(unit)}")
             print("-" * 50)
 
-    # comment the next line out when deploying on a server
+    # the development server (on a server: see wsgi.py)
     app.run(debug=DEBUG)
 
 
@@ -0,0 +1,59 @@
+/*
+UNIT 1: Zeitraum wählen - the date picker and the time span dropdown (see update_unit_1 on app.py)
+
+Runs in the browser: no round trip to the server when a time span is picked.
+The min/max dates of the account are published once at load by update_unit_0 
+as the min_date_allowed/max_date_allowed of the date picker.
+*/
+
+// the values of the dropdown options (A, B, ... on constants.py) -> the number of days back from the last date
+// (null: the whole history)
+const UNIT_1_TIMESPANS = {
+    'B': null,       // Gesamter Zeitraum
+    'C': 7 * 4 * 3,  // 3 Monate
+    'D': 7 * 4,      // 4 Wochen
+    'E': 7           // Eine Woche
+};
+const UNIT_1_DEFAULT_TIMESPAN = 'A';   // "Ausgewählter Zeitraum ->", i.e. the dates on the date picker
+
+
+// the ISO date `days` before the (ISO) date, like get_dates_range on computations.py
+function unit_1_subtract_days(isoDate, days) {
+    const d = new Date(isoDate.slice(0, 10) + 'T00:00:00Z');   // UTC: no time zone shifts
+    d.setUTCDate(d.getUTCDate() - days);
+    return d.toISOString().slice(0, 10);
+}
+
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    unit_1: {
+        update_unit_1: function(data_eating, data_symptomreport, start_date, end_date, timespan,
+                                min_date, max_date) {
+            const no_update = window.dash_clientside.no_update;
+
+            // initially data = None (before anything is stored into the user's browser session)
+            if (data_eating == null || data_symptomreport == null) {
+                throw window.dash_clientside.PreventUpdate;
+            }
+            const triggered = window.dash_clientside.callback_context.triggered.map(t => t.prop_id);
+
+            // a new account: the whole history, the dropdown reset
+            if (triggered.includes('store_1.data') || triggered.includes('store_2.data')) {
+                return [min_date, max_date, UNIT_1_DEFAULT_TIMESPAN];
+            }
+            // the dates picked manually: the dropdown reset
+            if (triggered.includes('unit_1_selector_1.start_date') || triggered.includes('unit_1_selector_1.end_date')) {
+                return [no_update, no_update, UNIT_1_DEFAULT_TIMESPAN];
+            }
+            // a time span picked on the dropdown (extend UNIT_1_TIMESPANS when the dropdown is extended)
+            if (!(timespan in UNIT_1_TIMESPANS)) {
+                return [no_update, no_update, no_update];
+            }
+            const days = UNIT_1_TIMESPANS[timespan];
+            if (days === null) {
+                return [min_date, max_date, no_update];
+            }
+            return [unit_1_subtract_days(max_date, days), max_date.slice(0, 10), no_update];
+        }
+    }
+});
@@ -0,0 +1,133 @@
+"""
+Benchmarks for the BesserEsser dashboard (no database needed - synthetic accounts)
+
+Run:
+    python benchmarks.py
+
+- make_synthetic_account: df_eating and df_symptoms like from the database (cleaned, with the added columns)
+- benchmark_store_codecs: encode/decode time and payload size of the store codecs (see encode_frame)
+- benchmark_startup: the import time of the app (python -X importtime), i.e. the cold start of a worker
+"""
+
+import os
+import sys
+import random
+import subprocess
+from time import perf_counter
+from datetime import date, timedelta
+from pandas import DataFrame
+from data_processing import clean_eating_data, clean_symptoms_data
+from data_processing import add_columns_to_eating_data, add_columns_to_symptoms_data
+from table_toolkit import encode_frame, decode_frame, CODECS, pa
+from constants import ERR_PREFIX
+
+
+FOODS = ["Brot", "Butter", "Käse", "Kaffee", "Milch", "Apfel", "Banane", "Nudeln", "Tomate", "Reis",
+         "Huhn", "Salat", "Pizza", "Joghurt", "Müsli", "Ei", "Schinken", "Tee", "Wasser", "Schokolade"]
+
+
+
+def make_synthetic_account(n_days=365, seed=0, start_date=date(2023, 1, 1), account_id=1):
+    """
+    A random history of n_days: ~3 meals a day with 1-6 foods, a symptom report on ~30% of the days
+    Returns:
+        df_eating, df_symptoms (the same columns and dtypes as returned by get_dataframes)
+    """
+    rng = random.Random(seed)
+    rows_eating, rows_symptoms = [], []
+    meal_id = 0
+    for day in (start_date + timedelta(days=i) for i in range(n_days)):
+        if rng.random() < 0.1:   # no entries on this day
+            continue
+        for daytime in ("BREAKFAST", "LUNCH", "DINNER"):
+            if rng.random() < 0.2:
+                continue
+            meal_id += 1
+            for food in rng.sample(FOODS, rng.randint(1, 6)):
+                rows_eating.append((account_id, day, meal_id, daytime, food, FOODS.index(food)))
+        if rng.random() < 0.3:
+            times = ["AFTER_GETTING_UP", "AFTER_BREAKFAST", "AFTER_LUNCH", "AFTER_DINNER", "UNKNOWN"]
+            for time in rng.sample(times, rng.randint(1, 2)):
+                rows_symptoms.append((account_id, day, time, '-', rng.randint(1, 10)))
+
+    df_eating = DataFrame(rows_eating, columns=['account_id', 'date', 'meal_id', 'daytime', 'displayname', 'ingredient_id'])
+    df_symptoms = DataFrame(rows_symptoms, columns=['account_id', 'date', 'time', 'symptom', 'impairment'])
+
+    # the same steps as in get_dataframes
+    df_eating = clean_eating_data(df_eating)
+    df_symptoms = clean_symptoms_data(df_symptoms)
+    df_eating = add_columns_to_eating_data(df_eating, df_symptoms)
+    df_symptoms = add_columns_to_symptoms_data(df_eating, df_symptoms)
+    return df_eating, df_symptoms
+
+
+
+def benchmark_store_codecs(n_days_list=(90, 365, 3*365), compressions=('zstd', 'lz4'), repeat=5):
+    """
+    Encode/decode time and payload size of the codecs for the df's kept in the user's browser session
+    (the two df's of an account: eating, symptoms - the diary is derived on the server).
+    Returns:
+        DataFrame (one row per account size and codec)
+    """
+    codecs = [('json', None)]
+    if pa is None:
+        print(f"{ERR_PREFIX}pyarrow is not installed - only json is benchmarked")
+    else:
+        codecs += [(codec, compression) for codec in CODECS[1:] for compression in compressions
+                   if not (codec == 'parquet' and compression == 'lz4')]   # parquet: lz4 is not the usual one
+
+    rows = []
+    for n_days in n_days_list:
+        df_eating, df_symptoms = make_synthetic_account(n_days)
+        frames = [df_eating, df_symptoms]
+        for codec, compression in codecs:
+            t_encode = t_decode = 0
+            for _ in range(repeat):
+                t0 = perf_counter()
+                payloads = [encode_frame(df, codec=codec, compression=compression) for df in frames]
+                t1 = perf_counter()
+                [decode_frame(payload) for payload in payloads]
+                t2 = perf_counter()
+                t_encode, t_decode = t_encode + t1 - t0, t_decode + t2 - t1
+            rows.append({'days': n_days, 'rows': sum(len(df) for df in frames),
+                         'codec': codec if compression is None else f"{codec}+{compression}",
+                         'kbytes': round(sum(len(payload) for payload in payloads) / 1024, 1),
+                         'encode_ms': round(t_encode / repeat * 1000, 2),
+                         'decode_ms': round(t_decode / repeat * 1000, 2)})
+    return DataFrame(rows)
+
+
+
+def benchmark_startup(module='app', repeat=3, top=15):
+    """
+    The cold start: `import app` in a fresh interpreter with `python -X importtime` (the imports only, 
+    i.e. the layout and the callbacks registered, nothing served - see create_server on app.py for the warmup).
+    Returns:
+        total_ms: float, the best import time of `module` out of `repeat` runs
+        DataFrame: the `top` slowest imports of the best run (cumulative, incl. the imports they make)
+    """
+    cwd = os.path.dirname(os.path.abspath(__file__))   # app.py reads the assets, the .env relative to it
+    runs = []
+    for _ in range(repeat):
+        stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], 
+                                cwd=cwd, capture_output=True, text=True, check=True).stderr
+        rows = []
+        for line in stderr.splitlines():   # "import time: self [us] | cumulative | imported package"
+            if not line.startswith('import time:') or 'imported package' in line:
+                continue
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            rows.append({'module': name.strip(), 'self_ms': int(self_us) / 1000, 
+                         'cumulative_ms': int(cumulative_us) / 1000})
+        runs.append(DataFrame(rows))
+    df = min(runs, key=lambda df: df.loc[df['module'] == module, 'cumulative_ms'].iloc[0])
+    total_ms = df.loc[df['module'] == module, 'cumulative_ms'].iloc[0]
+    df = df[df['module'] != module].sort_values('cumulative_ms', ascending=False).head(top)
+    return total_ms, df.reset_index(drop=True)
+
+
+
+if __name__ == '__main__':
+    print(benchmark_store_codecs().to_string(index=False))
+    total_ms, df_imports = benchmark_startup()
+    print(f"\nimport app: {total_ms:.0f} ms, the slowest imports:")
+    print(df_imports.to_string(index=False))
@@ -0,0 +1,415 @@
+"""
+Caching for the BesserEsser dashboard
+
+- FigureCache: the figures made by the plotting functions (serialized json),
+  keyed by the unit, the data fingerprint and the selectors' values
+- make_background_manager: the background callbacks (see BACKGROUND_CALLBACKS on constants.py),
+  shared_directories: the session store and figure cache on the disk for them
+- SingleFlight: identical computations in flight at the same time are made once (threads of a worker process)
+- SessionStore: the df's of the loaded accounts on the server,
+  keyed by a token (the token is what the user's browser session holds)
+  (also the df's subset by dates, see write_subset, and the df's behind the tables for debugging,
+  see publish_table on data_processing.py)
+"""
+
+import os
+import re
+import sys
+import json
+import numpy as np
+from time import monotonic, perf_counter
+from hashlib import sha1
+from threading import Lock, Event
+from functools import wraps
+from collections import OrderedDict
+from pandas.util import hash_pandas_object
+from plotly.utils import PlotlyJSONEncoder
+from constants import DEBUG, ERR_PREFIX, FIGURE_CACHE, FIGURE_CACHE_MAX_BYTES, FIGURE_CACHE_DIR
+from constants import SESSION_TTL, SESSION_MAX_BYTES, SESSION_DIR, SUBSET_MAX_BYTES, TABLE_CACHE_MAX_BYTES
+from constants import BACKGROUND_CALLBACKS, BACKGROUND_DIR, BACKGROUND_EXPIRE, SINGLE_FLIGHT
+from constants import BACKGROUND_SESSION_DIR, BACKGROUND_FIGURE_CACHE_DIR
+from dash import DiskcacheManager
+
+try:
+    import diskcache   # optional: pip install diskcache (to share the cache between worker processes)
+except ImportError:
+    diskcache = None
+
+
+
+def resolve_directory(directory):
+    """
+    The cache directories of constants.py (e.g. ".cache/figures"): relative to the folder of the app,
+    not to the current working directory. None stays None
+    """
+    if directory is None or os.path.isabs(directory):
+        return directory
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), directory)
+
+
+
+def make_fingerprint(*values):
+    """
+    A short str representing the values (e.g. the json data from the user's browser session + selectors).
+    Long str's are hashed - no pandas involved.
+    """
+    hasher = sha1()
+    for value in values:
+        hasher.update(repr(value).encode())
+        hasher.update(b'\x1f')   # separator
+    return hasher.hexdigest()
+
+
+
+def estimate_size(obj, _seen=None):
+    """
+    Approx. memory used by obj in bytes (for the byte budgets, e.g. the artifacts of registry.py):
+    df's and arrays as reported by pandas / numpy, containers and other objects by their items / attributes
+    (an object referenced twice is counted once)
+    """
+    seen = set() if _seen is None else _seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    if hasattr(obj, 'memory_usage'):   # DataFrame (a Series per column), Series, Index
+        n_bytes = obj.memory_usage(deep=True)
+        return int(n_bytes.sum()) if hasattr(n_bytes, 'sum') else int(n_bytes)
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(estimate_size(k, seen) + estimate_size(v, seen) for k,v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return sys.getsizeof(obj) + sum(estimate_size(e, seen) for e in obj)
+    if hasattr(obj, '__dict__'):   # e.g. IncidenceMatrix, scipy's sparse matrices
+        return sys.getsizeof(obj) + estimate_size(vars(obj), seen)
+    return sys.getsizeof(obj)
+
+
+
+class FigureCache():
+    """
+    LRU cache for the serialized (json) figures (and the data of the tables of units 2, 8, see get_unit_table on app.py).
+
+    A hit is served as a dict (figure json parsed), which can be returned by a callback as it is,
+    i.e. neither pandas nor plotly is touched.
+
+    Backends:
+        - in memory (default): per process, evicted by the total size in bytes
+        - diskcache (if `directory` is given and diskcache is installed): shared by all worker processes
+          on the machine, evicted by diskcache (least recently used)
+    The cache is disabled in DEBUG mode (the debugging info is a part of the figure there).
+    """
+
+    def __init__(self, max_bytes=FIGURE_CACHE_MAX_BYTES, directory=FIGURE_CACHE_DIR, enabled=FIGURE_CACHE):
+        self.enabled = enabled and not DEBUG
+        self.max_bytes = max_bytes
+        self.lock = Lock()
+        self.memory = OrderedDict()   # {key: json str}
+        self.n_bytes = 0
+        self.disk = None
+        self.hits, self.misses = 0, 0
+
+        if directory and diskcache is None:
+            print(f"{ERR_PREFIX}FIGURE_CACHE_DIR is set but diskcache is not installed "
+                  f"(pip install diskcache) - the figures are cached in memory instead")
+        elif directory:
+            self.disk = diskcache.Cache(resolve_directory(directory), size_limit=max_bytes, eviction_policy='least-recently-used')
+
+    def make_key(self, unit_id, *values):
+        """
+        unit_id: e.g. 'unit_4'
+        values: what the figure depends on, e.g. the stored data, the dates and the selectors' values
+        """
+        return f"{unit_id}:{make_fingerprint(*values)}"
+
+    def get(self, key):
+        """
+        Returns:
+            dict (the figure json parsed) or None if not cached
+        """
+        if not self.enabled:
+            return None
+
+        if self.disk is not None:
+            value = self.disk.get(key)
+        else:
+            with self.lock:
+                value = self.memory.get(key)
+                if value is not None:
+                    self.memory.move_to_end(key)
+
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(value)
+
+    def set(self, key, fig):
+        """
+        fig: plotly figure (or a dict / anything plotly can serialize)
+        Returns:
+            fig (unchanged)
+        """
+        if not self.enabled:
+            return fig
+
+        value = json.dumps(fig, cls=PlotlyJSONEncoder)
+
+        if self.disk is not None:
+            self.disk.set(key, value)
+            return fig
+
+        with self.lock:
+            if key in self.memory:
+                self.n_bytes -= len(self.memory.pop(key))
+            self.memory[key] = value
+            self.n_bytes += len(value)
+            while self.n_bytes > self.max_bytes and self.memory:
+                _, evicted = self.memory.popitem(last=False)   # the least recently used
+                self.n_bytes -= len(evicted)
+        return fig
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+            self.n_bytes = 0
+        if self.disk is not None:
+            self.disk.clear()
+
+
+
+class SessionStore():
+    """
+    Server-side store for the df's of the loaded accounts (instead of the json in the dcc.Store's).
+
+    The user's browser session holds a token only, i.e. the request size and the decoding time
+    of a callback do not grow with the history of the account.
+    token = "<account id>:<fingerprint of the df's>", i.e. the same data -> the same token
+    (shared by browser tabs, stable keys for the figure cache). The account id is there to refetch
+    the df's if they have expired or were evicted (see read_store on data_processing.py).
+
+    Backends:
+        - in memory (default): per process, evicted by the time to live (since the last access)
+          and by the total size in bytes (the least recently used first)
+        - diskcache (if `directory` is given and diskcache is installed): on the local disk,
+          shared by all worker processes on the machine
+    The df's are returned as they are stored (no copy) - treat them as read-only.
+    """
+
+    def __init__(self, ttl=SESSION_TTL, max_bytes=SESSION_MAX_BYTES, directory=SESSION_DIR):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = Lock()
+        self.memory = OrderedDict()   # {token: (expires at, n bytes, {name: df})}
+        self.n_bytes = 0
+        self.disk = None
+
+        if directory and diskcache is None:
+            print(f"{ERR_PREFIX}SESSION_DIR is set but diskcache is not installed "
+                  f"(pip install diskcache) - the df's are kept in memory instead")
+        elif directory:
+            self.disk = diskcache.Cache(resolve_directory(directory), size_limit=max_bytes, eviction_policy='least-recently-used')
+
+    TOKEN_PATTERN = re.compile(r"^[^:{]+:[0-9a-f]{20}$")   # see make_token
+
+    @staticmethod
+    def make_token(account_id, frames):
+        """
+        frames: {name: df}
+        """
+        hasher = sha1()
+        for name, df in frames.items():
+            hasher.update(name.encode())
+            hasher.update(hash_pandas_object(df, index=True).values.tobytes())
+            hasher.update(repr(list(df.columns)).encode())
+        return f"{account_id}:{hasher.hexdigest()[:20]}"
+
+    @classmethod
+    def is_token(cls, data):
+        """
+        A token or an encoded df (json, "arrow+zstd:..." etc., see encode_frame on table_toolkit.py)?
+        """
+        return type(data) is str and cls.TOKEN_PATTERN.match(data) is not None
+
+    def put(self, account_id, frames, token=None):
+        """
+        frames: {name: df}, e.g. {'eating': df_eating, ...}
+        token: to store the df's under an existing token (e.g. after a refetch)
+        Returns:
+            token (str)
+        """
+        token = token or self.make_token(account_id, frames)
+
+        if self.disk is not None:
+            self.disk.set(token, frames, expire=self.ttl)
+            return token
+
+        n_bytes = sum(int(df.memory_usage(index=True, deep=True).sum()) for df in frames.values())
+        with self.lock:
+            if token in self.memory:
+                self.n_bytes -= self.memory.pop(token)[1]
+            self.memory[token] = (monotonic() + self.ttl, n_bytes, frames)
+            self.n_bytes += n_bytes
+            self._evict()
+        return token
+
+    def get(self, token, name):
+        """
+        Returns:
+            the df or None (unknown token, expired or evicted)
+        """
+        if self.disk is not None:
+            frames = self.disk.get(token)
+            if frames is not None:
+                self.disk.touch(token, expire=self.ttl)
+            return None if frames is None else frames.get(name)
+
+        with self.lock:
+            self._evict()
+            if token not in self.memory:
+                return None
+            _, n_bytes, frames = self.memory.pop(token)
+            self.memory[token] = (monotonic() + self.ttl, n_bytes, frames)   # the most recently used
+        return frames.get(name)
+
+    def _evict(self):
+        # the expired ones, then the least recently used ones while over the budget
+        # (the OrderedDict is ordered by the last access, i.e. by the expiry time too)
+        now = monotonic()
+        while self.memory:
+            token, (expires_at, n_bytes, _) = next(iter(self.memory.items()))
+            if expires_at > now and self.n_bytes <= self.max_bytes:
+                break
+            if len(self.memory) == 1 and expires_at > now:
+                break   # keep the only (i.e. the current) session even if over the budget
+            self.memory.popitem(last=False)
+            self.n_bytes -= n_bytes
+
+    def __len__(self):
+        return len(self.disk) if self.disk is not None else len(self.memory)
+
+
+
+class SingleFlight():
+    """
+    Identical computations in flight at the same time are made once: the first caller of a key runs it,
+    the callers of the same key arriving meanwhile wait for it and get the same result (or the same exception).
+    Nothing is kept afterwards (that is what the caches are for), i.e. the results must not be modified by the callers.
+
+    Metrics per name (e.g. 'update_unit_4', 'load_account'), see `metrics`:
+        calls, executions, collapsed (= calls that waited instead of computing),
+        seconds (spent computing), seconds_saved (the computing time of the flights shared by the waiting callers)
+    """
+
+    def __init__(self, enabled=SINGLE_FLIGHT):
+        self.enabled = enabled
+        self.lock = Lock()
+        self.flights = {}   # {key: [Event, result, exception, number of the waiting callers]}
+        self.metrics = {}   # {name: {metric: value}}
+
+    def do(self, name, key, func, *args, **kwargs):
+        """
+        Returns func(*args, **kwargs), computed once for the callers of the same (name, key) in flight
+        name: str, what is computed (metrics are per name)
+        key: hashable, identifies the arguments (e.g. a token, a fingerprint)
+        """
+        if not self.enabled:
+            return func(*args, **kwargs)
+
+        key = (name, key)
+        with self.lock:
+            metrics = self.metrics.setdefault(name, dict.fromkeys(
+                ('calls', 'executions', 'collapsed', 'seconds', 'seconds_saved'), 0))
+            metrics['calls'] += 1
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = [Event(), None, None, 0]
+            else:
+                flight[3] += 1
+                metrics['collapsed'] += 1
+
+        if not leader:
+            flight[0].wait()
+            if flight[2] is not None:
+                raise flight[2]
+            return flight[1]
+
+        start = perf_counter()
+        try:
+            flight[1] = func(*args, **kwargs)
+            return flight[1]
+        except BaseException as e:
+            flight[2] = e
+            raise
+        finally:
+            seconds = perf_counter() - start
+            with self.lock:
+                del self.flights[key]
+                metrics['executions'] += 1
+                metrics['seconds'] += seconds
+                metrics['seconds_saved'] += seconds * flight[3]
+            flight[0].set()
+
+    def coalesce(self, name, make_key):
+        """
+        Decorator: single-flight calls of the decorated function.
+        make_key: makes the key from the arguments of the call (the same arguments -> the same key)
+        """
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                return self.do(name, make_key(*args, **kwargs), func, *args, **kwargs)
+            return wrapper
+        return decorator
+
+
+
+def make_background_manager(directory=BACKGROUND_DIR, expire=BACKGROUND_EXPIRE, enabled=BACKGROUND_CALLBACKS):
+    """
+    Returns:
+        dash.DiskcacheManager or None (-> the callbacks run in the request, as usual)
+    """
+    if not enabled or DEBUG:
+        return None
+    try:
+        if diskcache is None:
+            raise ImportError("diskcache")
+        return DiskcacheManager(diskcache.Cache(resolve_directory(directory)), expire=expire)
+    except ImportError:
+        print(f"{ERR_PREFIX}BACKGROUND_CALLBACKS is set but the dependencies are not installed "
+              f"(pip install \"dash[diskcache]\") - the callbacks run in the request instead")
+        return None
+
+
+
+def shared_directories(background, session_dir=SESSION_DIR, figure_cache_dir=FIGURE_CACHE_DIR):
+    """
+    The directories of the session store and the figure cache (None -> in memory).
+    A background job is a process of its own: the df's it puts into an in-memory session store
+    (loading an account on unit 0) would be lost when it exits and every later callback would refetch
+    them from the database -> with background callbacks both are on the disk (shared by the processes),
+    in BACKGROUND_SESSION_DIR / BACKGROUND_FIGURE_CACHE_DIR unless set
+    background: is there a background manager (see make_background_manager)
+    Returns:
+        (session_dir, figure_cache_dir)
+    """
+    if background and session_dir is None:
+        session_dir = BACKGROUND_SESSION_DIR
+        print(f"BACKGROUND_CALLBACKS: the df's of the loaded accounts are kept in {session_dir} (SESSION_DIR is None)")
+    if background and figure_cache_dir is None:
+        figure_cache_dir = BACKGROUND_FIGURE_CACHE_DIR
+        print(f"BACKGROUND_CALLBACKS: the figures are cached in {figure_cache_dir} (FIGURE_CACHE_DIR is None)")
+    return session_dir, figure_cache_dir
+
+
+
+# One instance of each for the app (used by the callback functions)
+background_manager = make_background_manager()
+session_dir, figure_cache_dir = shared_directories(background_manager is not None)
+single_flight = SingleFlight()
+figure_cache = FigureCache(directory=figure_cache_dir)
+session_store = SessionStore(directory=session_dir)
+subset_store = SessionStore(max_bytes=SUBSET_MAX_BYTES, directory=None)        # the df's subset by dates
+table_store = SessionStore(max_bytes=TABLE_CACHE_MAX_BYTES, directory=None)   # DEBUG mode only
@@ -8,7 +8,10 @@ from itertools import combinations
 from math import sqrt, ceil
 from collections import Counter
 from datetime import date, timedelta
-from pandas import DataFrame, date_range
+import numpy as np
+from pandas import DataFrame, DatetimeIndex, date_range, factorize
+from sketches import CountMinSketch
+from constants import DISPLAYNAME, MEALS_MAPPING
 
 
 
@@ -28,8 +31,355 @@ def compute_combination_occurrence(sets, cardinality=2):
     Returns:
         collections.Counter object
     """
-    subsets = frozenset(frozenset(e) for e in sum([list(combinations(e, cardinality)) for e in sets], []))
-    return Counter({subset: sum(subset.issubset(st) for st in sets) for subset in subsets})
+    return IncidenceMatrix.from_sets(sets).count_combinations(cardinality)
+
+
+
+def sort_counter(counter):
+    """
+    The counts ordered like count_combinations does (the most common first, the ties by the label,
+    i.e. the sorted names joined by ", "): Counter.most_common keeps this order for the ties,
+    i.e. the ranking is the same whichever way the counts were made (e.g. FoodCounters or from the df)
+    Returns:
+        collections.Counter object
+    """
+    label = lambda k: ", ".join(map(str, sorted(k))) if type(k) is frozenset else str(k)
+    return Counter(dict(sorted(counter.items(), key=lambda t: (-t[1], label(t[0])))))
+
+
+
+def compute_approximate_counts(items, top_n, batch_size=10_000):
+    """
+    Approximate mode (see APPROXIMATE_MODE on constants.py): 
+    the counts are estimated with a Count-Min sketch, i.e. the memory does not grow with the number
+    of distinct items. The items are streamed into the sketch in batches.
+
+    Used for units 4, 5 (foods) and 7 (combinations of foods, see `iterate_combinations`)
+
+    Arguments:
+        items: iterable of hashable items (e.g. a generator)
+        top_n: int
+    Returns:
+        tuple: (collections.Counter with the top_n items, error bound = max overestimation of a count)
+    """
+    sketch = CountMinSketch()
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            sketch.update(batch)
+            batch = []
+    sketch.update(batch)
+    return Counter(dict(sketch.most_common(top_n))), sketch.error_bound()
+
+
+
+def iterate_combinations(sets, cardinality=2):
+    """
+    Generator: all subsets of length=cardinality of each set (as frozensets)
+    i.e. the stream counted by `compute_combination_occurrence` (without holding it in memory)
+    """
+    for st in sets:
+        for e in combinations(sorted(st), cardinality):
+            yield frozenset(e)
+
+
+
+class IncidenceMatrix():
+    """
+    Sparse meal x food incidence matrix (scipy CSR): one row per meal, one column per food.
+    Used for unit 7 (and any future "what goes together" views).
+
+    Built once per account from the meal baskets (a meal = all the foods with the same date and daytime).
+    The rows can be subset with the usual filtering functions applied to the `meals` df
+    (see `subset_incidence_matrix` on data_filtering.py), i.e. no re-grouping of the long df is needed.
+
+    Attributes:
+        matrix: scipy.sparse.csr_matrix with 1's (meals x foods)
+        foods: numpy array with the food names (the column labels)
+        meals: pandas.DataFrame with one row per meal (the row labels), RangeIndex
+    """
+
+    # meal level columns (they are constant within a meal) kept for the row masks
+    MEAL_COLUMNS = ['symptom_same_day', 'symptom_next_day', 'avg_impairment']
+
+    # masks with this many rows or less are counted by enumerating the combinations meal by meal
+    SMALL_MASK = 64
+
+    def __init__(self, matrix, foods, meals):
+        self.matrix = matrix
+        self.foods = foods
+        self.meals = meals
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """
+        df: the long df_eating (or a subset of it)
+        """
+        DATE, DAYTIME = 'date', 'daytime'
+
+        grouped = df.groupby([DATE, DAYTIME], sort=True)
+        meal_codes = grouped.ngroup().to_numpy()
+        meals = grouped[[c for c in cls.MEAL_COLUMNS if c in df.columns]].first().reset_index()
+
+        food_codes, foods = factorize(df[DISPLAYNAME], sort=True)  # NaN -> -1
+        mask = food_codes >= 0
+        matrix = _make_binary_matrix(meal_codes[mask], food_codes[mask], shape=(len(meals), len(foods)))
+        return cls(matrix, np.asarray(foods, dtype=object), meals)
+
+    @classmethod
+    def from_sets(cls, sets):
+        """
+        sets: array of sets (or any iterables) of foods, one per meal
+        """
+        sets = [frozenset(st) for st in sets]
+        meal_codes = np.repeat(np.arange(len(sets)), [len(st) for st in sets])
+        food_codes, foods = factorize(np.array([e for st in sets for e in st], dtype=object), sort=True)
+        matrix = _make_binary_matrix(meal_codes, food_codes, shape=(len(sets), len(foods)))
+        return cls(matrix, np.asarray(foods, dtype=object), DataFrame(index=range(len(sets))))
+
+    def subset(self, index):
+        """
+        Returns a new IncidenceMatrix with the given rows only (the columns are kept).
+        index: positions of the meals, e.g. the index of a filtered `meals` df
+        """
+        index = np.asarray(index, dtype=int)
+        return self.__class__(self.matrix[index], self.foods, self.meals.iloc[index].reset_index(drop=True))
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def count_combinations(self, cardinality=2, top_n=None):
+        """
+        Counts in how many meals each combination of foods of length=cardinality occurs
+        (the same result as the frozenset-based approach: only the combinations which occur are counted)
+
+        cardinality 1: column sums
+        cardinality 2: one sparse product X.T @ X (upper triangle)
+        cardinality k: the same product on the rows masked by each frequent (k-2)-combination (prefix)
+                       (a mask with a few rows only is counted directly, see SMALL_MASK)
+
+        top_n: None -> all combinations, int -> only the top_n most common ones
+        (ties are sorted alphabetically to make the result deterministic)
+
+        Returns:
+            collections.Counter object (keys are frozensets of food names)
+        """
+        from scipy import sparse   # imported already (the matrix is made by _make_binary_matrix)
+        X = self.matrix
+        columns = X.tocsc()   # to get the rows of a given food quickly
+        collector_items, collector_counts = [], []
+
+        def recurse(rows, prefix):
+            # rows: the meals which contain all the foods of the prefix
+            start = prefix[-1] + 1 if prefix else 0   # combinations are sorted by the column index
+            
+            # base case: few rows left -> enumerating the combinations is cheaper than a sparse product
+            if len(rows) <= self.SMALL_MASK:
+                counter = Counter(c for r in rows 
+                                    for c in combinations(row_foods(r, start), cardinality - len(prefix)))
+                if counter:
+                    collector_items.append(np.array([prefix + list(c) for c in counter], dtype=int))
+                    collector_counts.append(np.fromiter(counter.values(), dtype=int, count=len(counter)))
+                return
+
+            # base case: the pairs on the masked rows
+            if len(prefix) == cardinality - 2:
+                sub = X[rows]
+                C = sparse.triu(sub.T @ sub, k=1).tocoo()
+                keep = (C.row >= start) & (C.data > 0)
+                if keep.any():
+                    items = np.column_stack([np.tile(prefix, (keep.sum(), 1)).astype(int),
+                                             C.row[keep], C.col[keep]])
+                    collector_items.append(items)
+                    collector_counts.append(C.data[keep])
+                return
+
+            # recursive case: extend the prefix with each food which occurs on the masked rows
+            counts = np.asarray(X[rows].sum(axis=0)).ravel()
+            for p in np.flatnonzero(counts[start:]) + start:
+                rows_p = columns.indices[columns.indptr[p]:columns.indptr[p+1]]
+                recurse(np.intersect1d(rows, rows_p, assume_unique=True), prefix + [p])
+
+        def row_foods(r, start):
+            # column indices of the meal r (sorted by scipy) from the column `start` on
+            foods = X.indices[X.indptr[r]:X.indptr[r+1]]
+            return foods[foods >= start].tolist()
+
+        if cardinality < 1 or len(self) == 0:
+            return Counter()
+        elif cardinality == 1:
+            counts = np.asarray(X.sum(axis=0)).ravel()
+            keep = np.flatnonzero(counts)
+            collector_items.append(keep.reshape(-1, 1))
+            collector_counts.append(counts[keep])
+        else:
+            meal_sizes = np.diff(X.indptr)
+            recurse(np.flatnonzero(meal_sizes >= cardinality), [])   # smaller meals can't contribute
+
+        if not collector_items:
+            return Counter()
+
+        items = np.vstack(collector_items)
+        counts = np.concatenate(collector_counts).astype(int)
+        if top_n is not None and len(counts) > top_n:
+            threshold = np.partition(counts, -top_n)[-top_n]   # ties with the last one are kept for sorting
+            keep = counts >= threshold
+            items, counts = items[keep], counts[keep]
+
+        labels = [", ".join(map(str, self.foods[row])) for row in items]
+        order = sorted(range(len(counts)), key=lambda i: (-counts[i], labels[i]))[:top_n]
+        return Counter({frozenset(self.foods[items[i]]): int(counts[i]) for i in order})
+
+
+
+def _make_binary_matrix(row_codes, col_codes, shape):
+    """
+    helper function for IncidenceMatrix
+    duplicates (the same food twice in a meal) are summed up by scipy -> reset to 1
+    """
+    from scipy.sparse import csr_matrix   # slow to import: deferred to the first matrix (units 7, 8)
+    matrix = csr_matrix((np.ones(len(row_codes), dtype=np.int32), (row_codes, col_codes)), shape=shape)
+    matrix.sum_duplicates()
+    matrix.data[:] = 1
+    return matrix
+
+
+
+def compute_food_associations(df_eating, df_symptomreport, lags=(0,)):
+    """
+    Association between each food and the symptoms - computed for all the foods at once.
+    Used for unit 8 (Potentiell Symptom verursachende Lebensmittel)
+
+    Unit of analysis: a day t (with documented meals on at least one of the days t-lag).
+    A day is "exposed" to a food if the food was eaten on any of the days t-lag (lag in lags),
+    e.g. lags=(0,1) -> eaten on the same day or on the day before.
+    The outcome: a symptom was reported on the day t.
+
+    2x2 contingency table for every food (a day x food sparse matrix, no loops):
+                    symptom   no symptom
+        eaten          a          b
+        not eaten      c          d
+
+    Returns:
+        pandas.DataFrame (one row per food) with the columns:
+        food, exposed_days, a, b, c, d, risk_ratio, odds_ratio, p_fisher, p_chi2
+        risk_ratio and odds_ratio are computed with +0.5 (Haldane-Anscombe) correction
+        p_fisher: one sided Fisher's exact test (i.e. the food increases the risk)
+        p_chi2: Pearson's chi-squared test (1 degree of freedom)
+    """
+    from scipy.stats import hypergeom, chi2   # slow to import: deferred to the first call (unit 8)
+    DATE = 'date'
+    COLUMNS = ['food', 'exposed_days', 'a', 'b', 'c', 'd', 'risk_ratio', 'odds_ratio', 'p_fisher', 'p_chi2']
+
+    df_eating = df_eating[df_eating[DISPLAYNAME].notna()]
+    if len(df_eating) == 0:
+        return DataFrame(columns=COLUMNS)
+
+    # a continuous timeline of days: day index = days since the first date
+    first_date = min(df_eating[DATE].min(), df_symptomreport[DATE].min()) \
+                    if len(df_symptomreport) else df_eating[DATE].min()
+    eating_days = (df_eating[DATE] - first_date).dt.days.to_numpy()
+    symptom_days = (df_symptomreport[DATE] - first_date).dt.days.to_numpy()
+    n_days = max(eating_days.max(), symptom_days.max() if len(symptom_days) else 0) + 1 + max(lags)
+
+    # day x food matrix (exposure on the day itself)
+    food_codes, foods = factorize(df_eating[DISPLAYNAME], sort=True)
+    food_codes = food_codes.astype(int)
+    n_foods = len(foods)
+
+    # shift the rows by each lag and unite (-> exposure on the day t)
+    exposure = _make_binary_matrix(np.concatenate([eating_days + lag for lag in lags]),
+                                   np.tile(food_codes, len(lags)),
+                                   shape=(n_days, n_foods))
+    documented = np.zeros(n_days, dtype=bool)
+    documented[np.concatenate([eating_days + lag for lag in lags])] = True
+    
+    symptom = np.zeros(n_days, dtype=bool)
+    symptom[symptom_days] = True
+
+    # keep the days with known exposure only
+    exposure, symptom = exposure[documented], symptom[documented]
+
+    # the counts for all the foods at once
+    n = len(symptom)                                     # days
+    n_symptom = int(symptom.sum())                       # days with a symptom
+    exposed = np.asarray(exposure.sum(axis=0)).ravel()   # days with the food
+    a = exposure.T @ symptom.astype(np.int32)
+    b = exposed - a
+    c = n_symptom - a
+    d = n - n_symptom - b
+
+    # effect sizes (with the +0.5 correction to avoid division by zero)
+    risk_ratio = ((a + 0.5) / (a + b + 1)) / ((c + 0.5) / (c + d + 1))
+    odds_ratio = ((a + 0.5) * (d + 0.5)) / ((b + 0.5) * (c + 0.5))
+
+    # significance
+    p_fisher = hypergeom.sf(a - 1, n, n_symptom, exposed)   # P(X >= a)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        statistic = n * (a*d - b*c)**2 / ((a+b) * (c+d) * (a+c) * (b+d)).astype(float)
+    p_chi2 = np.where(np.isfinite(statistic), chi2.sf(statistic, 1), 1.0)
+
+    return DataFrame(dict(zip(COLUMNS, 
+                              [foods, exposed, a, b, c, d, risk_ratio, odds_ratio, p_fisher, p_chi2])))
+
+
+
+def compute_timeline(df_eating, df_symptoms):
+    """
+    Used for unit 3 (Ernährungs- und Symptomtagebuch): all of the data for the timeline
+    in one pass (a single groupby, reindexed against the date range).
+
+    Returns:
+        date_range: pandas DatetimeIndex (min/max from the union of the two df's)
+        has_symptoms: numpy bool array (a day with a symptom report?), aligned with date_range
+        df_meals: DataFrame with the index (daytime, date) and the column DISPLAYNAME
+                  (the foods of the meal joined with ", "), days without the meal are left out
+    """
+    date_range = get_dates_range(df_eating, df_symptoms, False)
+    has_symptoms = date_range.isin(df_symptoms['date'].dropna().unique())
+
+    # the foods joined by a (cythonized) groupby sum of str's instead of a python join per group
+    df = df_eating.dropna(subset=[DISPLAYNAME])
+    df_meals = ((df[DISPLAYNAME].astype(str) + ", ")
+                .groupby([df['daytime'], df['date']], sort=True).sum()
+                .str[:-len(", ")]
+                .to_frame())
+    return date_range, has_symptoms, df_meals
+
+
+
+def compute_day_table(df_eating, df_symptomreport):
+    """
+    Used for unit 2 (Eckdaten): one row per day with an entry in either df (sorted by date),
+    i.e. the statistics for any date range are computed from the rows of this table (days)
+    instead of the long df's (see make_statistics_table on table_toolkit.py).
+
+    Returns:
+        DataFrame with the columns
+            date
+            week: ISO year * 100 + ISO week (e.g. 202352), i.e. the weeks of different years do not collide
+            eating: bool, any food documented on this day?
+            BREAKFAST, LUNCH, DINNER: bool, the meal documented on this day? (see MEALS_MAPPING)
+            symptom_reports: int, the number of the symptom reports on this day
+    """
+    dates_eating = df_eating['date'].dropna()
+    dates_symptoms = df_symptomreport['date'].dropna()
+    index = DatetimeIndex(np.union1d(dates_eating.unique(), dates_symptoms.unique()), name='date')
+
+    df_days = DataFrame(index=index)
+    df_days['eating'] = index.isin(dates_eating.unique())
+
+    # date x daytime: documented or not (a single groupby for all the meals)
+    df_meals = df_eating.groupby(['date', 'daytime']).size().unstack(fill_value=0).reindex(index, fill_value=0)
+    for daytime in MEALS_MAPPING:
+        df_days[daytime] = (df_meals[daytime] > 0) if daytime in df_meals.columns else False
+
+    df_days['symptom_reports'] = dates_symptoms.value_counts().reindex(index, fill_value=0)
+
+    iso = index.isocalendar()
+    df_days.insert(0, 'week', (iso['year'] * 100 + iso['week']).astype(int))
+    return df_days.reset_index()
 
 
 
@@ -30,7 +30,100 @@ INGREDIENT_ID = "ingredient_id"  # not used at the moment
 # Use the original "displayname" column or the regex'ed "displayname_regex" ?
 DISPLAYNAME = 'displayname_regex'  #or 'displayname'
 
-# Path to the banner image
+# "Potentiell Symptom verursachende Lebensmittel" (unit 8):
+# a food eaten on day t-lag is associated with a symptom on day t (for any of the lags)
+ASSOCIATION_LAGS = (0, 1)        # same day and the day before
+ASSOCIATION_MIN_EXPOSURES = 2    # min number of days with the food AND a symptom to be listed
+
+# Approximate mode (for cohort-level views and very large histories): 
+# the counts in units 4, 5, 7 are estimated with sketches (see sketches.py), the "Eckdaten" (unit 2) stay exact
+APPROXIMATE_MODE = False
+CMS_EPSILON = 0.001    # Count-Min: max overestimation of a count = CMS_EPSILON * total count ...
+CMS_DELTA = 0.01       # ... with the probability 1 - CMS_DELTA
+CMS_CAPACITY = 100     # Count-Min: number of the heavy hitter candidates kept (must be >= any TOP_N)
+
+# "Typische Mahlzeiten" (unit 6): meals with the Jaccard similarity >= this threshold are grouped together
+# (MinHash + LSH, see sketches.py), e.g. 0.75 -> a breakfast of 3 foods and the same breakfast with a 4th food
+# (3 of 4 foods shared) are one typical meal
+TYPICAL_MEAL_SIMILARITY = None   # None -> only the identical meals are grouped (opt-in, e.g. 0.75)
+MINHASH_PERMUTATIONS = 64        # more -> more accurate but slower
+
+# Keep the df's of the loaded account on the server (see SessionStore on caching.py),
+# the user's browser session (dcc.Store) holds a token only.
+# False -> the df's are kept in the user's browser session as json (sent with every callback)
+SERVER_SIDE_STORE = True
+SESSION_TTL = 60 * 60               # seconds since the last access
+SESSION_MAX_BYTES = 512 * 2**20     # 512 MB for the df's of all sessions (per process)
+SESSION_DIR = None                  # e.g. ".cache/sessions" to keep the df's on the local disk
+                                    # (pip install diskcache), None -> in memory
+                                    # (relative paths are relative to this folder, see resolve_directory)
+SUBSET_MAX_BYTES = 128 * 2**20      # the df's subset by the selected dates (shared by units 2-8, per process)
+# The encoding of the df's in the user's browser session (if SERVER_SIDE_STORE is False), see encode_frame:
+# 'json' (pandas split-json), 'arrow' (Arrow IPC) or 'parquet' (pip install pyarrow, otherwise json)
+STORE_CODEC = 'json'
+STORE_COMPRESSION = 'zstd'          # 'arrow': 'zstd' or 'lz4', 'parquet': 'zstd', 'snappy', 'gzip'... or None
+
+# Cache for the figures of units 3-7 and the tables of units 2, 8 (see caching.py), disabled in DEBUG mode
+FIGURE_CACHE = True
+FIGURE_CACHE_MAX_BYTES = 64 * 2**20   # 64 MB
+FIGURE_CACHE_DIR = None               # e.g. ".cache/figures" to share the cache between worker processes
+                                      # (pip install diskcache), None -> in memory (per process)
+
+# Units 4, 5, 7: the whole figure is sent on (re)load of the data only,
+# a selector change sends the changes (dash.Patch) without the template (see make_figure_patch)
+FIGURE_PATCH = True
+
+# Make the treemaps, pies and the timeline as plain dicts (no validation by plotly -> faster)
+# (the same figures as made by plotly, see tests/test_figures.py)
+FAST_FIGURES = True
+
+# "Ernährungs- und Symptomtagebuch" (unit 3): rendering of the timeline
+TIMELINE_WEBGL = None              # True -> WebGL (Scattergl), False -> SVG, None -> WebGL for long histories only
+TIMELINE_WEBGL_MIN_DAYS = 1000     # number of days from which WebGL is used (if TIMELINE_WEBGL is None)
+TIMELINE_WIDTH_PX = 1000           # approx. width of the plotting area (for the marker size)
+TIMELINE_MARKER_SIZE = (2, 14)     # min/max marker size in px
+
+# Opt-in: heavy callbacks (loading an account on unit 0, unit 7) run in a background process with a progress bar
+# (pip install "dash[diskcache]", otherwise in the request), disabled in DEBUG mode.
+# A job is cancelled by a new trigger (Dash's DiskcacheManager).
+# A job is a process of its own: what is cached in memory (the figure cache, the account's counters and matrices,
+# the artifacts of registry.py) is lost when it exits -> the df's of the loaded accounts and the figures are kept
+# on the disk (SESSION_DIR and FIGURE_CACHE_DIR, or the directories below if those are None), i.e. shared by
+# the jobs and the server process (see shared_directories on caching.py).
+# Identical jobs of different users are not shared (SingleFlight works within a process only)
+BACKGROUND_CALLBACKS = False
+BACKGROUND_DIR = ".cache/background"  # relative to this folder (see resolve_directory on caching.py)
+BACKGROUND_SESSION_DIR = ".cache/sessions"       # used if SESSION_DIR is None
+BACKGROUND_FIGURE_CACHE_DIR = ".cache/figures"   # used if FIGURE_CACHE_DIR is None
+BACKGROUND_EXPIRE = 10 * 60         # seconds: the results of the jobs are kept until they are fetched
+BACKGROUND_INTERVAL = 500           # ms: how often the browser asks for the progress / result
+
+# Opt-in: as soon as an account is loaded, the figures of units 3-7 (and the tables of units 2, 8) for the whole
+# history are made ahead of time by a thread pool (the default selectors first, then every other combination of the selectors' values),
+# i.e. the first render and the selector flips are hits of the figure cache (see prefetch_units on app.py).
+# The figure cache is per worker process unless FIGURE_CACHE_DIR is set
+PREFETCH = False
+PREFETCH_WORKERS = 2
+
+# Opt-in: units 2-8 on tabs, only the unit on the open tab is in the layout, i.e. its callback fires 
+# when it is looked at (the figures are cached for later visits), see the layout on app.py
+LAZY_UNITS = False
+
+# Identical computations running at the same time (several tabs / users on the same account, a date change
+# fanning out into the units) are made once and shared by the waiting threads (see SingleFlight on caching.py)
+SINGLE_FLIGHT = True
+
+# The intermediate results of the figures of units 3-7 (the subsets, the meal baskets, the counters' counts)
+# kept under the key of their inputs, i.e. a selector change recomputes only what depends on that selector
+# (see registry.py). The artifacts kept per process, the least recently used are dropped (0 -> disabled)
+ARTIFACT_CACHE_MAX_BYTES = 128 * 2**20   # 128 MB
+
+# The diary table (unit 3) and the tables for debugging: only the visible page is sent to the browser,
+# sorting and filtering are done on the server (see query_frame on table_toolkit.py)
+DIARY_PAGE_SIZE = 50
+TABLE_CACHE_MAX_BYTES = 64 * 2**20   # the df's behind the tables for debugging (DEBUG mode, in memory)
+
+# Path to the banner image (served as a static file, i.e. it must be in the assets folder)
 BANNER_PATH = "assets/banner.png"
 
 # default min/max dates for the dropdown calendar
@@ -69,6 +162,7 @@ TEXT_UNIT_5 = "Beinträchtigungsgrad (die angegebene Zahl und höher)"
 TEXT_UNIT_6 = None
 TEXT_UNIT_7 = "Anzahl der Komponenten"
 TEXT_FOOTER = "BesserEsser"
+TEXT_APPROXIMATE = "Näherungswerte (±{})"   # approximate mode, e.g. "Näherungswerte (±3)"
 
 # Mapping for meals: ENGLISH - German (as they appear in the database)
 # used for selectors
@@ -87,7 +181,7 @@ E = 'E'   # extend when needed
 
 # plotly dash component classes (for type comparison)
 DASH_COMPONENTS_CLASSES = (dcc.Dropdown, dcc.RadioItems, dcc.Slider,
-                           dcc.DatePickerRange, dcc.DatePickerSingle, dcc.Graph, DataTable)
+                           dcc.DatePickerRange, dcc.DatePickerSingle, dcc.Graph, DataTable, dcc.Store)
 
 # Some colors for future styling
 # Keep in mind - there are 3 types of background colors:
@@ -0,0 +1,241 @@
+"""
+Incremental (streaming) counters for the BesserEsser dashboard
+
+Food frequencies (units 4, 5), typical meal baskets (unit 6) and
+pair/triple co-occurrences (unit 7) for the whole history of an account,
+partitioned by the selectors' values (a query merges partitions, no recounting).
+A meal is added / removed in O(size of the meal) - no recomputation from scratch.
+The pairs/triples are counted from the baskets when a unit first asks for them (then kept up to date),
+in the approximate mode (see APPROXIMATE_MODE on constants.py) they are estimated with mergeable sketches instead.
+"""
+
+from collections import Counter
+from itertools import combinations
+from math import floor
+from pandas import DataFrame, isnull, to_datetime
+from data_filtering import subset_data_by_selector_values
+from computations import sort_counter
+from sketches import CountMinSketch, merge_sketches
+from constants import DISPLAYNAME
+
+
+# What is counted (per partition)
+FOODS = 'foods'        # food frequencies (every row counts, like value_counts)
+BASKETS = 'baskets'    # the meals as frozensets
+PAIRS = 2              # co-occurrences: cardinality = 2
+TRIPLES = 3            # co-occurrences: cardinality = 3
+...                    # add more cardinalities if needed (mind the memory)
+
+
+
+def count_combinations_of_baskets(baskets, cardinality):
+    """
+    The combinations of foods of length=cardinality in the baskets, each one counted once per meal
+    baskets: collections.Counter {frozenset of foods: number of meals}
+    """
+    counter = Counter()
+    for basket, n in baskets.items():
+        for e in combinations(sorted(basket), cardinality):   # sorted: identical subsets for identical baskets
+            counter[frozenset(e)] += n
+    return counter
+
+
+
+def sketch_combinations_of_baskets(baskets, cardinality, batch_size=10_000):
+    """
+    Approximate mode: like count_combinations_of_baskets, but the combinations are streamed into
+    a Count-Min sketch in batches (no exact counts held in memory)
+    """
+    sketch = CountMinSketch()
+    items, counts = [], []
+    for basket, n in baskets.items():
+        for e in combinations(sorted(basket), cardinality):
+            items.append(frozenset(e))
+            counts.append(n)
+            if len(items) == batch_size:
+                sketch.update(items, counts)
+                items, counts = [], []
+    return sketch.update(items, counts)
+
+
+
+class FoodCounters():
+    """
+    Counters for one account.
+
+    The counts are kept per partition, i.e. per combination of the meal-level values
+    the selectors filter on: (daytime, symptom_same_day, symptom_next_day, impairment level).
+    A query merges the partitions matching the selectors (the partitions are filtered
+    with the same `subset_data_by_selector_values` function as the long df).
+    The counts are for the whole history, i.e. use them when the selected date range covers it
+    (see `covers`), otherwise recompute from the df.
+
+    A meal = all the foods with the same date and daytime (the same grouping as in units 6 and 7).
+    Plain dicts and Counters only, i.e. it can be pickled (e.g. diskcache) or saved as json (see to_dict).
+    """
+
+    COUNTED = (FOODS, BASKETS, PAIRS, TRIPLES)
+    PARTITION_COLUMNS = ['daytime', 'symptom_same_day', 'symptom_next_day', 'avg_impairment']
+
+    def __init__(self):
+        self.meals = {}          # {(date, daytime): (partition, (foods...))}
+        self.partitions = {}     # {partition: {FOODS: Counter, BASKETS: Counter}}
+        self.combinations = {}   # {(partition, cardinality): Counter}, made on the first query (see query)
+        self.sketches = {}       # {(partition, cardinality): CountMinSketch}, the same for the approximate mode
+        self.first_date = self.last_date = None
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """
+        df: the long df_eating (whole history)
+        """
+        counters = cls()
+        df = df[df[DISPLAYNAME].notna()]
+        if len(df) == 0:
+            return counters
+
+        aggregation = {'symptom_same_day': 'first', 'symptom_next_day': 'first',
+                       'avg_impairment': 'first', DISPLAYNAME: list}
+        meals = df.groupby(['date', 'daytime'])[list(aggregation)].agg(aggregation).reset_index()
+        for row in zip(to_datetime(meals['date']), meals['daytime'], meals[DISPLAYNAME], meals['symptom_same_day'],
+                       meals['symptom_next_day'], meals['avg_impairment']):
+            counters.add_meal(*row)
+        return counters
+
+    def add_meal(self, date, daytime, foods, symptom_same_day=False, symptom_next_day=False, avg_impairment=None):
+        """
+        Adds a meal (or replaces it if a meal with the same date and daytime is already there,
+        e.g. if a symptom has been reported afterwards)
+        foods: list of food names (duplicates are counted for the food frequencies only)
+        """
+        key = (to_datetime(date), daytime)
+        if key in self.meals:
+            self.remove_meal(*key)
+
+        impairment_level = None if isnull(avg_impairment) else floor(avg_impairment)  # see `query`
+        partition = (daytime, bool(symptom_same_day), bool(symptom_next_day), impairment_level)
+        self.meals[key] = (partition, tuple(foods))
+        self._update(partition, foods, +1)
+        self.first_date = key[0] if self.first_date is None else min(self.first_date, key[0])
+        self.last_date = key[0] if self.last_date is None else max(self.last_date, key[0])
+
+    def remove_meal(self, date, daytime):
+        """
+        Removes the meal with the date and daytime (nothing happens if there is none)
+        """
+        key = (to_datetime(date), daytime)
+        if key not in self.meals:
+            return
+        partition, foods = self.meals.pop(key)
+        self._update(partition, foods, -1)
+        if key[0] in (self.first_date, self.last_date):
+            dates = [date for date, _ in self.meals]
+            self.first_date, self.last_date = (min(dates), max(dates)) if dates else (None, None)
+
+    def _update(self, partition, foods, sign):
+        """
+        helper function: counts a meal in (sign=+1) or out (sign=-1)
+        """
+        if partition not in self.partitions:
+            self.partitions[partition] = {FOODS: Counter(), BASKETS: Counter()}
+        counters = self.partitions[partition]
+        basket = frozenset(foods)
+
+        changes = [(counters[FOODS], Counter(foods)), (counters[BASKETS], {basket: 1})]
+        changes += [(self.combinations[partition, cardinality], count_combinations_of_baskets({basket: 1}, cardinality))
+                    for cardinality in (PAIRS, TRIPLES) if (partition, cardinality) in self.combinations]
+        for counter, counts in changes:
+            for k, n in counts.items():
+                counter[k] += sign * n
+                if counter[k] <= 0:
+                    del counter[k]   # a Counter keeps the zeros otherwise
+        for cardinality in (PAIRS, TRIPLES):
+            self.sketches.pop((partition, cardinality), None)   # made again on the next query (no removal from a sketch)
+
+    def _get_combinations(self, partition, cardinality):
+        """
+        helper function: the pairs/triples of a partition, counted from its baskets on the first call
+        """
+        key = (partition, cardinality)
+        if key not in self.combinations:
+            self.combinations[key] = count_combinations_of_baskets(self.partitions[partition][BASKETS], cardinality)
+        return self.combinations[key]
+
+    def _get_sketch(self, partition, cardinality):
+        """
+        helper function: the same as _get_combinations, estimated
+        """
+        key = (partition, cardinality)
+        if key not in self.sketches:
+            self.sketches[key] = sketch_combinations_of_baskets(self.partitions[partition][BASKETS], cardinality)
+        return self.sketches[key]
+
+    def _select_partitions(self, meals_selector=None, symptom_selector=None, impairment_selector=None):
+        """
+        helper function: the partitions matching the selectors' values (tuples, like the keys of self.partitions)
+        """
+        df_partitions = DataFrame(list(self.partitions.keys()), columns=self.PARTITION_COLUMNS)
+        df_partitions['avg_impairment'] = df_partitions['avg_impairment'].astype(float)   # None -> NaN
+        df_partitions = subset_data_by_selector_values(df_partitions, meals_selector=meals_selector,
+                                                                      symptom_selector=symptom_selector,
+                                                                      impairment_selector=impairment_selector)
+        return [tuple(None if isnull(e) else e for e in partition) for partition in df_partitions.itertuples(index=False)]
+
+    def covers(self, start_date, end_date):
+        """
+        Do the dates (e.g. from the date picker) cover the whole history?
+        """
+        if not self.meals:
+            return True
+        return (to_datetime(str(start_date)[:10]) <= self.first_date
+                and self.last_date <= to_datetime(str(end_date)[:10]))
+
+    def query(self, what, meals_selector=None, symptom_selector=None, impairment_selector=None):
+        """
+        Merges the counters of the partitions matching the selectors' values.
+
+        what: FOODS, BASKETS, PAIRS or TRIPLES
+        impairment_selector: the slider value k -> avg_impairment >= k
+                             (the partitions keep floor(avg_impairment) which gives the same result for int k)
+        Returns:
+            collections.Counter object (ordered like count_combinations, see sort_counter on computations.py)
+        """
+        if not self.partitions:
+            return Counter()
+
+        result = Counter()
+        for partition in self._select_partitions(meals_selector, symptom_selector, impairment_selector):
+            result.update(self._get_combinations(partition, what) if what in (PAIRS, TRIPLES)
+                          else self.partitions[partition][what])
+        return sort_counter(result)
+
+    def query_sketch(self, cardinality, meals_selector=None, symptom_selector=None, impairment_selector=None):
+        """
+        Approximate mode: the pairs/triples estimated, the sketches of the partitions matching the selectors merged
+        (the exact pairs/triples are not counted)
+        cardinality: PAIRS or TRIPLES
+        Returns:
+            sketches.CountMinSketch object (see make_figure_7 on plotting_toolkit.py)
+        """
+        partitions = self._select_partitions(meals_selector, symptom_selector, impairment_selector) if self.partitions else []
+        if not partitions:
+            return CountMinSketch()
+        return merge_sketches(self._get_sketch(partition, cardinality) for partition in partitions)
+
+    def to_dict(self):
+        """
+        json-serializable dict (e.g. to be saved alongside the cached df's): the meals,
+        the counts are made again from them by from_dict
+        """
+        return {'meals': [[date.isoformat(), daytime, list(foods), *partition[1:]]
+                          for (date, daytime), (partition, foods) in self.meals.items()]}
+
+    @classmethod
+    def from_dict(cls, d):
+        counters = cls()
+        for date, daytime, foods, same_day, next_day, impairment_level in d['meals']:
+            counters.add_meal(date, daytime, foods, same_day, next_day, impairment_level)
+        return counters
+
+    def __len__(self):
+        return len(self.meals)
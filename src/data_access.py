@@ -3,9 +3,9 @@
 helper functions for data access for BesserEsser dashboard
 """
 
-
-from sqlalchemy import create_engine
-import psycopg2                        # pip install psycopg2-binary
+import os
+# sqlalchemy and the driver (pip install psycopg2-binary) are slow to import: 
+# imported on the first connection (see make_sqlalchemy_engine), i.e. not on the start of the app
 from dotenv import dotenv_values       # pip install python-dotenv
 from pandas import read_sql_query
 from constants import DEBUG, ERR_PREFIX, DRIVER, SCHEMA
@@ -16,6 +16,9 @@ DRIVER # is imported from constants.py
 SCHEMA # is imported from constants.py
 # Change the DRIVER and SCHEMA names in constants.py or transfer their definitions here.
 
+# The engine of this process (see get_sqlalchemy_engine): engine, pid
+_ENGINE = [None, None]
+
 
 
 def make_sqlalchemy_engine():
@@ -33,6 +36,8 @@ def make_sqlalchemy_engine():
     import psycopg2 
     """
 
+    from sqlalchemy import create_engine   # the driver is imported by sqlalchemy
+
     # SQL datbase credentials - define constants as they appear in your .env file
     HOST = 'host'
     PORT = 'port'
@@ -89,6 +94,23 @@ def make_sqlalchemy_engine():
 
 
 
+def get_sqlalchemy_engine():
+    """
+    The engine made once (see make_sqlalchemy_engine, i.e. the .env is read and the connection 
+    approaches are tried once) and reused by all the requests afterwards.
+    The engine made before forking (e.g. gunicorn --preload, see wsgi.py) is kept by the worker processes
+    but its pool is not: the connections of the parent are left alone (dispose(close=False))
+    """
+    engine, pid = _ENGINE
+    if engine is None:
+        _ENGINE[:] = make_sqlalchemy_engine(), os.getpid()
+    elif pid != os.getpid():   # a forked worker
+        engine.dispose(close=False)
+        _ENGINE[1] = os.getpid()
+    return _ENGINE[0]
+
+
+
 def check_account(account_id, engine=None):
     """
     TODO
@@ -114,8 +136,8 @@ def check_account(account_id, engine=None):
         return ValueError  # will not be raised - just to tell that the value passed is bad
                            # and avoid using a non built-in object
     
-    # Start an sqlalchemy engine
-    engine = engine or make_sqlalchemy_engine()
+    # The sqlalchemy engine (made once)
+    engine = engine or get_sqlalchemy_engine()
     
     # User not found -> None
     query_has_account = f"SELECT COUNT({ID}) FROM {SCHEMA}.{TABLE_ACCOUNT} WHERE id = (%s);"
@@ -86,3 +86,18 @@ def subset_data_by_selector_values(df, meals_selector=None,
     # Subset the df_subset with the universal boolean mask
     return df[mask]
 
+
+
+
+def subset_incidence_matrix(incidence, start_date, end_date, meals_selector=None,
+                                                            symptom_selector=None,
+                                                            impairment_selector=None):
+    """
+    The same filtering as above but applied directly to the rows of an IncidenceMatrix
+    (computations.py) - i.e. to the meals df it holds, the matrix is then subset by the row positions
+    """
+    meals = subset_data_by_dates(incidence.meals, start_date=start_date, end_date=end_date)
+    meals = subset_data_by_selector_values(meals, meals_selector=meals_selector,
+                                                  symptom_selector=symptom_selector,
+                                                  impairment_selector=impairment_selector)
+    return incidence.subset(meals.index)
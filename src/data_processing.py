@@ -4,9 +4,27 @@ helper functions for data processing for BesserEsser dashboard
 """
 
 import re
+from hashlib import sha1
+from collections import OrderedDict
+from threading import Lock
 from pandas import to_datetime, Timedelta
-from data_access import make_sqlalchemy_engine, fetch_eating_data, fetch_symptoms_data
-from constants import DEBUG, ERR_PREFIX, MEALS_MAPPING
+from data_access import get_sqlalchemy_engine, check_account, fetch_eating_data, fetch_symptoms_data
+from computations import IncidenceMatrix, compute_day_table, get_dates_range
+from counters import FoodCounters
+from caching import session_store, table_store, subset_store, single_flight, make_fingerprint
+from data_filtering import subset_data_by_dates
+from table_toolkit import encode_frame, decode_frame, make_diary_table
+from constants import DEBUG, ERR_PREFIX, MEALS_MAPPING, SERVER_SIDE_STORE
+
+
+# Objects derived from the whole history of an account (built once per account):
+# {fingerprint of the stored json: {name: object}}
+_ACCOUNT_ARTIFACTS = OrderedDict()
+_MAX_ACCOUNTS = 16
+_ACCOUNT_ARTIFACTS_LOCK = Lock()   # the callbacks run in threads
+
+# The df's of an account (in the order of store_1, store_2)
+FRAMES = ('eating', 'symptoms')
 
 
 
@@ -22,13 +40,12 @@ def get_dataframes(account_id, engine=None):
         two df's: pandas.DataFrame object otherwise (empty or not)
     """
 
-    # Start an sqlalchemy engine
-    engine = engine or make_sqlalchemy_engine()
+    # The sqlalchemy engine (made once)
+    engine = engine or get_sqlalchemy_engine()
 
     # Fetch data
     df_eating = fetch_eating_data(account_id, engine)     # in data_access.py
     df_symptoms = fetch_symptoms_data(account_id, engine) # in data_access.py
-    del engine    # not really necessary (according to sqlalchemy docs)
 
     # Clean data
     df_eating = clean_eating_data(df_eating)
@@ -43,6 +60,207 @@ def get_dataframes(account_id, engine=None):
 
 
 
+@single_flight.coalesce('load_account', lambda account_id: str(account_id))   # e.g. several tabs on one account
+def load_account(account_id):
+    """
+    All the df's of an account: the two tables from the database
+    (everything else is derived from them on demand, e.g. the diary - see get_diary)
+    The same account being loaded by another thread at the moment -> its df's are shared (see SingleFlight)
+    Returns:
+        {name: df} with the names in FRAMES
+    """
+    df_eating, df_symptoms, *_ = get_dataframes(account_id=account_id)
+    return dict(zip(FRAMES, (df_eating, df_symptoms)))
+
+
+
+def write_store(account_id, frames):
+    """
+    The values for store_1, store_2 (the dcc.Store's in the user's browser session):
+    the same token for both (the df's are kept on the server, see SessionStore on caching.py)
+    or the df's encoded (json, Arrow...) if SERVER_SIDE_STORE is False (see encode_frame on table_toolkit.py)
+
+    frames: {name: df} as returned by load_account
+    """
+    if SERVER_SIDE_STORE:
+        token = session_store.put(account_id, frames)
+        return tuple(token for _ in FRAMES)
+    return tuple(encode_frame(frames[name]) for name in FRAMES)
+
+
+
+def read_store(data, name):
+    """
+    The df from the value of a store (see write_store).
+    A token whose df's have expired (or were evicted or are in another worker process)
+    -> the df's are fetched from the database again and kept under the same token.
+
+    data: the value of store_1 or store_2 (token or an encoded df)
+    name: one of FRAMES, e.g. 'eating' (not used for an encoded df)
+    """
+    if not is_token(data):
+        return decode_frame(data)
+
+    df = session_store.get(data, name)
+    if df is not None:
+        return df
+
+    account_id = data.split(':')[0]
+    if check_account(account_id=account_id) is not True:   # validates the id too (it comes from the browser)
+        raise ValueError(f"{ERR_PREFIX}cannot refetch the data for the token {data}")
+    frames = load_account(account_id)
+    session_store.put(account_id, frames, token=data)
+    return frames[name]
+
+
+
+def publish_table(unit_id, df):
+    """
+    DEBUG mode: keeps the df behind a table for debugging on the server (see instantiate_debug_table on table_toolkit.py)
+    Returns:
+        the key (str) for the dcc.Store "<table id>_key", None if not in DEBUG mode
+    """
+    if not DEBUG:
+        return None
+    return table_store.put(unit_id, {'table': df})
+
+
+
+def get_published_table(key):
+    """
+    Returns:
+        the df kept by publish_table or None (no key, expired or evicted)
+    """
+    return None if not key else table_store.get(key, 'table')
+
+
+
+def is_token(data):
+    """
+    A token (see SessionStore.make_token) or an encoded df (see encode_frame on table_toolkit.py)?
+    """
+    return session_store.is_token(data)
+
+
+
+def write_subset(data_eating, data_symptomreport, start_date, end_date, new_data=False):
+    """
+    The value of store_subset: a handle of the df's subset by dates.
+    The subsets are made once per date range (see update_subset on app.py) and kept on the server,
+    the unit callbacks read them with read_subset.
+
+    new_data: True if the stores have changed (a new account) -> the units reset their selectors
+    Returns:
+        {'key': str, 'start_date': ..., 'end_date': ..., 'new_data': bool}
+    """
+    key = f"subset:{make_fingerprint(data_eating, data_symptomreport, start_date, end_date)[:20]}"
+
+    def make_subset():
+        if subset_store.get(key, FRAMES[0]) is None:
+            frames = {name: subset_data_by_dates(read_store(data, name), start_date=start_date, end_date=end_date)
+                      for name, data in zip(FRAMES, (data_eating, data_symptomreport))}
+            subset_store.put('subset', frames, token=key)
+
+    # made once even if several units miss it at the same time (see read_subset)
+    single_flight.do('write_subset', key, make_subset)
+    return {'key': key, 'start_date': start_date, 'end_date': end_date, 'new_data': new_data}
+
+
+
+def read_subset(handle, name, data_eating, data_symptomreport):
+    """
+    The df subset by dates (see write_subset).
+    Made again if not there (expired, evicted or made by another worker process).
+
+    handle: the value of store_subset
+    name: one of FRAMES
+    data_eating, data_symptomreport: the values of store_1 and store_2 (used on a miss only)
+    """
+    df = subset_store.get(handle['key'], name)
+    if df is None:
+        write_subset(data_eating, data_symptomreport, handle['start_date'], handle['end_date'])
+        df = subset_store.get(handle['key'], name)
+    return df
+
+
+
+def get_account_artifact(data_eating, name, func, *args):
+    """
+    Returns func(*args) computed once per account (i.e. per stored json) and reused afterwards.
+    The least recently used accounts are dropped (see _MAX_ACCOUNTS).
+
+    Arguments:
+        data_eating: the str stored in the user's browser session, a token or json (used as the key only)
+        name: str, the name of the artifact, e.g. 'incidence_matrix'
+        func, args: to build the artifact on the first call 
+                    (once, even if several callbacks ask for it at the same time, see SingleFlight)
+    """
+    key = sha1(data_eating.encode()).hexdigest()
+
+    # the dict of the account is taken under the lock (another thread may evict it right after,
+    # the artifacts made for it are then still returned, just not kept)
+    with _ACCOUNT_ARTIFACTS_LOCK:
+        if key in _ACCOUNT_ARTIFACTS:
+            _ACCOUNT_ARTIFACTS.move_to_end(key)
+        else:
+            _ACCOUNT_ARTIFACTS[key] = {}
+            while len(_ACCOUNT_ARTIFACTS) > _MAX_ACCOUNTS:
+                _ACCOUNT_ARTIFACTS.popitem(last=False)   # the least recently used
+        artifacts = _ACCOUNT_ARTIFACTS[key]
+
+    def make_artifact():
+        if name not in artifacts:
+            artifacts[name] = func(*args)
+        return artifacts[name]
+
+    if name not in artifacts:
+        return single_flight.do(name.split(':')[0], (key, name), make_artifact)
+    return artifacts[name]
+
+
+
+def get_incidence_matrix(data_eating):
+    """
+    Returns the meal x food IncidenceMatrix (computations.py) for the whole history of the account.
+    The rows are to be subset with `subset_incidence_matrix` (data_filtering.py).
+    The df is read from the store on the first call only.
+    """
+    return get_account_artifact(data_eating, 'incidence_matrix',
+                                lambda: IncidenceMatrix.from_dataframe(read_store(data_eating, 'eating')))
+
+
+
+def get_food_counters(data_eating):
+    """
+    Returns the FoodCounters (counters.py) for the whole history of the account.
+    """
+    return get_account_artifact(data_eating, 'food_counters',
+                                lambda: FoodCounters.from_dataframe(read_store(data_eating, 'eating')))
+
+
+
+def get_day_table(data_eating, data_symptomreport):
+    """
+    Returns the day table (compute_day_table on computations.py) for the whole history of the account,
+    i.e. the "Eckdaten" (unit 2) for a date range are computed from the rows of the days in that range only.
+    """
+    name = f"day_table:{sha1(data_symptomreport.encode()).hexdigest()}"   # json: store_1 alone does not identify the symptoms
+    return get_account_artifact(data_eating, name, lambda: compute_day_table(read_store(data_eating, 'eating'),
+                                                                             read_store(data_symptomreport, 'symptoms')))
+
+
+
+def get_diary(data_eating, data_symptomreport):
+    """
+    Returns the diary table (make_diary_table on table_toolkit.py) for the whole history of the account,
+    made from the stored df's on the first call (the diary is not stored, it is derived from them)
+    """
+    name = f"diary:{sha1(data_symptomreport.encode()).hexdigest()}"   # json: store_1 alone does not identify the symptoms
+    return get_account_artifact(data_eating, name, lambda: make_diary_table(read_store(data_eating, 'eating'),
+                                                                            read_store(data_symptomreport, 'symptoms')))
+
+
+
 def clean_eating_data(df):
     """
     note: displayname will not be cleaned here
@@ -4,9 +4,41 @@ developer helper functions
 for the BesserEsser dashboard
 """
 
-from dash import dcc, Input, Output
+from functools import lru_cache
+from dash import dcc, Input, Output, State
 from dash.dash_table import DataTable
-from constants import DASH_COMPONENTS_CLASSES
+from dash.development.base_component import Component
+from constants import DASH_COMPONENTS_CLASSES, ERR_PREFIX
+
+
+
+# What is found in a unit (made once per unit: when get_callback_args registers the unit's callback 
+# or on the first call, i.e. no tree traversal per request): {id(unit): (unit, components, default values)}
+# (the unit is kept to keep its id from being reused)
+_UNITS = {}
+
+# The attributes of the namespace of a callback's components (see make_handy_namespace), followed by selector1..N
+NAMESPACE_ATTRIBUTES = ("data_subset",   # store_subset: the handle of the df's subset by dates (units 2-8 only)
+                        "data_eating",   # store_1: token or json (see write_store on data_processing.py)
+                        "data_symptomreport",  # store_2
+                        "start_date", 
+                        "end_date", 
+                        "timespan_dropdown")
+
+
+
+def _introspect(unit):
+    """
+    helper function: the dash components and the default values of the selectors of a unit, found once.
+    A plain list of components (not a dash component) is walked every time (it can change)
+    """
+    entry = _UNITS.get(id(unit))
+    if entry is None:
+        components = tuple(_find_dash_components(unit))
+        entry = (unit, components, tuple(_find_default_values(components)))
+        if isinstance(unit, Component):
+            _UNITS[id(unit)] = entry
+    return entry
 
 
 
@@ -14,12 +46,22 @@ def get_default_values(unit):
     """
     TODO: docs
     Determine the default values of the selectors in a given unit dynamically 
+    (found once per unit, see _introspect)
+    """
+    return list(_introspect(unit)[2])
+
+
+
+def _find_default_values(components):
+    """
+    helper function for get_default_values
+    components: the dash components of a unit (see get_dash_components_from_unit)
     """
 
     # Initialize an empty list to append item to it
     collector = []
 
-    for e in get_dash_components_from_unit(unit):
+    for e in components:
         if e.__class__ in DASH_COMPONENTS_CLASSES and hasattr(e, 'options'):
             if hasattr(e.options, '__len__') and len(e.options) > 0: 
                 collector.append(e.options[0]['value'] if type(e.options[0]) is dict else e.options[0])
@@ -36,14 +78,46 @@ def get_default_values(unit):
 
 
 
+def get_selector_values(unit):
+    """
+    All the values of each selector in a given unit (in the order of get_default_values, the default value first),
+    e.g. to make the figures for every combination of the selectors ahead of time (see prefetch_units on app.py)
+    Returns:
+        list of lists
+    """
+    collector = []
+
+    for e in get_dash_components_from_unit(unit):
+        if e.__class__ in DASH_COMPONENTS_CLASSES and hasattr(e, 'options'):
+            values = [option['value'] if type(option) is dict else option for option in (e.options or [])]
+            collector.append(values or [None])
+        elif type(e) is dcc.DatePickerRange:
+            collector.extend([[e.min_date_allowed or e.start_date], [e.max_date_allowed or e.end_date]])
+        elif type(e) is dcc.Slider:
+            collector.append(list(range(e.min, e.max + 1, e.step or 1)))
+        elif type(e) is dcc.Checklist:
+            "add more functionality when needed"
+
+    return collector
+
+
+
 def get_dash_components_from_unit(unit):
     """
-    Get dash components from a unit recursively.
+    Get dash components from a unit recursively (once per unit, see _introspect).
     Used by the get_callback_args function (see below)
     
     Args:
         unit: dash.html.Div or array of dash components
     """
+    return list(_introspect(unit)[1])
+
+
+
+def _find_dash_components(unit):
+    """
+    helper function for get_dash_components_from_unit: the recursive walk through the unit
+    """
 
     collector = []
 
@@ -93,9 +167,15 @@ def get_callback_args(unit, parent):
 
     collector = [[], 
                  [Input(component_id='store_1', component_property='data'),  # df_eating
-                  Input(component_id='store_2', component_property='data'),  # df_symptomreprot
-                  Input(component_id='store_3', component_property='data')], # df_diary
+                  Input(component_id='store_2', component_property='data')], # df_symptomreprot
                  [], []]
+
+    # The units under unit_1 are triggered by the df's subset by dates (made once for all of them,
+    # see update_subset on app.py), the stores and unit_1's selectors are passed in as State
+    if parent:
+        collector[1] = [Input(component_id='store_subset', component_property='data'),
+                        State(component_id='store_1', component_property='data'),
+                        State(component_id='store_2', component_property='data')]
     
     for e in get_dash_components_from_unit(unit):
         if type(e) is dcc.DatePickerRange:
@@ -105,8 +185,12 @@ def get_callback_args(unit, parent):
             collector[-1].append(Input(e, component_property='end_date'))
         elif type(e) is dcc.Graph:
             collector[0].append(Output(e, component_property='figure'))
+        elif type(e) is DataTable and getattr(e, 'page_action', None) == 'custom':
+            "paged on the server - has its own callback (see the paging callbacks on app.py)"
         elif type(e) is DataTable:
             collector[0].append(Output(e, component_property='data'))
+        elif type(e) is dcc.Store:
+            collector[0].append(Output(e, component_property='data'))   # e.g. the key of a table for debugging
         elif hasattr(e, 'value'):
             collector[0].append(Output(e, component_property='value'))
             collector[-1].append(Input(e, component_property='value'))
@@ -116,54 +200,66 @@ def get_callback_args(unit, parent):
     if parent:
         for e in get_dash_components_from_unit(parent):
             if type(e) is dcc.DatePickerRange:
-                collector[2].append(Input(e, component_property='start_date'))
-                collector[2].append(Input(e, component_property='end_date'))
+                collector[2].append(State(e, component_property='start_date'))
+                collector[2].append(State(e, component_property='end_date'))
             elif hasattr(e, 'value'):
-                collector[2].append(Input(e, component_property='value'))
+                collector[2].append(State(e, component_property='value'))
             elif True:
                 "add more hard-coded logic as necessary"
+
+    # the namespace type for the components the callback will get (see make_handy_namespace)
+    get_namespace_type(sum(map(len, collector[1:])), has_subset=bool(parent))
     
     return list(sum(collector, []))
 
 
 
-def make_handy_namespace(components):
+def make_handy_namespace(components, has_subset):
     """
     collections.namedtuple or typing.NamedTuple
     won't do the job - not possible to create them dynamically AND use indexing AND be mutable
+    The type is made once per number of components (see get_namespace_type)
+
+    has_subset: True if the callback gets the subset handle first, i.e. it was registered
+                with get_callback_args(unit, parent=...) (the units under unit_1)
+    """
+    return get_namespace_type(len(components), has_subset)(components)
+
+
+
+@lru_cache(maxsize=None)
+def get_namespace_type(n_components, has_subset=True):
+    """
+    The type of the namespace for a callback's components (see make_handy_namespace):
+    attribute access (NAMESPACE_ATTRIBUTES, then selector1..N), indexing and slicing, mutability.
+    Made once per number of components (when get_callback_args registers the callback), the attributes are __slots__
     """
+    attributes = NAMESPACE_ATTRIBUTES if has_subset else NAMESPACE_ATTRIBUTES[1:]
+    attributes = (attributes + tuple(f"selector{i+1}" for i in range(n_components - len(attributes))))[:n_components]
 
     class Components():
+        __slots__ = attributes
+
         def __init__(self, components):
-            self.__dict__['list'] = list(components)
-            attributes = [
-                  "json_eating",   # comment
-                  "json_symptomreport",  # comment
-                  "json_diary",
-                  "start_date", 
-                  "end_date", 
-                  "timespan_dropdown",  # comment
-                  ]
-            self.__dict__['attributes'] = attributes + [f"selector{i+1}" for i in range(len(components)-len(attributes))]
-            for k,v in zip(self.attributes, self.list):
-                self.__dict__[k] = v
-    
+            for k, v in zip(attributes, components):
+                setattr(self, k, v)
         def __getitem__(self, index_or_slice):
-            return self.list[index_or_slice]
+            if type(index_or_slice) is slice:
+                return [getattr(self, k) for k in attributes[index_or_slice]]
+            return getattr(self, attributes[index_or_slice])   # IndexError -> the end of the iteration
         def __setitem__(self, index_or_slice, value):
-            self.list[index_or_slice] = value
-            [setattr(self, k, v) for k,v in zip(self.attributes, self.list)]
-        def __setattr__(self, attr, value):
-            self.__dict__[attr] = value
-            self.list[self.attributes.index(attr)] = value
+            if type(index_or_slice) is slice:
+                for k, v in zip(attributes[index_or_slice], value):
+                    setattr(self, k, v)
+            else:
+                setattr(self, attributes[index_or_slice], value)
         def __len__(self):
-            return len(self.list)
+            return len(attributes)
         def __str__(self):
-            temp = [e if len(str(e))<20 else "json..." for e in self.list]
+            temp = [e if len(str(e))<20 else "json..." for e in self[:]]
             return f"{self.__class__.__name__}({temp})"
         def __repr__(self):
             return self.__str__()
-    
-    ins = Components(components)
-    return ins
 
+    Components.has_subset = has_subset   # class attribute (see UnitRegistry.build on registry.py)
+    return Components
@@ -5,21 +5,39 @@ Custom-made plotting functions for the BesserEsser dashboard
 
 """
 
+import json
 import plotly.graph_objects as go
+from plotly.utils import PlotlyJSONEncoder
+from dash import Patch
 from plotly.subplots import make_subplots
-import plotly.express as px
-from pandas import DataFrame
+from plotly.colors import sequential   # px.colors.sequential without importing plotly.express
+from pandas import DataFrame, Series
 from collections import Counter
-from math import log
-from computations import compute_combination_occurrence, get_dates_range, compute_n_rows_n_cols
-from constants import DEBUG, ERR_PREFIX, MEALS_MAPPING, TEXT_UNIT_3, A, B, C, D, E
+from functools import lru_cache
+from math import ceil
+from computations import IncidenceMatrix, get_dates_range, compute_n_rows_n_cols
+from computations import compute_approximate_counts, iterate_combinations, compute_timeline, sort_counter
+from constants import DEBUG, ERR_PREFIX, MEALS_MAPPING, TEXT_UNIT_3, TEXT_APPROXIMATE, A, B, C, D, E
+from constants import APPROXIMATE_MODE, TYPICAL_MEAL_SIMILARITY
+from constants import TIMELINE_WEBGL, TIMELINE_WEBGL_MIN_DAYS, TIMELINE_WIDTH_PX, TIMELINE_MARKER_SIZE
+from constants import FAST_FIGURES
+from sketches import cluster_similar_sets, CountMinSketch
+from registry import unit_registry
 from constants import WEBPAGE_BACKGROUND_COLOR, GRAPH_MARGINS_COLOR, GRAPH_PLOTTING_AREA_COLOR
 from constants import DISPLAYNAME  # regex'ed 'displayname' or the original column
 
 
-# Define the style and colors (optional)
-px.defaults.color_discrete_sequence = px.colors.qualitative.T10  #https://plotly.com/python/discrete-color/
-px.defaults.color_continuous_scale = px.colors.sequential.Jet    #https://plotly.com/python/builtin-colorscales/
+@lru_cache(maxsize=1)
+def _get_px():
+    """
+    helper function: plotly.express is slow to import -> imported on the first figure made with it
+    (or by warm_up_plotly before serving), its style and colors are defined then
+    """
+    import plotly.express as px
+    # Define the style and colors (optional)
+    px.defaults.color_discrete_sequence = px.colors.qualitative.T10  #https://plotly.com/python/discrete-color/
+    px.defaults.color_continuous_scale = px.colors.sequential.Jet    #https://plotly.com/python/builtin-colorscales/
+    return px
 
 
 
@@ -29,18 +47,11 @@ def make_figure(unit, *args, **kwargs):
     dispatcher function
     Arguments:
         unit: int, str or unit object (i.e. dash.html.Div with id='unit_3' for example)
+    The plotting function is the one the unit is registered with (see unit_registry.register on app.py)
     """
-    
-    # Get int from the client's input 'unit'
-    unit_number = int(str.join('', (c for c in str(unit.id if hasattr(unit, 'id') else unit) if c.isdecimal())))
-
-    mapping = {3: make_figure_3,
-               4: make_figure_4,
-               5: make_figure_5,
-               6: make_figure_6,
-               7: make_figure_7}
-    
-    func = mapping.get(unit_number, make_figure_test)
+    unit_id = getattr(unit, 'id', f"unit_{unit}" if type(unit) is int else unit)
+    spec = unit_registry.get(unit_id)
+    func = spec.plot if spec is not None else make_figure_test
     return func(*args, **kwargs)
 
     
@@ -78,20 +89,47 @@ def get_figure_title(*args):
     
 
 
+def build_figure(make_dict, make_object, *args, **kwargs):
+    """
+    Makes a figure with the fast builder (a plain dict, no validation by plotly) if FAST_FIGURES,
+    otherwise with the plotly builder (both give the same figure, see tests/test_figures.py)
+
+    make_dict: e.g. make_tiles_dict
+    make_object: e.g. make_tiles_plot (the equivalent plotly builder)
+    """
+    if not FAST_FIGURES:
+        return make_object(*args, **kwargs)
+
+    return make_dict(*args, **kwargs)
+
+
+
+def set_figure_title(fig, title):
+    """
+    fig.update_layout(title=title) for both plotly figures and dicts (see build_figure)
+    """
+    if type(fig) is not dict:
+        return fig.update_layout(title=title)
+    if title is not None:
+        fig['layout']['title'] = {'text': title}
+    return fig
+
+
+
 def _get_colors(items, color=None):
     """
     helper function 
     only for make_tiles_plot and make_pie_plot
     """
-    mapping = {A: px.colors.sequential.Blues,   # all days
-             B: px.colors.sequential.Greens,    # days with no symptoms
-             C: px.colors.sequential.Reds,      # days with symptoms
-             D: px.colors.sequential.Oranges,   # days prior to symptoms
-             "reds": px.colors.sequential.Reds, 
-             "red": px.colors.sequential.Reds,
-             None: px.colors.sequential.Turbo}  # just in case
+    mapping = {A: sequential.Blues,   # all days
+             B: sequential.Greens,    # days with no symptoms
+             C: sequential.Reds,      # days with symptoms
+             D: sequential.Oranges,   # days prior to symptoms
+             "reds": sequential.Reds, 
+             "red": sequential.Reds,
+             None: sequential.Turbo}  # just in case
     
-    colors = mapping.get(color, px.colors.sequential.Turbo)[1:]    # drop of the white 
+    colors = mapping.get(color, sequential.Turbo)[1:]    # drop of the white 
     n = len(items)
     return [colors[i * len(colors) // n] for i in range(n)][::-1]  # reverse - from dark to light
 
@@ -103,6 +141,7 @@ def make_tiles_plot(items=None, values=None, color=None):
     Returns a plotly figure.
     """
 
+    px = _get_px()
     fig = px.treemap(names=items,
                      values=values, 
                      parents=[""]*len(items),    
@@ -114,6 +153,27 @@ def make_tiles_plot(items=None, values=None, color=None):
 
 
 
+def make_tiles_dict(items=None, values=None, color=None):
+    """
+    Fast path for make_tiles_plot (see FAST_FIGURES on constants.py): the same figure as a dict
+    """
+    items = Series(items).tolist()
+    trace = {'domain': {'x': [0.0, 1.0], 'y': [0.0, 1.0]},
+             'hovertemplate': "label=%{label}<br>value=%{value}<br>parent=%{parent}<extra></extra>",
+             'labels': items,
+             'name': "",
+             'parents': [""] * len(items),
+             'values': Series(values).tolist(),
+             'type': 'treemap'}
+    layout = {'template': _get_default_template_dict(),
+              'legend': {'tracegroupgap': 0},
+              'margin': {'t': 60},
+              'treemapcolorway': _get_colors(items, color),
+              'coloraxis': {'showscale': False}}
+    return {'data': [trace], 'layout': layout}
+
+
+
 def make_pie_plot(items, color):
     """
     Legacy function.
@@ -182,6 +242,39 @@ def make_pies_plot(list_of_lists, color):
 
 
 
+def make_pies_dict(list_of_lists, color):
+    """
+    Fast path for make_pies_plot (see FAST_FIGURES on constants.py): the same figure as a dict,
+    the domains of the pies are computed like make_subplots does (with its default spacing)
+    """
+    LINE_WIDTH = 2
+
+    # just in case
+    if not list_of_lists:
+        return no_data_available()
+
+    n_rows, n_cols = compute_n_rows_n_cols(len(list_of_lists))
+    h_spacing, v_spacing = 0.2 / n_cols, 0.3 / n_rows     # make_subplots defaults
+    width = (1 - h_spacing * (n_cols - 1)) / n_cols
+    height = (1 - v_spacing * (n_rows - 1)) / n_rows
+
+    traces = []
+    for i,items in enumerate(list_of_lists):
+        row, col = divmod(i, n_cols)   # zero-based, row 0 is on top
+        x0, y1 = col * (width + h_spacing), 1 - row * (height + v_spacing)
+        traces.append({'hoverinfo': 'skip',
+                       'labels': list(items),
+                       'name': str(i),
+                       'type': 'pie',
+                       'domain': {'x': [x0, x0 + width], 'y': [y1 - height, y1]},
+                       'marker': {'colors': _get_colors(items, color),
+                                  'line': {'color': '#000000', 'width': LINE_WIDTH}},
+                       'textinfo': 'label',
+                       'textposition': 'inside'})
+    return {'data': traces, 'layout': {'showlegend': False}}   # no template (like make_pies_plot)
+
+
+
 def make_figure_3(df_eating, df_symptoms, debugging_info=None):
     """
     Ernährungs- und Symptomtagebuch
@@ -194,48 +287,48 @@ def make_figure_3(df_eating, df_symptoms, debugging_info=None):
         plotly figure object
     """
 
-    # Define colors for BREAKFAST, LUNCH, DINNER
-    COLORS = ["yellow", "green", "blue"]
+    # no data -> no plot
+    if len(df_eating) == 0 and len(df_symptoms) == 0:
+        return no_data_available()
+
+    # all the data for the timeline at once (min/max dates from the union of the two df's)
+    date_range, has_symptoms, df_meals = compute_timeline(df_eating, df_symptoms)
+
+    fig = build_figure(make_timeline_dict, make_timeline_plot, date_range, has_symptoms, df_meals)
+    return set_figure_title(fig, get_figure_title(debugging_info))
 
-    # unite the dates from the two df's
-    dates = sorted(set(df_eating['date']).union(df_symptoms['date']))
-    n_dates = len(dates)
 
-    # no time to test this for bugs - (no data -> no plot)
-    if n_dates == 0:
-        return no_data_available()
 
-    # make a single timeline with dates (min/max from theunion of the two df's)
-    date_range = get_dates_range(df_eating, df_symptoms, False)
-    n_dates = len(date_range)
+def make_timeline_plot(date_range, has_symptoms, df_meals):
+    """
+    helper function for make_figure_3 (the arguments are returned by compute_timeline)
+    Returns:
+        plotly figure object
+    """
+
+    # Define colors for BREAKFAST, LUNCH, DINNER
+    COLORS = ["yellow", "green", "blue"]
 
-    # no time to guarantee this for future
-    x = date_range
-    y = [3 if date in df_symptoms['date'].values else 0 for date in date_range]
-  
-    # Set the size for the circle marker dynamically (maybe play with logarithm?)
-    arbitrary_number = 250                  # adjust manually
-    non_linear_scaler = 0.5 * log(n_dates)  # play with this
-    marker_size = int(arbitrary_number / n_dates * non_linear_scaler)  # no time to adjust this
+    # WebGL for long histories (SVG gets slow with thousands of markers)
+    Scatter = go.Scattergl if _use_webgl(len(date_range)) else go.Scatter
+    marker_size = _get_marker_size(len(date_range))
 
     # Bars = symptom
-    traces = [go.Bar(x=x, y=y, 
+    traces = [go.Bar(x=date_range, y=has_symptoms * 3, 
                      name=TEXT_UNIT_3,  # "Tage mit Symptomen"
                      hoverinfo='x',
-                     marker=dict(color='red', opacity=0.6)),]  #line=dict(width=marker_size)
+                     marker=dict(color='red', opacity=0.6, line=dict(width=0))),]  # no outlines (invisible for many bars anyway)
     
     # plot the groups of dots: for BREAKFAST, LUNCH, DINNER
+    daytimes = set(df_meals.index.get_level_values('daytime'))
     for i, daytime, mahlzeit, color in zip(range(3, 0, -1), 
                                             *zip(*list(MEALS_MAPPING.items())), 
                                             COLORS):
-        df_temp = df_eating.loc[df_eating['daytime'] == daytime, ['date',  DISPLAYNAME]].groupby('date').agg(list).sort_index()
-        df_temp[DISPLAYNAME] = df_temp[DISPLAYNAME].apply(", ".join)
-        df_temp['bar_height'] = i - 0.5   
-        trace = go.Scatter(x=df_temp.index, y=df_temp['bar_height'], 
-                           mode='markers', name=mahlzeit,
-                           text=df_temp[DISPLAYNAME], hoverinfo='text',  #'x+y+text'
-                           marker=go.scatter.Marker(color=color, 
-                                                    opacity=0.6, size=marker_size ))   #size=marker_size  
+        df_temp = df_meals.loc[daytime] if daytime in daytimes else df_meals.iloc[:0].droplevel('daytime')
+        trace = Scatter(x=df_temp.index, y=[i - 0.5] * len(df_temp), 
+                        mode='markers', name=mahlzeit,
+                        text=df_temp[DISPLAYNAME], hoverinfo='text',  #'x+y+text'
+                        marker=dict(color=color, opacity=0.6, size=marker_size))
         traces.append(trace)
     
     fig = go.Figure(data=traces)
@@ -245,14 +338,73 @@ def make_figure_3(df_eating, df_symptoms, debugging_info=None):
                                    tickvals = [2.5, 1.5, 0.5], 
                                    ticktext = list(MEALS_MAPPING.values())))
     fig.update_layout(height=300)  # adjust manually
-    fig.update_layout(title=get_figure_title(debugging_info))
     return fig
 
 
 
-def make_figure_4(df, color=None, debugging_info=None):
+def make_timeline_dict(date_range, has_symptoms, df_meals):
+    """
+    Fast path for make_timeline_plot (see FAST_FIGURES on constants.py): the same figure as a dict
+    """
+    COLORS = ["yellow", "green", "blue"]
+
+    scatter_type = 'scattergl' if _use_webgl(len(date_range)) else 'scatter'
+    marker_size = _get_marker_size(len(date_range))
+
+    traces = [{'hoverinfo': 'x', 
+               'marker': {'color': 'red', 'line': {'width': 0}, 'opacity': 0.6},
+               'name': TEXT_UNIT_3, 
+               'x': date_range.strftime('%Y-%m-%d').tolist(), 
+               'y': (has_symptoms * 3).tolist(), 
+               'type': 'bar'}]
+
+    daytimes = set(df_meals.index.get_level_values('daytime'))
+    for i, daytime, mahlzeit, color in zip(range(3, 0, -1), 
+                                            *zip(*list(MEALS_MAPPING.items())), 
+                                            COLORS):
+        df_temp = df_meals.loc[daytime] if daytime in daytimes else df_meals.iloc[:0].droplevel('daytime')
+        traces.append({'hoverinfo': 'text',
+                       'marker': {'color': color, 'opacity': 0.6, 'size': marker_size},
+                       'mode': 'markers',
+                       'name': mahlzeit,
+                       'text': df_temp[DISPLAYNAME].tolist(),
+                       'x': df_temp.index.strftime('%Y-%m-%d').tolist(),
+                       'y': [i - 0.5] * len(df_temp),
+                       'type': scatter_type})
+
+    layout = {'template': _get_default_template_dict(),
+              'xaxis': {'showgrid': False},
+              'yaxis': {'showgrid': False, 'tickmode': 'array', 'tickvals': [2.5, 1.5, 0.5], 
+                        'ticktext': list(MEALS_MAPPING.values())},
+              'height': 300}
+    return {'data': traces, 'layout': layout}
+
+
+
+def _use_webgl(n_dates):
+    """
+    helper function for the timeline: WebGL for long histories (SVG gets slow with thousands of markers)
+    """
+    return n_dates >= TIMELINE_WEBGL_MIN_DAYS if TIMELINE_WEBGL is None else TIMELINE_WEBGL
+
+
+
+def _get_marker_size(n_dates):
+    """
+    helper function for the timeline: the marker size by the point density (px per day), 
+    within the min/max size
+    """
+    min_size, max_size = TIMELINE_MARKER_SIZE
+    return max(min_size, min(max_size, int(TIMELINE_WIDTH_PX / n_dates)))
+
+
+
+def make_figure_4(df, color=None, debugging_info=None, counts=None):
     """
     Welche Lebensmittel sind am meisten konsumiert
+
+    counts: collections.Counter with the food frequencies (optional, e.g. from FoodCounters)
+            otherwise the frequencies are computed from df
     """
     TOP_N = 10
 
@@ -260,19 +412,30 @@ def make_figure_4(df, color=None, debugging_info=None):
     if df is None or len(df)==0:
         return no_data_available()
     
-    df = df[DISPLAYNAME].value_counts().head(TOP_N).to_frame().reset_index()
+    # approximate mode -> estimated counts
+    error_bound = None
+    if counts is None and APPROXIMATE_MODE:
+        counts, error_bound = compute_approximate_counts(df[DISPLAYNAME].dropna(), TOP_N)
 
-    fig = make_tiles_plot(items=df[DISPLAYNAME], 
-                          values=df['count'],  # generic name by pandas value_counts()
-                          color=color)
-    fig.update_layout(title=get_figure_title(debugging_info))
-    return fig
+    if counts is None:
+        df = df[DISPLAYNAME].value_counts().head(TOP_N).to_frame().reset_index()
+    else:
+        df = DataFrame(counts.most_common(TOP_N), columns=[DISPLAYNAME, 'count'])
+
+    fig = build_figure(make_tiles_dict, make_tiles_plot,
+                       items=df[DISPLAYNAME], 
+                       values=df['count'],  # generic name by pandas value_counts()
+                       color=color)
+    fig = set_figure_title(fig, get_figure_title(debugging_info))
+    return annotate_approximation(fig, error_bound)
 
 
 
-def make_figure_5(df, color=None, debugging_info=None):
+def make_figure_5(df, color=None, debugging_info=None, counts=None):
     """
     Welche Lebensmittel wurden unmittelbar vor der Symptomentstehung gegessen
+
+    counts: collections.Counter with the food frequencies (optional, e.g. from FoodCounters)
     """
     TOP_N = 10
 
@@ -280,21 +443,34 @@ def make_figure_5(df, color=None, debugging_info=None):
     if df is None or len(df)==0:
         return no_data_available()
 
-    sr = df[DISPLAYNAME].value_counts().head(TOP_N)
+    # approximate mode -> estimated counts
+    error_bound = None
+    if counts is None and APPROXIMATE_MODE:
+        counts, error_bound = compute_approximate_counts(df[DISPLAYNAME].dropna(), TOP_N)
+
+    if counts is None:
+        sr = df[DISPLAYNAME].value_counts().head(TOP_N)
+    else:
+        sr = Series(dict(counts.most_common(TOP_N)), dtype=int)
 
     # just in case
     if sr is None or len(sr)==0:
         return no_data_available()
 
-    fig = make_tiles_plot(items=sr.index, values=sr.values, color=color)
-    fig.update_layout(title=get_figure_title(debugging_info))
-    return fig
+    fig = build_figure(make_tiles_dict, make_tiles_plot, items=sr.index, values=sr.values, color=color)
+    fig = set_figure_title(fig, get_figure_title(debugging_info))
+    return annotate_approximation(fig, error_bound)
 
 
-def make_figure_6(df, color=None, debugging_info=None):
+def make_figure_6(df, color=None, debugging_info=None, counts=None):
     """
     Wie sieht ein typisches Frühstück, Mittagessen oder Abendessen aus
     TODO: tidy this function up
+
+    counts: collections.Counter with the meals (frozensets) counted (optional, e.g. from FoodCounters)
+
+    The similar meals are grouped together (see TYPICAL_MEAL_SIMILARITY on constants.py),
+    a "typical meal" is then the most common meal of a group (the count is the size of the group)
     """
 
     TOP_N = 3   # can choose any TOP_N from 1
@@ -303,11 +479,17 @@ def make_figure_6(df, color=None, debugging_info=None):
     if df is None or len(df)==0:
         return no_data_available()
 
-    arr = df[['date', 'daytime', DISPLAYNAME]].groupby(['date','daytime']).agg(list).values.ravel()
-    sets = [frozenset(e) for e in arr]
+    if counts is None:
+        arr = df[['date', 'daytime', DISPLAYNAME]].groupby(['date','daytime']).agg(list).values.ravel()
+        counts = sort_counter(Counter(frozenset(e) for e in arr))   # the ties as with FoodCounters
+
+    # group the similar meals together (e.g. a breakfast with one ingredient more)
+    if TYPICAL_MEAL_SIMILARITY:
+        counts = cluster_similar_sets(counts, threshold=TYPICAL_MEAL_SIMILARITY)
+    
     list_of_lists = [sorted(array)      # array = a set representing a meal
                      for array,count in 
-                     sorted(Counter(sets).most_common(TOP_N), 
+                     sorted(counts.most_common(TOP_N), 
                             key=lambda t: (t[1], -len(t[0])), # -len() puts shorter sets (of the same rank)
                             reverse=True)                     # first because a shorter one can be a subset
                      if count>1]                              # of a longer one by chance
@@ -317,15 +499,21 @@ def make_figure_6(df, color=None, debugging_info=None):
         return no_data_available()
     
     # make a plotly-figure with multiple "pie-charts"
-    fig = make_pies_plot(list_of_lists, color)
-    fig.update_layout(title=get_figure_title(debugging_info))
+    fig = build_figure(make_pies_dict, make_pies_plot, list_of_lists, color)
+    fig = set_figure_title(fig, get_figure_title(debugging_info))
     return fig
 
 
 
-def make_figure_7(df, n_components, color=None, debugging_info=None):
+def make_figure_7(df, n_components, color=None, debugging_info=None, incidence=None, counts=None):
     """
     Welche Lebensmittel werden (in einer bestimmten Mahlzeit) kombiniert
+
+    incidence: IncidenceMatrix (computations.py) with the same rows (meals) as df
+               (optional: it is built from df if not passed in)
+    counts: collections.Counter with the combinations counted (optional, e.g. from FoodCounters)
+            or a CountMinSketch with them estimated (approximate mode, see FoodCounters.query_sketch)
+            if passed in, `incidence` is not used
     """
 
     TOP_N = 5 # number of tiles on the treemap-plot
@@ -334,26 +522,122 @@ def make_figure_7(df, n_components, color=None, debugging_info=None):
     if df is None or len(df)==0:
         return no_data_available()
 
-    df_aggregated = df[['date', 'daytime', DISPLAYNAME]].groupby(['date','daytime']).agg(tuple)
-    meals = [frozenset(tuple(e[0])) for e in df_aggregated.values.tolist()]
-    
-    counter = compute_combination_occurrence(meals, cardinality=n_components)
+    error_bound = None
+    if type(counts) is CountMinSketch:
+        counter, error_bound = Counter(dict(counts.most_common(TOP_N))), counts.error_bound()
+    elif counts is not None:
+        counter = counts
+    elif APPROXIMATE_MODE:   # estimated counts (the combinations are streamed, not held in memory)
+        meals = df[['date', 'daytime', DISPLAYNAME]].dropna().groupby(['date','daytime'])[DISPLAYNAME].agg(frozenset)
+        counter, error_bound = compute_approximate_counts(iterate_combinations(meals, n_components), TOP_N)
+    else:
+        incidence = IncidenceMatrix.from_dataframe(df) if incidence is None else incidence
+        counter = incidence.count_combinations(cardinality=n_components, top_n=TOP_N)
     df_for_plot = DataFrame([(", ".join(e[0]), e[1]) for e in counter.most_common(TOP_N)], columns=["combination", "count"])
     
     # if no data - just in case
     if df_for_plot is None or len(df_for_plot)==0:
         return no_data_available()
     
-    fig = make_tiles_plot(items=df_for_plot['combination'], 
-                          values=df_for_plot['count'],
-                          color=color)
-    fig.update_layout(title=get_figure_title(debugging_info))
-    return fig
+    fig = build_figure(make_tiles_dict, make_tiles_plot,
+                       items=df_for_plot['combination'], 
+                       values=df_for_plot['count'],
+                       color=color)
+    fig = set_figure_title(fig, get_figure_title(debugging_info))
+    return annotate_approximation(fig, error_bound)
+
+
+
+def annotate_approximation(fig, error_bound=None):
+    """
+    Approximate mode: shows the error bound (max overestimation of a count) on the figure.
+    Nothing is done if error_bound is None (i.e. exact counts)
+    """
+    if error_bound is None:
+        return fig
+    annotation = dict(text=TEXT_APPROXIMATE.format(ceil(error_bound)), 
+                      xref='paper', yref='paper', x=1, y=1.05, 
+                      xanchor='right', showarrow=False, font={'color': 'grey'})
+    if type(fig) is dict:   # see build_figure
+        fig['layout'].setdefault('annotations', []).append(annotation)
+        return fig
+    return fig.add_annotation(**annotation)
+
+
+
+# The layout properties set by the figures of units 4, 5, 7 and no_data_available (see make_figure_patch)
+PATCHED_LAYOUT_KEYS = frozenset({'title', 'annotations', 'legend', 'margin', 'coloraxis', 'treemapcolorway',
+                                 'paper_bgcolor', 'plot_bgcolor', 'xaxis', 'yaxis', 'hovermode', 'showlegend'})
+
+
+
+def make_figure_patch(fig):
+    """
+    Partial update for a figure which is already on the page (i.e. its "skeleton" was sent before).
+
+    The template is the bulk of a figure (about 7 KB out of 8 KB for a treemap) and does not change
+    between the updates, so it is left out: the traces and the other layout properties are assigned,
+    the layout properties the new figure does not have (PATCHED_LAYOUT_KEYS, e.g. from the "no data" figure) 
+    are deleted. A figure with a different template (e.g. no template like the pies on unit 6) is returned as it is.
+    Nothing is serialized here (dash serializes the patch as it is sent)
+
+    fig: plotly figure or dict (e.g. from the figure cache)
+    Returns:
+        dash.Patch or the figure
+    """
+    if isinstance(fig, go.Figure):
+        fig = fig.to_dict()
+    layout = fig.get('layout', {})
+    if not _is_default_template(layout.get('template')):
+        return fig
+
+    patch = Patch()
+    patch['data'] = fig.get('data', [])
+    for key in sorted((PATCHED_LAYOUT_KEYS | layout.keys()) - {'template'}):
+        if key in layout:
+            patch['layout'][key] = layout[key]
+        else:
+            del patch['layout'][key]
+    return patch
+
+
+
+def _is_default_template(template):
+    """
+    helper function for make_figure_patch: the template plotly applies to a new figure?
+    (the fast builders share the very same dict, see _get_default_template_dict)
+    """
+    default = _get_default_template_dict()
+    return template is default or template == default
+
+
+
+@lru_cache(maxsize=1)
+def _get_default_template_dict():
+    """
+    helper function: the default template (the one plotly applies to a new figure) as a dict.
+    The same dict is shared by the figures made by the fast builders - do not modify it
+    """
+    return json.loads(json.dumps(go.Figure().layout.template, cls=PlotlyJSONEncoder))
+
+
+
+def warm_up_plotly():
+    """
+    Plotly loads its validators and the default template lazily, i.e. on the first figure of a process.
+    Called once before serving (see create_server on app.py) -> shared by the workers, not paid by the first request
+    """
+    _get_px()
+    _get_default_template_dict()
+    go.Figure(data=[go.Bar(), go.Pie(), go.Scatter(), go.Scattergl(), go.Treemap()]).to_plotly_json()
+    make_subplots(rows=1, cols=2)
+    no_data_available()
 
 
 
 def make_figure_test(df, *args):
     """Generic plotly plot for testing"""
+    px = _get_px()
     fig = px.bar(y=[1,2,3],
                  color_discrete_sequence=['grey'])
     fig.update_layout(title=get_figure_title(*args))
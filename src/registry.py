@@ -0,0 +1,175 @@
+
+"""
+Unit registry for the BesserEsser dashboard
+
+A unit with a figure (units 3-7) declares here what its figure is made of (see register on app.py):
+- plot: the plotting function (plotting_toolkit.py) and which values it gets
+- columns: the columns the df behind the figure must have (checked in DEBUG mode)
+- selectors: names for the unit's selectors (selector1..N of the callback's components, see make_handy_namespace)
+- artifacts: the intermediate results, in order, each one with its function and inputs {argument: name}
+  (names of the components, e.g. 'data_eating', 'start_date', of the selectors or of the artifacts before it)
+
+The figure is made by running the artifacts in order (see UnitRegistry.build): each one is kept under
+the key of its inputs, i.e. only the artifacts whose inputs have changed are computed again
+(e.g. the slider on unit 7: the subsets and the meal baskets are reused, only the combinations are counted)
+"""
+
+from collections import OrderedDict
+from threading import Lock
+from caching import make_fingerprint, estimate_size, single_flight
+from developer_toolkit import get_default_values, NAMESPACE_ATTRIBUTES
+from constants import DEBUG, ERR_PREFIX, ARTIFACT_CACHE_MAX_BYTES
+
+
+# How the artifacts' inputs are keyed: by the fingerprint of their value unless given here,
+# e.g. the handle of the subset by its key (the stores' tokens and the dates), not by its 'new_data' flag
+INPUT_KEYS = {'data_subset': lambda handle: handle['key'] if handle else handle}
+
+
+
+class UnitSpec():
+    """
+    What the figure of a unit is made of (see the module's docstring and UnitRegistry.register)
+    """
+
+    def __init__(self, unit, plot, inputs, columns=(), selectors=(), artifacts=(), table=None, options=None):
+        self.unit = unit
+        self.id = unit.id
+        self.plot = plot
+        self.inputs = dict(inputs)        # {argument of plot: name}
+        self.columns = tuple(columns)
+        self.selectors = tuple(selectors)
+        self.artifacts = tuple(artifacts) # ((name, func, {argument of func: name}), ...)
+        self.table = table                # the name of the df behind the figure (for the table for debugging)
+        self.options = dict(options or {})  # constant arguments of plot, e.g. color='red'
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.id}, {self.plot.__name__}, {[a[0] for a in self.artifacts]})"
+
+
+
+class UnitRegistry():
+    """
+    The units with a figure {unit id: UnitSpec} and the artifacts made recently (LRU, per process,
+    i.e. per job for a background callback), see ARTIFACT_CACHE_MAX_BYTES on constants.py
+    """
+
+    def __init__(self, max_bytes=ARTIFACT_CACHE_MAX_BYTES):
+        self.specs = OrderedDict()
+        self.max_bytes = max_bytes
+        self.lock = Lock()
+        self.artifacts = OrderedDict()   # {key: (n_bytes, value)}
+        self.n_bytes = 0
+        self.hits = self.misses = 0
+
+    def register(self, unit, plot, inputs, columns=(), selectors=(), artifacts=(), table=None, **options):
+        """
+        Declares the figure of a unit (see the module's docstring)
+        unit: the unit (units.py)
+        plot: the plotting function, gets the values of `inputs` {argument: name}, debugging_info and `options`
+        Raises:
+            ValueError if a name is unknown or the number of the selectors is wrong
+        """
+        n_selectors = len(get_default_values(unit))
+        if len(selectors) != n_selectors:
+            raise ValueError(f"{ERR_PREFIX}{unit.id} has {n_selectors} selectors, {len(selectors)} names given")
+
+        known = set(NAMESPACE_ATTRIBUTES) | set(selectors)
+        for name, func, names in artifacts:
+            for e in names.values():
+                if e not in known:
+                    raise ValueError(f"{ERR_PREFIX}{unit.id}: unknown input '{e}' of the artifact '{name}'")
+            known.add(name)
+        for e in [*inputs.values(), *([table] if table else [])]:
+            if e not in known:
+                raise ValueError(f"{ERR_PREFIX}{unit.id}: unknown input '{e}' of {plot.__name__}")
+
+        self.specs[unit.id] = UnitSpec(unit, plot, inputs, columns, selectors, artifacts, table, options)
+        return self.specs[unit.id]
+
+    def get(self, unit_id):
+        return self.specs.get(unit_id)
+
+    def __iter__(self):
+        return iter(self.specs.values())
+
+    def __contains__(self, unit_id):
+        return unit_id in self.specs
+
+    def build(self, unit_id, components, on_step=None):
+        """
+        Makes the figure of a unit for the values in `components` (see make_handy_namespace):
+        the artifacts whose inputs have not changed are reused (see get_artifact)
+        on_step: called with (step, steps) before each artifact and before the plot, e.g. a progress bar
+        Returns:
+            fig, the df behind it (`table`, None if not declared)
+        """
+        spec = self.specs[unit_id]
+        i = len(components) - len(spec.selectors)
+        names = NAMESPACE_ATTRIBUTES if components.has_subset else NAMESPACE_ATTRIBUTES[1:]
+        values = dict(zip(names, components[:i]))
+        values.update(zip(spec.selectors, components[i:]))
+        keys = {}   # {name: fingerprint}, made for the inputs in use only (the stores can be long json)
+
+        def key_of(name):
+            if name not in keys:
+                key = INPUT_KEYS.get(name, lambda value: value)(values[name])
+                keys[name] = make_fingerprint(key)
+            return keys[name]
+
+        steps = len(spec.artifacts) + 1
+        for step, (name, func, names) in enumerate(spec.artifacts):
+            if on_step:
+                on_step(step, steps)
+            keys[name] = make_fingerprint(unit_id, name, *((arg, key_of(e)) for arg, e in names.items()))
+            values[name] = self.get_artifact(f"{unit_id}_{name}", keys[name], func, 
+                                             **{arg: values[e] for arg, e in names.items()})
+
+        df = values[spec.table] if spec.table else None
+        if DEBUG and df is not None:
+            missing = [c for c in spec.columns if c not in df.columns]
+            assert not missing, f"{ERR_PREFIX}{unit_id}: the columns {missing} are missing in '{spec.table}'"
+
+        if on_step:
+            on_step(steps - 1, steps)
+        fig = spec.plot(**{arg: values[name] for arg, name in spec.inputs.items()},
+                        debugging_info=components, **spec.options)
+        return fig, df
+
+    def get_artifact(self, name, key, func, **kwargs):
+        """
+        Returns func(**kwargs), the one made before for the same key if it is still there
+        (made once if several callbacks ask for it at the same time, see SingleFlight).
+        The artifacts must not be modified by their users
+        """
+        with self.lock:
+            if key in self.artifacts:
+                self.artifacts.move_to_end(key)
+                self.hits += 1
+                return self.artifacts[key][1]
+            self.misses += 1
+
+        def make():
+            value = func(**kwargs)
+            n_bytes = estimate_size(value)
+            if n_bytes > self.max_bytes:
+                return value   # over the budget on its own -> not kept (0 -> disabled)
+            with self.lock:
+                if key in self.artifacts:
+                    self.n_bytes -= self.artifacts.pop(key)[0]
+                self.artifacts[key] = (n_bytes, value)
+                self.n_bytes += n_bytes
+                while self.n_bytes > self.max_bytes:
+                    self.n_bytes -= self.artifacts.popitem(last=False)[1][0]   # the least recently used
+            return value
+
+        return single_flight.do(name, key, make)
+
+    def clear(self):
+        with self.lock:
+            self.artifacts.clear()
+            self.n_bytes = 0
+
+
+
+unit_registry = UnitRegistry()
@@ -0,0 +1,258 @@
+"""
+Probabilistic data structures ("sketches") for the BesserEsser dashboard
+
+Used by the approximate mode (see APPROXIMATE_MODE on constants.py) for cohort-level views
+and very large histories: the memory does not grow with the number of distinct items.
+- CountMinSketch: approximate counts + the top-N items (heavy hitters)
+- MinHash + LSH: clusters of similar sets (e.g. meals) in near-linear time
+
+All sketches are mergeable (accounts, time shards...) as long as they were made with the same parameters.
+The hashing is deterministic (pandas.util.hash_array with fixed keys),
+i.e. sketches made in different processes can be merged too.
+"""
+
+from collections import Counter
+from math import ceil, e, log
+import numpy as np
+from pandas.util import hash_array
+from constants import ERR_PREFIX, CMS_EPSILON, CMS_DELTA, CMS_CAPACITY
+from constants import MINHASH_PERMUTATIONS
+
+
+# Keys for the hash functions (16 characters each, do not change - otherwise sketches cannot be merged)
+HASH_KEY_1 = "BesserEsser00001"
+HASH_KEY_2 = "BesserEsser00002"
+
+
+
+def hash_items(items, hash_key=HASH_KEY_1):
+    """
+    Vectorized deterministic 64-bit hashes.
+    items: array of str / numbers / datetimes; frozensets are hashed as their sorted string representation
+    Returns:
+        numpy array of uint64
+    """
+    arr = np.asarray(items)
+    if arr.dtype.kind == 'M':                  # datetimes -> int
+        arr = arr.astype('datetime64[ns]').astype(np.int64)
+    elif arr.dtype.kind not in 'iufb':
+        arr = np.array([to_key(item) for item in items], dtype=object)
+    return hash_array(arr, hash_key=hash_key, categorize=False)
+
+
+
+def to_key(item):
+    """
+    Canonical str for an item (the same combination of foods -> the same str)
+    """
+    if type(item) in (frozenset, set, tuple, list):
+        return "\x1f".join(sorted(str(e) for e in item))
+    return str(item)
+
+
+
+class CountMinSketch():
+    """
+    Count-Min sketch with a heavy hitters list.
+
+    The estimate of a count is never lower than the true count and
+    (with probability 1-delta) not higher than the true count + epsilon * total.
+
+    Arguments:
+        epsilon: relative error (relative to the total of all counts)
+        delta: probability of exceeding the error
+        capacity: number of the heavy hitter candidates kept (>= top N requested later)
+    """
+
+    def __init__(self, epsilon=CMS_EPSILON, delta=CMS_DELTA, capacity=CMS_CAPACITY):
+        self.epsilon, self.delta, self.capacity = epsilon, delta, capacity
+        self.width = ceil(e / epsilon)
+        self.depth = ceil(log(1 / delta))
+        self.table = np.zeros((self.depth, self.width), dtype=np.int64)
+        self.total = 0
+        self.candidates = {}   # {key: item} the heavy hitter candidates
+
+    def _columns(self, items):
+        # double hashing: h1 + i * h2 for the i-th row
+        h1, h2 = hash_items(items, HASH_KEY_1), hash_items(items, HASH_KEY_2)
+        rows = np.arange(self.depth, dtype=np.uint64).reshape(-1, 1)
+        return ((h1 + rows * h2) % np.uint64(self.width)).astype(np.int64)
+
+    def update(self, items, counts=None):
+        """
+        items: array of hashable items (the same item can occur multiple times)
+        counts: array of ints (default: 1 for each item)
+        """
+        items = list(items)
+        if not items:
+            return self
+        counts = np.ones(len(items), dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+        columns = self._columns(items)
+        for row in range(self.depth):
+            np.add.at(self.table[row], columns[row], counts)
+        self.total += int(counts.sum())
+
+        # update the heavy hitters candidates (the new items compete with the current ones)
+        self.candidates.update({to_key(item): item for item in items})
+        self._prune_candidates()
+        return self
+
+    def _prune_candidates(self):
+        if len(self.candidates) <= self.capacity:
+            return
+        items = list(self.candidates.values())
+        estimates = self.estimate(items)
+        keep = np.argsort(-estimates, kind='stable')[:self.capacity]
+        self.candidates = {to_key(items[i]): items[i] for i in keep}
+
+    def estimate(self, items):
+        """
+        Returns:
+            numpy array with the estimated counts
+        """
+        items = list(items)
+        if not items:
+            return np.zeros(0, dtype=np.int64)
+        columns = self._columns(items)
+        return self.table[np.arange(self.depth).reshape(-1, 1), columns].min(axis=0)
+
+    def most_common(self, n=None):
+        """
+        The top n items (like collections.Counter.most_common)
+        Returns:
+            list of (item, estimated count) tuples
+        """
+        items = list(self.candidates.values())
+        estimates = self.estimate(items)
+        order = sorted(range(len(items)), key=lambda i: (-estimates[i], to_key(items[i])))[:n]
+        return [(items[i], int(estimates[i])) for i in order]
+
+    def error_bound(self):
+        """
+        The max overestimation of a count (with probability 1-delta)
+        """
+        return self.epsilon * self.total
+
+    def merge(self, other):
+        """
+        Adds the counts of the other sketch (made with the same epsilon and delta) in-place
+        """
+        if (self.width, self.depth) != (other.width, other.depth):
+            raise ValueError(f"{ERR_PREFIX}sketches with different parameters cannot be merged")
+        self.table += other.table
+        self.total += other.total
+        self.candidates.update(other.candidates)
+        self._prune_candidates()
+        return self
+
+
+
+def merge_sketches(sketches):
+    """
+    Merges an array of sketches (e.g. from several accounts or time shards) into a new one
+    """
+    sketches = list(sketches)
+    if not sketches:
+        raise ValueError(f"{ERR_PREFIX}nothing to merge")
+    first = sketches[0]
+    merged = CountMinSketch(first.epsilon, first.delta, first.capacity)
+    for sketch in sketches:
+        merged.merge(sketch)
+    return merged
+
+
+
+def compute_minhash_signatures(sets, num_perm=MINHASH_PERMUTATIONS):
+    """
+    MinHash signatures: for every set and every hash function (i.e. a random permutation of the items)
+    the min hash value of its items. The fraction of equal values of two signatures estimates
+    the Jaccard similarity of the two sets.
+
+    sets: array of (non-empty) sets
+    Returns:
+        numpy array of uint64 with the shape (len(sets), num_perm)
+    """
+    sets = [list(st) for st in sets]
+    items, codes = np.unique(np.array([to_key(e) for st in sets for e in st], dtype=object), return_inverse=True)
+
+    # distinct items x num_perm (independent hash functions = different hash keys)
+    hashes = np.column_stack([hash_items(items, hash_key=f"MinHash{k:09d}") for k in range(num_perm)])
+
+    # the min per set: all the sets are concatenated and reduced at their starting positions
+    starts = np.cumsum([0] + [len(st) for st in sets[:-1]])
+    return np.minimum.reduceat(hashes[codes.ravel()], starts, axis=0)
+
+
+
+def _lsh_bands_rows(threshold, num_perm):
+    """
+    helper function: the number of bands b and rows r (b * r <= num_perm) for LSH,
+    such that the "S-curve" threshold (1/b)**(1/r) is the closest to the given threshold
+    """
+    options = [(b, num_perm // b) for b in range(1, num_perm + 1)]
+    return min(options, key=lambda t: abs((1 / t[0]) ** (1 / t[1]) - threshold))
+
+
+
+def cluster_similar_sets(counts, threshold, num_perm=MINHASH_PERMUTATIONS):
+    """
+    Used for unit 6 (typical meals): groups the similar meals together.
+
+    1. MinHash signatures of the (distinct) sets
+    2. LSH: the signatures are split into bands, the sets with an identical band are candidates
+    3. a candidate is merged into the cluster of a "leader" (the first set of a cluster) in the bucket
+       if the exact Jaccard similarity of the two is >= threshold (union-find)
+    i.e. no comparison of all pairs (quadratic) is done.
+
+    Arguments:
+        counts: collections.Counter {frozenset: count}, e.g. the meals counted
+        threshold: Jaccard similarity (0...1)
+    Returns:
+        collections.Counter {representative set: total count of the cluster}
+        representative set = the most common set in the cluster (the shorter one if tied)
+    """
+    MAX_LEADERS = 8   # per bucket
+
+    sets = [st for st in counts if len(st) > 0]
+    if len(sets) < 2:
+        return Counter({st: counts[st] for st in sets})
+
+    parent = list(range(len(sets)))
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]   # path compression
+            i = parent[i]
+        return i
+
+    n_bands, n_rows = _lsh_bands_rows(threshold * 0.8, num_perm)   # lower -> fewer misses (false positives are verified)
+    signatures = compute_minhash_signatures(sets, num_perm=n_bands * n_rows)
+    for band in range(n_bands):
+        # one uint64 per band (a collision is harmless - the candidates are verified anyway)
+        columns = signatures[:, band * n_rows:(band + 1) * n_rows]
+        keys = (columns * (np.uint64(1_000_003) ** np.arange(n_rows, dtype=np.uint64))).sum(axis=1, dtype=np.uint64)
+        _, buckets, sizes = np.unique(keys, return_inverse=True, return_counts=True)
+        buckets = buckets.ravel()
+        candidates = np.flatnonzero(sizes[buckets] > 1)   # the sets sharing a bucket with another set
+        leaders = {}   # {bucket: [the first sets of the (not merged) clusters in it]}
+        for i in candidates.tolist():
+            bucket_leaders = leaders.setdefault(buckets[i], [])
+            for j in bucket_leaders:
+                if find(i) == find(j):
+                    break
+                if len(sets[i] & sets[j]) / len(sets[i] | sets[j]) >= threshold:
+                    parent[find(i)] = find(j)
+                    break
+            else:
+                if len(bucket_leaders) < MAX_LEADERS:   # to keep it linear for the huge buckets
+                    bucket_leaders.append(i)
+
+    # collect the clusters
+    clusters = {}
+    for i, st in enumerate(sets):
+        clusters.setdefault(find(i), []).append(st)
+    
+    result = Counter()
+    for members in clusters.values():
+        representative = min(members, key=lambda st: (-counts[st], len(st), sorted(map(str, st))))
+        result[representative] = sum(counts[st] for st in members)
+    return result
@@ -5,13 +5,33 @@ table generation and conversion functions for table generation
 """
 
 
+import re
 from collections import OrderedDict
+import numpy as np
 import pandas as pd
 from io import StringIO
-from dash import html
+from base64 import b64encode, b64decode
+from dash import dcc, html
 from dash.dash_table import DataTable
 
-from constants import DEBUG, MEALS_MAPPING, DISPLAYNAME
+from computations import compute_food_associations
+from constants import DEBUG, ERR_PREFIX, MEALS_MAPPING, DISPLAYNAME, ASSOCIATION_LAGS, ASSOCIATION_MIN_EXPOSURES
+from constants import STORE_CODEC, STORE_COMPRESSION
+
+try:
+    import pyarrow as pa                 # optional: pip install pyarrow (for the 'arrow' and 'parquet' codecs)
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+
+# The codecs for the df's kept in the user's browser session (see encode_frame)
+CODECS = ('json', 'arrow', 'parquet')
+if STORE_CODEC not in CODECS:
+    raise ValueError(f"{ERR_PREFIX}unknown STORE_CODEC: {STORE_CODEC} (one of {CODECS})")
+if STORE_CODEC != 'json' and pa is None:
+    print(f"{ERR_PREFIX}STORE_CODEC = '{STORE_CODEC}' but pyarrow is not installed "
+          f"(pip install pyarrow) - json is used instead")
 
 
 
@@ -45,6 +65,62 @@ def to_json(df):
 
 
 
+def encode_frame(df, codec=None, compression=STORE_COMPRESSION):
+    """
+    Encodes a df to be kept in the user's browser session (dcc.Store).
+
+    codec: 'json' (the pandas split-json, see to_json), 
+           'arrow' (Arrow IPC stream) or 'parquet' - both compressed and base64-wrapped,
+           the dtypes (datetimes, bools, categories...) and the index are kept as they are
+           default: STORE_CODEC on constants.py (json if pyarrow is not installed)
+    compression: 'zstd', 'lz4' (arrow), 'snappy' (parquet)... or None
+    Returns:
+        str: json or "<codec>+<compression>:<base64>", e.g. "arrow+zstd:QVJST1cx..."
+    """
+    codec = codec or (STORE_CODEC if pa is not None else 'json')
+    if codec == 'json':
+        return to_json(df)
+
+    table = pa.Table.from_pandas(df, preserve_index=None)   # None -> a RangeIndex as metadata only
+    sink = pa.BufferOutputStream()
+    if codec == 'arrow':
+        options = pa.ipc.IpcWriteOptions(compression=compression)
+        with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+            writer.write_table(table)
+    elif codec == 'parquet':
+        pq.write_table(table, sink, compression=compression or 'none')
+    else:
+        raise ValueError(f"{ERR_PREFIX}unknown codec: {codec} (one of {CODECS})")
+    return f"{codec}+{compression}:" + b64encode(sink.getvalue().to_pybytes()).decode('ascii')
+
+
+
+def decode_frame(data):
+    """
+    The df from a str made by encode_frame (the codec is recognized by the prefix)
+    """
+    if data.startswith('{'):   # json
+        return read_json(data)
+
+    codec = data[:data.index('+')]
+    if pa is None:
+        raise ImportError(f"{ERR_PREFIX}pyarrow is needed to decode the '{codec}' codec (pip install pyarrow)")
+    buffer = pa.py_buffer(b64decode(data[data.index(':') + 1:]))   # the compression is in the metadata
+    if codec == 'arrow':
+        return pa.ipc.open_stream(buffer).read_all().to_pandas()
+    elif codec == 'parquet':
+        table = pq.read_table(pa.BufferReader(buffer))
+        df = table.to_pandas()
+        # parquet has no datetimes in seconds -> back to the original dtype (from the pandas metadata)
+        for column in table.schema.pandas_metadata['columns']:
+            name, dtype = column['name'], column['numpy_type']
+            if name in df.columns and dtype.startswith('datetime64') and str(df[name].dtype) != dtype:
+                df[name] = df[name].astype(dtype)
+        return df
+    raise ValueError(f"{ERR_PREFIX}unknown codec: {codec} (one of {CODECS})")
+
+
+
 def to_list_of_dicts(df):
     """
     Turns a df into a list of dictionaries - the suitable format
@@ -59,17 +135,161 @@ def instantiate_debug_table(id=None):
     """
     Returns instances of dash data frame (for debugging purposes)
     it is the table you see underneath each unit in DEBUG mode
+
+    The df behind the table stays on the server (see publish_table on data_processing.py),
+    the unit's callback outputs its key into the dcc.Store "<id>_key" and the table is paged,
+    sorted and filtered by its own callback (see query_frame)
     """
     PAGE_SIZE = 10
+    if not id:
+        return html.Div(style={'display': 'block' if DEBUG else 'none'},
+                        children=[html.H4("data table for debugging:"), DataTable(page_size=PAGE_SIZE)])
     return html.Div(style={'display': 'block' if DEBUG else 'none'},
                     children=[html.H4("data table for debugging:"),
-                              DataTable(page_size=PAGE_SIZE, id=id) if id else DataTable(page_size=PAGE_SIZE)])
+                              DataTable(page_size=PAGE_SIZE, id=id, page_current=0,
+                                        page_action='custom', sort_action='custom', sort_mode='multi',
+                                        filter_action='custom', filter_query='', sort_by=[]),
+                              dcc.Store(id=f"{id}_key")])
+
+
+
+# The operators of the filter row of a DataTable (filter_action='custom'),
+# e.g. filter_query = '{Lebensmittel} contains Brot && {Beeinträchtigungsgrad} >= 3'
+FILTER_PATTERN = re.compile(r"^\{(?P<column>[^}]+)\}\s+(?P<operator>[is]?(?:contains|datestartswith|eq|ne|lt|le|gt|ge|<=|>=|!=|=|<|>))\s+(?P<value>.+)$")
+FILTER_OPERATORS = {'eq': '=', 'ne': '!=', 'lt': '<', 'le': '<=', 'gt': '>', 'ge': '>='}
+FILTER_NAMES = {*FILTER_OPERATORS, *FILTER_OPERATORS.values(), 'contains', 'datestartswith'}
+DATE_FORMAT = r'%d/%m/%Y'   # the dates as shown in the tables
+ISO_DATE_FORMAT = r'%Y-%m-%d'   # the dates for 'datestartswith' (like Dash does it), e.g. '2023' or '2023-05'
+
+
+
+def parse_filter_query(filter_query):
+    """
+    Splits the filter_query of a DataTable into its parts (joined with '&&')
+    Returns:
+        list of tuples (column, operator, value, case_sensitive), e.g. ('Zeit', 'contains', 'Früh', True)
+        the parts which cannot be parsed are skipped
+    """
+    collector = []
+    for part in (filter_query or '').split(' && '):
+        match = FILTER_PATTERN.match(part.strip())
+        if match is None:
+            continue
+        column, operator, value = match.group('column', 'operator', 'value')
+        prefix, operator = ((operator[0], operator[1:]) if operator[0] in 'is' and operator[1:] in FILTER_NAMES
+                            else ('', operator))
+        case_sensitive = prefix != 'i'
+        operator = FILTER_OPERATORS.get(operator, operator)
+        value = value.strip()
+        if len(value) > 1 and value[0] == value[-1] and value[0] in "\"'`":
+            value = value[1:-1]
+        collector.append((column.replace('\\', ''), operator, value, case_sensitive))
+    return collector
+
+
+
+def query_frame(df, sort_by=None, filter_query=None, columns=None):
+    """
+    Sorting and filtering of a DataTable on the server (sort_action='custom', filter_action='custom')
+
+    Arguments:
+        df: the whole df behind the table
+        sort_by: DataTable.sort_by, e.g. [{'column_id': 'Datum', 'direction': 'desc'}]
+        filter_query: DataTable.filter_query (see parse_filter_query)
+        columns: {column id in the table: column in df} if they differ (e.g. the diary table)
+    Returns:
+        df (a new one if sorted or filtered)
+
+    Datetime columns are compared as dates (24/12/2023 or 2023-12-24), 'datestartswith' matches
+    the ISO dates (e.g. 2023-12), 'contains' the dates as shown in the tables (see DATE_FORMAT).
+    Numeric columns (e.g. Int64) are compared as numbers, ordered categoricals (e.g. the times of day)
+    in the order of their categories if the value is one of them, as text otherwise.
+    Missing values never match (except for '!=').
+    """
+    columns = columns or {}
+    mask = pd.Series(True, index=df.index)
+    for column, operator, value, case_sensitive in parse_filter_query(filter_query):
+        column = columns.get(column, column)
+        if column not in df.columns:
+            continue
+        series = df[column]
+        is_date = pd.api.types.is_datetime64_any_dtype(series)
+        if operator in ('contains', 'datestartswith'):
+            if is_date:
+                text = series.dt.strftime(ISO_DATE_FORMAT if operator == 'datestartswith' else DATE_FORMAT)
+            else:
+                text = series.astype(str).where(series.notna())
+            text = text.fillna('')
+            if operator == 'datestartswith':
+                mask &= text.str.startswith(value)
+            else:
+                mask &= text.str.contains(value, case=case_sensitive, regex=False)
+            continue
+        # comparisons: as dates, numbers, categories or text (depends on the column)
+        is_ordered = isinstance(series.dtype, pd.CategoricalDtype) and series.cat.ordered
+        if is_date:
+            is_iso = re.match(r"^\d{4}-", value) is not None   # dayfirst would swap the month and the day
+            value = pd.to_datetime(value, dayfirst=not is_iso, errors='coerce')
+        elif pd.api.types.is_numeric_dtype(series):
+            value = pd.to_numeric(value, errors='coerce')
+        elif is_ordered and value in series.cat.categories:
+            pass
+        else:
+            series = series.astype(str).where(series.notna())
+            if not case_sensitive:
+                series, value = series.str.lower(), value.lower()
+        if pd.isnull(value):
+            mask &= False
+            continue
+        matches = {'=': series.eq, '!=': series.ne, '<': series.lt,
+                   '<=': series.le, '>': series.gt, '>=': series.ge}[operator](value)
+        mask &= matches.fillna(operator == '!=').astype(bool)   # <NA> (e.g. Int64)
+
+    if not mask.all():
+        df = df[mask]
+    sort_by = [e for e in (sort_by or []) if columns.get(e['column_id'], e['column_id']) in df.columns]
+    if sort_by:
+        df = df.sort_values([columns.get(e['column_id'], e['column_id']) for e in sort_by],
+                            ascending=[e['direction'] == 'asc' for e in sort_by],
+                            kind='stable', na_position='last')
+    return df
+
+
+
+def get_page(df, page_current, page_size):
+    """
+    The visible page of a DataTable (page_action='custom')
+    Returns:
+        tuple: (df with the rows of the page, page_count, page_current)
+        page_current is clipped to the existing pages (e.g. after filtering)
+    """
+    page_count = max(1, -(-len(df) // page_size))
+    page_current = min(max(page_current or 0, 0), page_count - 1)
+    return df.iloc[page_current * page_size: (page_current + 1) * page_size], page_count, page_current
+
+
+
+# The columns of the diary table: {column id in the table: column in df_diary}
+DIARY_COLUMNS = OrderedDict([("Datum", 'date'),
+                             ("Zeit", 'daytime'),
+                             ("Lebensmittel", DISPLAYNAME),
+                             ("Symptome", 'symptom'),
+                             ("Beeinträchtigungsgrad", 'impairment')])
 
 
 
 def make_diary_table(df_eating, df_symptomreport):
     """
-    TODO
+    The diary (unit 3): one row per date and time of day with the foods eaten and the symptoms reported,
+    made once per account and subset by dates afterwards (see prettify_diary_table for the visible rows)
+
+    The times of day are sorted as an ordered categorical (getting up, breakfast, lunch, dinner, unknown),
+    i.e. no sorting key is computed row by row. The input df's are not changed.
+    The times of day stay categorical and the impairment numeric (Int64), i.e. the table is sorted and filtered
+    by their values (see query_frame), they are made text for the visible rows only (see prettify_diary_table)
+
+    Returns:
+        df with the columns of DIARY_COLUMNS and 'date_text' (the date as shown in the table, see DATE_FORMAT)
     """
 
     # Column names
@@ -78,7 +298,7 @@ def make_diary_table(df_eating, df_symptomreport):
     DAYTIME = 'daytime'
     SYMPTOM = 'symptom'  # placeholder, for now: "-"
     IMPAIRMENT = 'impairment'
-    TEMP = 'sorting'
+    DATE_TEXT = 'date_text'
     UNKNOWN = "Unbekannt"
     AFTER_GETTING_UP = "Nach dem Aufstehen"
 
@@ -90,67 +310,70 @@ def make_diary_table(df_eating, df_symptomreport):
         ('UNKNOWN', 'UNKNOWN')
     ])
 
-    # try these functions to make the table pretty (ingredients list)
-    func_to_aggregate_strings = ", ".join   # try: list, tuple, set, "\n".join , ", ".join  to push it into plotly-datatable and get beautiful repr
-    df_eating_agg = df_eating[[DATE, DAYTIME, DISPLAYNAME]].groupby([DATE, DAYTIME]).agg(func_to_aggregate_strings).reset_index()   # ", ".join
+    # the foods of a meal joined to a str (", ") - a string sum per group instead of a join per group
+    df_eating_agg = ((df_eating[DISPLAYNAME] + ", ").groupby([df_eating[DATE], df_eating[DAYTIME]]).sum()
+                                                     .str[:-2].reset_index())
 
-    df_symptomreport[DAYTIME] = df_symptomreport[TIME].map(MAPPING)
-    df_symptomreport_agg = df_symptomreport[[DATE, DAYTIME, SYMPTOM, IMPAIRMENT]].groupby([DATE, DAYTIME]).agg({SYMPTOM: ", ".join, IMPAIRMENT: 'mean'}).reset_index()
+    daytime_symptoms = df_symptomreport[TIME].map(MAPPING).rename(DAYTIME)   # not added to df_symptomreport
+    keys = [df_symptomreport[DATE], daytime_symptoms]
+    df_symptomreport_agg = pd.DataFrame({SYMPTOM: (df_symptomreport[SYMPTOM] + ", ").groupby(keys).sum().str[:-2],
+                                         IMPAIRMENT: df_symptomreport[IMPAIRMENT].groupby(keys).mean()}).reset_index()
 
-    values_list = list(MAPPING.values()) + list(set(df_symptomreport_agg[DAYTIME].unique()).difference(set(MAPPING.values()))) # to be on the safe side
-    
     df_diary = df_symptomreport_agg.merge(df_eating_agg, how='outer', on=[DATE, DAYTIME])
-    df_diary[TEMP] = df_diary[DAYTIME].apply(lambda v: values_list.index(v))
-    df_diary = df_diary.sort_values([DATE, TEMP]).drop(TEMP, axis=1)
 
-    df_diary = df_diary.reindex(columns=[DATE, DAYTIME, DISPLAYNAME, SYMPTOM, IMPAIRMENT])
+    # sort by the date, then by the time of day (ordered categorical, other values last - to be on the safe side)
+    others = sorted(set(df_diary[DAYTIME].dropna()).difference(MAPPING.values()))
+    df_diary[DAYTIME] = pd.Categorical(df_diary[DAYTIME], categories=list(MAPPING.values()) + others, ordered=True)
+    df_diary = df_diary.sort_values([DATE, DAYTIME], kind='stable', ignore_index=True)
 
-    mapping = {k:v for k,v in 
-               zip( MAPPING.values(), 
-                    ([AFTER_GETTING_UP] + list(MEALS_MAPPING.values()) + [UNKNOWN]))}
+    df_diary = df_diary.reindex(columns=list(DIARY_COLUMNS.values()))
 
-    df_diary[DAYTIME] = df_diary[DAYTIME].map(mapping)
-    df_diary[IMPAIRMENT] = df_diary[IMPAIRMENT].apply(lambda v: str(round(v)) if not pd.isnull(v) else '')
-    df_diary.reset_index(inplace=True, drop=True)
+    # German names of the times of day, still in the order of the day (the other values -> NaN)
+    labels = [AFTER_GETTING_UP] + list(MEALS_MAPPING.values()) + [UNKNOWN]
+    df_diary[DAYTIME] = (df_diary[DAYTIME].cat.rename_categories(dict(zip(MAPPING.values(), labels)))
+                                          .cat.remove_categories(others))
+
+    # vectorized: the impairment as a rounded int (or <NA>), the date as shown in the table
+    df_diary[IMPAIRMENT] = df_diary[IMPAIRMENT].round().astype('Int64')
+    df_diary[DATE_TEXT] = df_diary[DATE].dt.strftime(DATE_FORMAT)
     return df_diary
 
 
 
 def prettify_diary_table(df_diary):
     """
-    workaround to make this table look nicer
-    if put into the `make_diary_table` -> doesnt work
+    The visible rows of the diary table (see make_diary_table), i.e. after query_frame and get_page:
+    the date on the first row of a day only, the times of day and the impairment as text (or ''),
+    the German column names (see DIARY_COLUMNS)
     """
     DATE = 'date'
-    df_diary[DATE] = df_diary[DATE].dt.strftime(r'%d/%m/%Y')
-    df_diary.loc[df_diary[DATE].duplicated(), DATE] = ''
-    df_diary[DATE] = df_diary[DATE].astype(str)
-    df_diary.columns = ["Datum", "Zeit", "Lebensmittel", "Symptome", "Beeinträchtigungsgrad"]
-    return df_diary
+    DATE_TEXT = 'date_text'
+    is_first_row_of_day = df_diary[DATE].ne(df_diary[DATE].shift()).to_numpy()
+    df_pretty = df_diary[list(DIARY_COLUMNS.values())].set_axis(list(DIARY_COLUMNS), axis=1)
+    df_pretty["Datum"] = np.where(is_first_row_of_day, df_diary[DATE_TEXT].astype(str), '')
+    df_pretty["Zeit"] = df_pretty["Zeit"].astype(object)
+    impairment = df_pretty["Beeinträchtigungsgrad"]
+    df_pretty["Beeinträchtigungsgrad"] = impairment.astype(str).where(impairment.notna(), '').astype(object)
+    return df_pretty
 
 
 
-def make_probably_bad_foods_table(df):
+def make_probably_bad_foods_table(df_eating, df_symptomreport):
     """
-    TODO: docs, describe the logic of the approach
-
     "probably bad foods" = the ingredients that probably cause the symptoms (in a given user)
 
     The idea behind this:
-    Make a list of the ingredients that were eaten on the days when the user had a symptom, 
-    but which were not eaten on the days without symptoms,
-    and rank this list by the number of times when the user had a symptom on the days that ingredient was eaten.
-
-    Use set theory operations:
-      {set of all ingredients consumed on the days with a symptom}
-    - {set of the ingredients consumed on the days without a symptom}  # i.e. set diff
-    = {set of ingredients that probably cause the symptom}
-    
-    the ingredients in the resultant set are then ranked based on the
-    number of days on which a given ingredient was eaten AND a symptom occurred.
+    For every ingredient count the days on which it was / was not eaten and
+    on which the user had / did not have a symptom (a 2x2 contingency table per ingredient,
+    computed for all ingredients at once by `compute_food_associations` on computations.py).
+    An ingredient eaten on the same day or the day before (see ASSOCIATION_LAGS on constants.py)
+    is counted as eaten on that day.
 
-    TODO: consider the column containing the impairment grade OR symptom_same_day 
-                                    (if no data on impairment grade for that date)
+    Only the ingredients with a risk ratio > 1 and eaten on at least ASSOCIATION_MIN_EXPOSURES
+    days with a symptom are listed. The ranking: by the p-value of Fisher's exact test
+    (i.e. "how unlikely is this association by chance"), then by the risk ratio.
+
+    Pass in the df's subset by dates to respect the selected date range.
 
     Returns:
         a pandas dataframe with one column
@@ -158,72 +381,42 @@ def make_probably_bad_foods_table(df):
 
     # Top n of "potentially bad" ingredients
     TOP_N = 5
-    
-    set_true = set(df.loc[df['symptom_same_day']==True, DISPLAYNAME])   # yes symptom on that day
-    set_false = set(df.loc[df['symptom_same_day']==False, DISPLAYNAME]) # no symptom on that day
-    set_potentially_bad = set_true.difference(set_false)
-
-    # make a ranking
-    sr = (df[[DISPLAYNAME, 'symptom_same_day', 'symptom_next_day']]
-     .groupby(DISPLAYNAME).sum()
-     .sort_values(['symptom_same_day', 'symptom_next_day'], ascending=[False, False])
-     .sum(axis=1).replace({0:None}).dropna().reset_index()[DISPLAYNAME])
-    
-    ranking = {ingredient: rank for rank, ingredient in sr.items()}
 
-    return (pd.DataFrame(set_potentially_bad or set_true)  # if set_potentially_bad is empty
-            .assign(ranking=lambda df: df.squeeze().map(ranking)).dropna()
-            .sort_values("ranking", ascending=True).head(TOP_N)
-            .drop("ranking", axis=1)).reset_index(drop=True).rename({0:''}, axis=1)
+    df = compute_food_associations(df_eating, df_symptomreport, lags=ASSOCIATION_LAGS)
+    df = df[(df['risk_ratio'] > 1) & (df['a'] >= ASSOCIATION_MIN_EXPOSURES)]
+    
+    return (df.sort_values(['p_fisher', 'risk_ratio'], ascending=[True, False]).head(TOP_N)[['food']]
+            .reset_index(drop=True).rename({'food': ''}, axis=1))
 
 
 
 
-def make_statistics_table(df_eating, df_symptomreport):
+def make_statistics_table(df_days):
     """
-    TODO
+    The "Eckdaten" table (unit 2): all the metrics from the day table (one row per day), 
+    i.e. a date range costs the number of days in it, not the number of rows in the long df's
+
+    df_days: see compute_day_table on computations.py (subset by dates)
     """
+    n_eating_days = int(df_days['eating'].sum())
+    is_symptom_day = df_days['symptom_reports'] > 0
+
     # Calculations
     #total number of symptoms
-    symptom_count = df_symptomreport['date'].count()
-    #total number of days with symptoms
-    symptom_days = df_symptomreport['date'].nunique()
-    #days of usage
-    df = df_eating.merge(df_symptomreport, on= 'date', how= 'outer')
-    usage_days= df['date'].nunique()
+    symptom_count = int(df_days['symptom_reports'].sum())
+    #total number of days with symptoms (exact in approximate mode too: one row per day, nothing to bound)
+    symptom_days = int(is_symptom_day.sum())
+    #days of usage (eating or symptoms)
+    usage_days = len(df_days)
     #relation days with symptoms/days of usage
     symptom_days_perc= round(symptom_days*100/usage_days,1)
-    #avg number of days with symptoms per week of usage
-    df_symptomreport["week_no"]=pd.to_datetime(df_symptomreport['date']).dt.isocalendar().week
-    symptoms= df_symptomreport.groupby('week_no')['date'].nunique().to_frame().reset_index()
-    df_eating['week_no'] = pd.to_datetime(df_eating['date']).dt.isocalendar().week
-    weeks = pd.DataFrame(df_eating['week_no'].unique())
-    weeks.columns = ['week_no']
-    symptoms_days_per_week = weeks.merge(symptoms, how='left', left_on='week_no', right_on='week_no')
-    avg_symptom_days_per_week = round(symptoms_days_per_week['date'].mean(),1)
+    #avg number of days with symptoms per week of usage (the weeks with food entries, and with symptoms)
+    symptom_days_per_week = df_days.loc[is_symptom_day].groupby('week').size()
+    weeks = df_days.loc[df_days['eating'], 'week'].unique()
+    avg_symptom_days_per_week = round(symptom_days_per_week.reindex(weeks).mean(),1)
     #comparing breakfast, lunch and dinner (e.g. breakfast was documented only 55% of the time, but lunch 87% ...)
-    df = df_eating[['date', 'daytime']].groupby('date')[['daytime']].sum().reset_index()
-    def detect_breakfast(df_aggregate):
-        if 'BREAKFAST' in df_aggregate['daytime']:
-            return 1
-        else:
-            return 0
-    def detect_lunch(df_aggregate):
-        if 'LUNCH' in df_aggregate['daytime']:
-            return 1
-        else:
-            return 0
-    def detect_dinner(df_aggregate):
-        if 'DINNER' in df_aggregate['daytime']:
-            return 1
-        else:
-            return 0
-    df['breakfast'] = df.apply(detect_breakfast, axis=1)
-    df['lunch'] = df.apply(detect_lunch, axis=1)
-    df['dinner'] = df.apply(detect_dinner, axis=1)
-    breakfast_perc=round(df['breakfast'].sum()*100/df['breakfast'].count(),1)
-    lunch_perc=round(df['lunch'].sum()*100/df['breakfast'].count(),1)
-    dinner_perc=round(df['dinner'].sum()*100/df['breakfast'].count(),1)
+    breakfast_perc, lunch_perc, dinner_perc = (round(df_days[daytime].sum()*100/n_eating_days,1)
+                                               for daytime in MEALS_MAPPING)
     # generating dataframe for table
     data = {'Überschrift': ['Dokumentierte Tage','Dokumentierte Symptome (Anzahl)','Tage mit Symptomen (Anzahl)','Tage mit Symptomen (Anteil)','Tage mit Symptomen pro Woche (⌀)','Häufigkeit Frühstück','Häufigkeit Mittagessen', 'Häufigkeit Abendessen'],
             'Werte': [usage_days, symptom_count, symptom_days,str(symptom_days_perc) + '%', avg_symptom_days_per_week, str(breakfast_perc ) + '%', str(lunch_perc) + '%', str(dinner_perc) + '%']}
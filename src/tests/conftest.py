@@ -0,0 +1,23 @@
+"""
+Shared fixtures for the tests (no database needed - synthetic accounts, see benchmarks.py)
+
+Run from the app's folder:
+    python -m pytest tests
+"""
+
+import os
+import sys
+import pytest
+
+# the modules of the app are in the parent folder (imported as top-level modules, like app.py does)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import make_synthetic_account
+
+
+@pytest.fixture(scope='session')
+def account():
+    """
+    df_eating, df_symptoms of a synthetic account (200 days)
+    """
+    return make_synthetic_account(n_days=200)
@@ -0,0 +1,58 @@
+"""
+Helper functions for the tests (not fixtures, see conftest.py)
+
+Kept out of the app's modules: plotly.graph_objects (for the validation of the figures) is slow to import
+"""
+
+import json
+from base64 import b64decode
+from math import isclose
+import numpy as np
+import plotly.graph_objects as go
+from plotly.utils import PlotlyJSONEncoder
+from pandas import Timestamp
+from constants import ERR_PREFIX
+
+
+
+def assert_equivalent_figures(fig_dict, fig):
+    """
+    Checks a figure made as a plain dict against the equivalent figure made by plotly
+    (see build_figure on plotting_toolkit.py).
+
+    - fig_dict must be valid according to plotly's schema (go.Figure validates it)
+    - both must give the same json, up to the encoding of the arrays (list / typed array),
+      of the dates ('2023-01-01' / '2023-01-01T00:00:00') and float rounding
+
+    Raises:
+        AssertionError (with the path of the first difference)
+    """
+    def normalize(obj):
+        if type(obj) is dict and 'bdata' in obj and 'dtype' in obj:   # typed array (plotly >= 6)
+            return [normalize(e) for e in np.frombuffer(b64decode(obj['bdata']), dtype=obj['dtype']).tolist()]
+        if type(obj) is dict:
+            return {k: normalize(v) for k,v in obj.items()}
+        if type(obj) is list:
+            return [normalize(e) for e in obj]
+        if type(obj) is str and len(obj) >= 10 and obj[4:5] == obj[7:8] == '-':
+            try:
+                return Timestamp(obj).isoformat()
+            except ValueError:
+                return obj
+        return obj
+
+    def compare(a, b, path):
+        if type(a) is dict and type(b) is dict:
+            assert a.keys() == b.keys(), f"{ERR_PREFIX}figures differ at {path}: keys {sorted(a)} != {sorted(b)}"
+            [compare(a[k], b[k], f"{path}.{k}") for k in a]
+        elif type(a) is list and type(b) is list:
+            assert len(a) == len(b), f"{ERR_PREFIX}figures differ at {path}: length {len(a)} != {len(b)}"
+            [compare(x, y, f"{path}[{i}]") for i,(x,y) in enumerate(zip(a, b))]
+        elif type(a) in (int, float) and type(b) in (int, float):
+            assert isclose(a, b, abs_tol=1e-9), f"{ERR_PREFIX}figures differ at {path}: {a} != {b}"
+        else:
+            assert a == b, f"{ERR_PREFIX}figures differ at {path}: {a!r} != {b!r}"
+
+    go.Figure(fig_dict)   # raises ValueError if invalid (the validated figure is not compared - plotly adds a template)
+    to_json = lambda f: normalize(json.loads(json.dumps(f, cls=PlotlyJSONEncoder)))
+    compare(to_json(fig_dict), to_json(fig), "figure")
@@ -0,0 +1,169 @@
+"""
+The caches of the app (see caching.py)
+"""
+
+import re
+import json
+from itertools import product
+from time import monotonic, sleep
+from threading import Barrier
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import caching
+import data_processing
+from caching import FigureCache, SessionStore, SingleFlight
+from developer_toolkit import get_selector_values
+from units import unit_3, unit_4, unit_5, unit_6, unit_7
+
+
+def make_figure(i, size=100):
+    """A figure (dict) of about size + 50 bytes as json"""
+    return {'data': [{'type': 'bar', 'name': f"{i}".ljust(size)}], 'layout': {}}
+
+
+def test_figure_cache_under_byte_cap():
+    cache = FigureCache(max_bytes=1000, directory=None, enabled=True)
+    for i in range(50):
+        cache.set(f"unit_4:{i}", make_figure(i, size=10 * i))
+        assert cache.n_bytes <= 1000
+        assert cache.n_bytes == sum(len(value) for value in cache.memory.values())
+    cache.set('too big', make_figure(0, size=2000))   # over the cap on its own -> not kept
+    assert 'too big' not in cache.memory and cache.n_bytes <= 1000
+
+
+def test_figure_cache_evicts_least_recently_used():
+    size = len(json.dumps(make_figure('a')))
+    cache = FigureCache(max_bytes=3 * size, directory=None, enabled=True)   # 3 figures
+    for key in 'abc':
+        cache.set(key, make_figure(key))
+    assert list(cache.memory) == ['a', 'b', 'c']
+    assert cache.get('a') == make_figure('a')   # a hit -> the most recently used
+    cache.set('d', make_figure('d'))
+    assert list(cache.memory) == ['c', 'a', 'd']
+    assert cache.get('b') is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_figure_cache_keys_per_selector_state():
+    # every combination of the selectors' values of units 3-7 has a key of its own (see make_figure_key on app.py)
+    cache = FigureCache(enabled=True)
+    data = ('5:0123456789abcdef0123', '5:0123456789abcdef0123')
+    keys = [cache.make_key(unit.id, *data, '2023-01-01', '2023-05-01', *values)
+            for unit in (unit_3, unit_4, unit_5, unit_6, unit_7) for values in product(*get_selector_values(unit))]
+    assert len(set(keys)) == len(keys) > 5
+    # the same values -> the same key, the dates and the data count too
+    assert cache.make_key('unit_4', *data, 'A', 'B') == cache.make_key('unit_4', *data, 'A', 'B')
+    assert cache.make_key('unit_4', *data, 'A', 'B') != cache.make_key('unit_4', *data, 'B', 'A')
+    assert cache.make_key('unit_4', 1) != cache.make_key('unit_4', '1')
+    assert cache.make_key('unit_4', 'A B') != cache.make_key('unit_4', 'A', 'B')
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A fake monotonic clock for the session store: clock[0] += seconds"""
+    now = [1000.0]
+    monkeypatch.setattr(caching, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_session_token(account):
+    frames = {'eating': account[0], 'symptoms': account[1]}
+    token = SessionStore.make_token(5, frames)
+    assert re.fullmatch(r"5:[0-9a-f]{20}", token)
+    assert SessionStore.is_token(token)
+    assert token == SessionStore.make_token(5, {k: df.copy() for k, df in frames.items()})   # the same data
+    assert token != SessionStore.make_token(5, {'eating': account[0].iloc[1:], 'symptoms': account[1]})
+    assert token.split(':')[1] == SessionStore.make_token(6, frames).split(':')[1]
+    assert not SessionStore.is_token('{"columns": ["date"]}') and not SessionStore.is_token(None)
+
+
+def test_session_ttl(clock, account):
+    store = SessionStore(ttl=60, directory=None)
+    token = store.put(5, {'eating': account[0]})
+    other = store.put(6, {'eating': account[0].head()})
+    clock[0] += 50
+    assert store.get(token, 'eating') is account[0]   # an access renews the ttl
+    clock[0] += 50
+    assert store.get(token, 'eating') is account[0]
+    assert store.get(other, 'eating') is None         # expired (no access for 100 seconds)
+    assert store.get(token, 'symptoms') is None
+    clock[0] += 61
+    assert store.get(token, 'eating') is None and len(store) == 0
+
+
+def test_session_byte_cap(clock, account):
+    df = account[0]
+    n_bytes = int(df.memory_usage(index=True, deep=True).sum())
+    store = SessionStore(max_bytes=int(2.5 * n_bytes), directory=None)   # 2 sessions
+    tokens = [store.put(i, {'eating': df}) for i in range(2)]
+    assert store.get(tokens[0], 'eating') is df       # the least recently used is tokens[1] now
+    tokens.append(store.put(2, {'eating': df}))
+    assert list(store.memory) == [tokens[0], tokens[2]] and store.n_bytes == 2 * n_bytes
+    assert [store.get(token, 'eating') is df for token in tokens] == [True, False, True]
+    # the only session is kept even if over the budget
+    store = SessionStore(max_bytes=n_bytes // 2, directory=None)
+    token = store.put(0, {'eating': df})
+    assert store.get(token, 'eating') is df
+
+
+def test_read_store_refetches_on_miss(monkeypatch, account):
+    frames = {'eating': account[0], 'symptomreport': account[1]}
+    calls = []
+    monkeypatch.setattr(data_processing, 'session_store', SessionStore(directory=None))
+    monkeypatch.setattr(data_processing, 'check_account', lambda account_id: account_id == '5')
+    monkeypatch.setattr(data_processing, 'load_account', lambda account_id: calls.append(account_id) or frames)
+
+    token = SessionStore.make_token(5, frames)   # e.g. from another worker process / expired
+    assert data_processing.read_store(token, 'eating') is account[0]
+    assert data_processing.read_store(token, 'symptomreport') is account[1]   # kept under the same token
+    assert calls == ['5']
+    with pytest.raises(ValueError):
+        data_processing.read_store('7:' + token.split(':')[1], 'eating')   # unknown account
+
+
+def run_concurrently(single_flight, n, func):
+    """
+    n threads call single_flight.do with the same key at the same time
+    func: called by the first one, returns once the others have called too (i.e. are waiting for it)
+    Returns:
+        [result or exception of each call]
+    """
+    start = Barrier(n)
+    def all_called():
+        deadline = monotonic() + 10
+        while single_flight.metrics['test']['calls'] < n and monotonic() < deadline:
+            sleep(0.001)
+        return func()
+    def call():
+        start.wait()
+        try:
+            return single_flight.do('test', 'key', all_called)
+        except Exception as e:
+            return e
+    with ThreadPoolExecutor(n) as executor:
+        return list(executor.map(lambda _: call(), range(n)))
+
+
+def test_single_flight_once():
+    N = 8
+    executions = []
+    single_flight = SingleFlight(enabled=True)
+    results = run_concurrently(single_flight, N, lambda: executions.append(1) or object())
+    assert len(executions) == 1
+    assert all(result is results[0] for result in results)   # the same object
+    metrics = single_flight.metrics['test']
+    assert (metrics['calls'], metrics['executions'], metrics['collapsed']) == (N, 1, N - 1)
+    assert not single_flight.flights   # nothing kept afterwards
+    assert single_flight.do('test', 'key', lambda: 1) == 1   # a new flight
+
+
+def test_single_flight_exception():
+    N = 8
+    def fail():
+        raise KeyError('failed')
+    single_flight = SingleFlight(enabled=True)
+    results = run_concurrently(single_flight, N, fail)
+    assert all(type(result) is KeyError for result in results)   # every waiter gets it
+    assert all(result is results[0] for result in results)
+    assert single_flight.metrics['test']['executions'] == 1
+    assert not single_flight.flights
@@ -0,0 +1,79 @@
+"""
+The combinations of foods counted on the meal x food incidence matrix (see IncidenceMatrix on computations.py)
+against the frozenset-based counting it replaced, the food associations (unit 8) against scipy's tests
+"""
+
+from itertools import combinations
+from collections import Counter
+import pytest
+from scipy.stats import fisher_exact, chi2_contingency
+from pandas import DataFrame, Timestamp, Timedelta
+from computations import IncidenceMatrix, compute_combination_occurrence, sort_counter, compute_food_associations
+from data_filtering import subset_data_by_dates, subset_data_by_selector_values, subset_incidence_matrix
+from constants import DISPLAYNAME, A, B, C, D
+
+
+def count_combinations_with_sets(sets, cardinality=2):
+    """The reference: compute_combination_occurrence as it was before the incidence matrix"""
+    subsets = frozenset(frozenset(e) for e in sum([list(combinations(e, cardinality)) for e in sets], []))
+    return Counter({subset: sum(subset.issubset(st) for st in sets) for subset in subsets})
+
+
+def get_meals(df):
+    return list(df.groupby(['date', 'daytime'])[DISPLAYNAME].agg(frozenset))
+
+
+def test_docstring_example():
+    sets = [{'a', 'b', 'c'}, {'a', 'b', 'c'}, {'x', 'y'}, {'x', 'z'}, {'x', 'w'}]
+    assert compute_combination_occurrence(sets) == count_combinations_with_sets(sets)
+
+
+@pytest.mark.parametrize('cardinality', [1, 2, 3, 4])
+def test_count_combinations(account, cardinality):
+    df_eating = account[0]
+    expected = count_combinations_with_sets(get_meals(df_eating), cardinality)
+    incidence = IncidenceMatrix.from_dataframe(df_eating)
+    assert incidence.count_combinations(cardinality) == expected
+    # top_n: the same ranking, the ties sorted by the names
+    assert (list(incidence.count_combinations(cardinality, top_n=5).items()) 
+            == sort_counter(expected).most_common(5))
+
+
+@pytest.mark.parametrize('meals', [A, B, C, D])
+@pytest.mark.parametrize('symptoms', [A, B, C])
+def test_count_combinations_of_subset(account, meals, symptoms):
+    # the rows of the matrix subset like the long df (see subset_incidence_matrix), the small ones are enumerated
+    df_eating = account[0]
+    start_date, end_date = '2023-02-01', '2023-05-31'
+    df = subset_data_by_dates(df_eating, start_date=start_date, end_date=end_date)
+    df = subset_data_by_selector_values(df, meals_selector=meals, symptom_selector=symptoms)
+    incidence = subset_incidence_matrix(IncidenceMatrix.from_dataframe(df_eating), start_date, end_date,
+                                        meals_selector=meals, symptom_selector=symptoms)
+    for cardinality in (2, 3):
+        assert incidence.count_combinations(cardinality) == count_combinations_with_sets(get_meals(df), cardinality)
+
+
+def test_food_associations_against_scipy():
+    # 10 documented days, a symptom on the days 2, 4, 6 -> the 2x2 tables (a, b, c, d), zero cells included
+    EATEN = {'Milch': [2, 4, 6],          # (3, 0, 0, 7)
+             'Brot': range(1, 11),        # (3, 7, 0, 0) eaten every day: no chi-squared test
+             'Apfel': [1, 3, 5],          # (0, 3, 3, 4)
+             'Käse': [2, 3, 7, 8],        # (1, 3, 2, 4)
+             'Ei': [4, 6, 9]}             # (2, 1, 1, 6)
+    day = lambda i: Timestamp('2023-01-01') + Timedelta(days=i)
+    df_eating = DataFrame([(day(i), food) for food, days in EATEN.items() for i in days], columns=['date', DISPLAYNAME])
+    df_symptomreport = DataFrame({'date': [day(i) for i in (2, 4, 6)]})
+
+    df = compute_food_associations(df_eating, df_symptomreport).set_index('food')
+    assert df.loc['Milch', ['a', 'b', 'c', 'd']].tolist() == [3, 0, 0, 7]
+    assert df.loc['Brot', ['a', 'b', 'c', 'd']].tolist() == [3, 7, 0, 0]
+    for food, row in df.iterrows():
+        a, b, c, d = (int(row[e]) for e in 'abcd')
+        assert row['p_fisher'] == pytest.approx(fisher_exact([[a, b], [c, d]], alternative='greater').pvalue)
+        # the +0.5 corrected odds ratio = the odds ratio of the table doubled +1
+        corrected = fisher_exact([[2*a + 1, 2*b + 1], [2*c + 1, 2*d + 1]]).statistic
+        assert row['odds_ratio'] == pytest.approx(corrected)
+        if 0 in (a + b, c + d, a + c, b + d):   # a zero expected frequency: no test
+            assert row['p_chi2'] == 1.0
+        else:
+            assert row['p_chi2'] == pytest.approx(chi2_contingency([[a, b], [c, d]], correction=False).pvalue)
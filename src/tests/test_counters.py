@@ -0,0 +1,125 @@
+"""
+The per-account counters (see FoodCounters on counters.py) against the counts made from the long df
+"""
+
+from collections import Counter
+import json
+import pickle
+import pytest
+from counters import FoodCounters, FOODS, BASKETS, PAIRS, TRIPLES
+from sketches import CountMinSketch
+from computations import IncidenceMatrix
+from data_filtering import subset_data_by_selector_values
+from plotting_toolkit import make_figure_6
+from constants import DISPLAYNAME, A, B, C, D
+
+
+@pytest.fixture(scope='module')
+def counters(account):
+    return FoodCounters.from_dataframe(account[0])
+
+
+def count_from_dataframe(df, what):
+    if what == FOODS:
+        return Counter(df[DISPLAYNAME].dropna())
+    meals = df.dropna(subset=[DISPLAYNAME]).groupby(['date', 'daytime'])[DISPLAYNAME].agg(frozenset)
+    if what == BASKETS:
+        return Counter(meals)
+    return IncidenceMatrix.from_sets(meals).count_combinations(what)
+
+
+def test_covers(account, counters):
+    dates = account[0]['date']
+    assert len(counters) == account[0].groupby(['date', 'daytime']).ngroups
+    assert counters.covers(dates.min(), dates.max())
+    assert not counters.covers(dates.min() + (dates.max() - dates.min()) / 2, dates.max())
+
+
+@pytest.mark.parametrize('what', FoodCounters.COUNTED)
+@pytest.mark.parametrize('meals', [A, B, C, D])
+@pytest.mark.parametrize('symptoms', [A, B, C])
+def test_query_symptoms(account, counters, what, meals, symptoms):
+    df = subset_data_by_selector_values(account[0], meals_selector=meals, symptom_selector=symptoms)
+    assert counters.query(what, meals_selector=meals, symptom_selector=symptoms) == count_from_dataframe(df, what)
+
+
+@pytest.mark.parametrize('meals', [A, B, C, D])
+@pytest.mark.parametrize('impairment', [0, 3, 7, 10])
+def test_query_impairment(account, counters, meals, impairment):
+    df = subset_data_by_selector_values(account[0], meals_selector=meals, impairment_selector=impairment)
+    assert (counters.query(FOODS, meals_selector=meals, impairment_selector=impairment) 
+            == count_from_dataframe(df, FOODS))
+
+
+@pytest.mark.parametrize('cardinality', [PAIRS, TRIPLES])
+@pytest.mark.parametrize('symptoms', [A, B, C])
+def test_same_ranking_as_incidence_matrix(account, counters, cardinality, symptoms):
+    # unit 7: the counters (whole history) and the incidence matrix (any dates) rank the ties alike
+    df = subset_data_by_selector_values(account[0], meals_selector=A, symptom_selector=symptoms)
+    expected = IncidenceMatrix.from_dataframe(df).count_combinations(cardinality, top_n=5)
+    assert counters.query(cardinality, meals_selector=A, symptom_selector=symptoms).most_common(5) == list(expected.items())
+
+
+@pytest.mark.parametrize('meals', [A, B, C, D])
+@pytest.mark.parametrize('symptoms', [A, B, C])
+def test_same_figure_6(account, counters, meals, symptoms):
+    # unit 6: the typical meals are the same whether the counts come from the counters or from the df
+    df = subset_data_by_selector_values(account[0], meals_selector=meals, symptom_selector=symptoms)
+    counts = counters.query(BASKETS, meals_selector=meals, symptom_selector=symptoms)
+    assert make_figure_6(df, color=symptoms, counts=counts) == make_figure_6(df, color=symptoms)
+
+
+def test_add_and_remove_meals(account, counters):
+    # meal by meal (in a different order, with meals removed and added again) = from the whole df
+    df = account[0].dropna(subset=[DISPLAYNAME])
+    meals = list(df.groupby(['date', 'daytime'], sort=False))
+    streamed = FoodCounters()
+    streamed.query(PAIRS)   # the pairs are kept up to date once they have been asked for
+    for (date, daytime), meal in reversed(meals):
+        streamed.add_meal(date, daytime, ['Brot', 'Käse'])   # replaced by the next call
+        streamed.add_meal(date, daytime, list(meal[DISPLAYNAME]), *meal[['symptom_same_day', 'symptom_next_day',
+                                                                           'avg_impairment']].iloc[0])
+    for (date, daytime), _ in meals[:10]:
+        streamed.remove_meal(date, daytime)
+    for (date, daytime), meal in meals[:10]:
+        streamed.add_meal(date, daytime, list(meal[DISPLAYNAME]), *meal[['symptom_same_day', 'symptom_next_day',
+                                                                           'avg_impairment']].iloc[0])
+    assert len(streamed) == len(counters)
+    assert (streamed.first_date, streamed.last_date) == (counters.first_date, counters.last_date)
+    for what in FoodCounters.COUNTED:
+        assert streamed.query(what, meals_selector=B, symptom_selector=B) == counters.query(what, meals_selector=B,
+                                                                                              symptom_selector=B)
+
+
+def test_pairs_counted_lazily(account):
+    counters = FoodCounters.from_dataframe(account[0])
+    assert not counters.combinations
+    counters.query(FOODS)
+    assert not counters.combinations
+    counters.query(PAIRS)
+    assert {cardinality for _, cardinality in counters.combinations} == {PAIRS}
+
+
+def test_serialization(account, counters):
+    restored = FoodCounters.from_dict(json.loads(json.dumps(counters.to_dict())))
+    unpickled = pickle.loads(pickle.dumps(counters))
+    for copy in (restored, unpickled):
+        assert len(copy) == len(counters)
+        for what in FoodCounters.COUNTED:
+            assert copy.query(what, meals_selector=C, symptom_selector=C) == counters.query(what, meals_selector=C,
+                                                                                          symptom_selector=C)
+
+
+@pytest.mark.parametrize('cardinality', [PAIRS, TRIPLES])
+@pytest.mark.parametrize('symptoms', [A, B, C])
+def test_query_sketch(account, cardinality, symptoms):
+    # approximate mode: estimated from the sketches, no exact pairs/triples counted
+    counters = FoodCounters.from_dataframe(account[0])
+    sketch = counters.query_sketch(cardinality, meals_selector=A, symptom_selector=symptoms)
+    assert not counters.combinations
+    df = subset_data_by_selector_values(account[0], meals_selector=A, symptom_selector=symptoms)
+    exact = count_from_dataframe(df, cardinality)
+    assert sketch.total == sum(exact.values())
+    for item, estimate in sketch.most_common(5):
+        assert exact[item] <= estimate <= exact[item] + sketch.error_bound()
+    assert (CountMinSketch().update(list(exact.elements())).table == sketch.table).all()   # the same as from the df
@@ -0,0 +1,48 @@
+"""
+The fast figures (plain dicts, see FAST_FIGURES on constants.py) against the figures made by plotly
+"""
+
+import pytest
+import plotting_toolkit
+from data_filtering import subset_data_by_selector_values
+from helpers import assert_equivalent_figures
+from benchmarks import make_synthetic_account
+from plotting_toolkit import make_figure_3, make_figure_4, make_figure_5, make_figure_6, make_figure_7
+from constants import TIMELINE_WEBGL_MIN_DAYS, A, B, C, D
+
+
+def make_both(monkeypatch, make_figure, *args, **kwargs):
+    """
+    Returns:
+        the figure made with FAST_FIGURES, the figure made by plotly
+    """
+    monkeypatch.setattr(plotting_toolkit, 'FAST_FIGURES', True)
+    fig_dict = make_figure(*args, **kwargs)
+    monkeypatch.setattr(plotting_toolkit, 'FAST_FIGURES', False)
+    return fig_dict, make_figure(*args, **kwargs)
+
+
+@pytest.mark.parametrize('n_days', [200, TIMELINE_WEBGL_MIN_DAYS + 100])   # SVG and WebGL
+def test_figure_3(monkeypatch, n_days):
+    df_eating, df_symptoms = make_synthetic_account(n_days=n_days)
+    fig_dict, fig = make_both(monkeypatch, make_figure_3, df_eating, df_symptoms)
+    assert type(fig_dict) is dict
+    assert_equivalent_figures(fig_dict, fig)
+
+
+@pytest.mark.parametrize('make_figure', [make_figure_4, make_figure_6, make_figure_7])
+@pytest.mark.parametrize('meals', [A, B, C, D])
+@pytest.mark.parametrize('symptoms', [A, B, C])
+def test_figures_4_6_7(monkeypatch, account, make_figure, meals, symptoms):
+    df = subset_data_by_selector_values(account[0], meals_selector=meals, symptom_selector=symptoms)
+    args = (df, 3) if make_figure is make_figure_7 else (df,)
+    fig_dict, fig = make_both(monkeypatch, make_figure, *args, color=symptoms)
+    assert_equivalent_figures(fig_dict, fig)
+
+
+@pytest.mark.parametrize('meals', [A, B, C, D])
+@pytest.mark.parametrize('impairment', [0, 5, 10])
+def test_figure_5(monkeypatch, account, meals, impairment):
+    df = subset_data_by_selector_values(account[0], meals_selector=meals, impairment_selector=impairment)
+    fig_dict, fig = make_both(monkeypatch, make_figure_5, df, color='red')
+    assert_equivalent_figures(fig_dict, fig)
@@ -0,0 +1,30 @@
+"""
+The artifacts of the unit figures (see registry.py)
+"""
+
+import numpy as np
+from registry import UnitRegistry, INPUT_KEYS
+from caching import make_fingerprint
+
+
+def test_artifacts_bounded_by_bytes():
+    registry = UnitRegistry(max_bytes=3 * 8000)
+    for i in range(5):
+        registry.get_artifact('test', i, np.zeros, shape=1000)   # 8000 bytes each
+    assert list(registry.artifacts) == [2, 3, 4]   # the least recently used are dropped
+    assert registry.n_bytes == 3 * 8000
+
+    registry.get_artifact('test', 2, np.zeros, shape=1000)       # a hit -> the most recently used
+    registry.get_artifact('test', 5, np.zeros, shape=1000)
+    assert list(registry.artifacts) == [4, 2, 5]
+    assert (registry.hits, registry.misses) == (1, 6)
+
+    registry.get_artifact('test', 6, np.zeros, shape=10000)      # over the budget on its own -> not kept
+    assert list(registry.artifacts) == [4, 2, 5]
+
+
+def test_subset_keyed_without_new_data():
+    handle = {'key': 'subset:0123', 'start_date': '2023-01-01', 'end_date': '2023-05-01', 'new_data': True}
+    key_of = lambda handle: make_fingerprint(INPUT_KEYS['data_subset'](handle))
+    assert key_of(handle) == key_of({**handle, 'new_data': False})
+    assert key_of(handle) != key_of({**handle, 'key': 'subset:4567'})
@@ -0,0 +1,127 @@
+"""
+The sketches of the approximate mode (see sketches.py) against the exact counts,
+the grouping of similar meals (MinHash + LSH, unit 6) against the exact Jaccard similarity
+"""
+
+from collections import Counter
+import numpy as np
+import pytest
+import plotting_toolkit
+from sketches import CountMinSketch, merge_sketches, compute_minhash_signatures, cluster_similar_sets
+from computations import sort_counter
+from plotting_toolkit import make_figure_6
+from constants import DISPLAYNAME
+
+
+@pytest.fixture(scope='module')
+def stream():
+    """A skewed stream of items (a few heavy hitters, a long tail) and its exact counts"""
+    rng = np.random.default_rng(0)
+    items = [f"food {i}" for i in rng.zipf(1.3, size=50_000) if i <= 5000]
+    return items, Counter(items)
+
+
+def make_sketch(items, epsilon=0.01, delta=0.01):
+    return CountMinSketch(epsilon=epsilon, delta=delta).update(items)
+
+
+def test_error_bound(stream):
+    items, exact = stream
+    sketch = make_sketch(items)
+    keys = list(exact)
+    estimates = sketch.estimate(keys)
+    true = np.array([exact[k] for k in keys])
+    assert sketch.total == len(items)
+    assert (estimates >= true).all()   # never lower
+    within = estimates <= true + sketch.error_bound()
+    assert within.mean() >= 1 - sketch.delta   # not higher than the bound with the probability 1-delta
+
+
+def test_most_common(stream):
+    items, exact = stream
+    sketch = make_sketch(items, epsilon=0.001)
+    top = sketch.most_common(10)
+    assert [item for item, _ in top] == [item for item, _ in exact.most_common(10)]   # well apart in a zipf stream
+    for item, estimate in top:
+        assert exact[item] <= estimate <= exact[item] + sketch.error_bound()
+    assert len(sketch.most_common()) == min(len(exact), sketch.capacity)
+
+
+def test_merge(stream):
+    items, _ = stream
+    whole = make_sketch(items)
+    halves = make_sketch(items[::2]).merge(make_sketch(items[1::2]))
+    assert (halves.table == whole.table).all()
+    assert halves.total == whole.total
+    assert halves.most_common(10) == whole.most_common(10)
+
+
+def test_merge_sketches(stream):
+    items, _ = stream
+    whole = make_sketch(items)
+    shards = [make_sketch(items[i:i + 7000]) for i in range(0, len(items), 7000)]
+    merged = merge_sketches(shards)
+    assert (merged.table == whole.table).all()
+    assert merged.most_common(10) == whole.most_common(10)
+    assert shards[0].total == 7000   # the shards are not changed
+    with pytest.raises(ValueError):
+        merge_sketches([])
+    with pytest.raises(ValueError):
+        merge_sketches([make_sketch(items, epsilon=0.01), make_sketch(items, epsilon=0.1)])
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b)
+
+
+@pytest.fixture(scope='module')
+def meals():
+    """Random meals of 3-8 foods out of 200 foods"""
+    rng = np.random.default_rng(1)
+    return [frozenset(f"food {i}" for i in rng.choice(200, size=rng.integers(3, 9), replace=False))
+            for _ in range(300)]
+
+
+def test_minhash_signatures(meals):
+    # identical sets -> identical signatures (whatever the order / container of the items)
+    signatures = compute_minhash_signatures([meals[0], sorted(meals[0], reverse=True), list(meals[0])])
+    assert (signatures == signatures[0]).all()
+    # the fraction of equal values estimates the Jaccard similarity
+    a, b = meals[0], frozenset(list(meals[0])[:-1]) | {'Brot'}
+    signatures = compute_minhash_signatures([a, b], num_perm=256)
+    assert (signatures[0] == signatures[1]).mean() == pytest.approx(jaccard(a, b), abs=0.1)
+
+
+def test_similar_meals_clustered(meals):
+    # identical meals are always counted together, a meal with one more food (Jaccard >= 3/4) is grouped
+    # with it unless LSH misses the pair (rarely: the bands are tuned to a lower threshold)
+    counts = Counter()
+    for i, meal in enumerate(meals):
+        counts[meal] += 1
+        counts[frozenset(sorted(meal))] += 1
+        counts[meal | {f"extra {i}"}] += 1
+    clusters = cluster_similar_sets(counts, threshold=0.75)
+    assert sum(clusters.values()) == sum(counts.values())
+    assert all(clusters[meal] in (2, 3) for meal in meals)   # the representative: the more common one
+    assert np.mean([clusters[meal] == 3 for meal in meals]) >= 0.95
+
+
+def test_dissimilar_meals_not_clustered(meals):
+    # the merged meals are verified with the exact similarity: nothing clearly below the threshold is grouped
+    counts = Counter(meals)
+    clusters = cluster_similar_sets(counts, threshold=0.75)
+    for representative in clusters:
+        assert all(jaccard(representative, meal) >= 0.75 for meal in counts
+                   if meal != representative and clusters[representative] > counts[representative])
+    assert clusters == Counter({meal: n for meal, n in counts.items()})   # random meals: no pair >= 0.75
+    assert cluster_similar_sets(counts, threshold=1.0) == counts           # identical meals only
+
+
+def test_no_similarity_is_the_exact_grouping(monkeypatch, account):
+    # TYPICAL_MEAL_SIMILARITY = None -> the typical meals are the most common identical meals
+    monkeypatch.setattr(plotting_toolkit, 'TYPICAL_MEAL_SIMILARITY', None)
+    df = account[0]
+    exact = sort_counter(Counter(df.groupby(['date', 'daytime'])[DISPLAYNAME].agg(frozenset)))
+    expected = {meal for meal, n in exact.most_common(3) if n > 1}
+    fig = make_figure_6(df)
+    assert {frozenset(trace['labels']) for trace in fig['data']} == expected
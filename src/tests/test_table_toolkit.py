@@ -0,0 +1,243 @@
+"""
+The tables and the store codecs (see table_toolkit.py)
+"""
+
+from collections import OrderedDict
+import pytest
+import pandas as pd
+from pandas.testing import assert_frame_equal
+from table_toolkit import encode_frame, decode_frame, make_statistics_table, make_diary_table, prettify_diary_table
+from table_toolkit import parse_filter_query, query_frame, get_page, DIARY_COLUMNS
+from computations import compute_day_table
+from data_filtering import subset_data_by_dates
+from benchmarks import make_synthetic_account
+from constants import DISPLAYNAME, MEALS_MAPPING
+
+
+BINARY_CODECS = [('arrow', 'zstd'), ('arrow', 'lz4'), ('arrow', None),
+                 ('parquet', 'zstd'), ('parquet', 'snappy'), ('parquet', None)]
+
+
+@pytest.mark.parametrize('i', [0, 1])   # df_eating, df_symptoms
+def test_json_round_trip(account, i):
+    df = account[i]
+    data = encode_frame(df, 'json')
+    assert data.startswith('{')
+    assert_frame_equal(decode_frame(data), df, check_dtype=False)   # e.g. datetime64[s] -> [us]
+
+
+@pytest.mark.parametrize('codec, compression', BINARY_CODECS)
+@pytest.mark.parametrize('i', [0, 1])   # df_eating, df_symptoms
+def test_binary_round_trip(account, codec, compression, i):
+    pytest.importorskip('pyarrow')
+    df = account[i]
+    data = encode_frame(df, codec, compression)
+    assert data.startswith(f"{codec}+{compression}:")
+    assert_frame_equal(decode_frame(data), df)   # the dtypes are kept
+    # a subset (not a RangeIndex) and an empty df
+    assert_frame_equal(decode_frame(encode_frame(df.iloc[::3], codec, compression)), df.iloc[::3])
+    assert_frame_equal(decode_frame(encode_frame(df.iloc[:0], codec, compression)), df.iloc[:0])
+
+
+def test_unknown_codec(account):
+    pytest.importorskip('pyarrow')
+    with pytest.raises(ValueError):
+        encode_frame(account[1], 'csv')
+
+
+
+def make_statistics_table_from_long_frames(df_eating, df_symptomreport, year_aware_weeks=True):
+    """
+    The reference: make_statistics_table as it was before the day table (the long df's, row-wise detection
+    of the meals), the input df's are copied (it added a week column to them).
+    year_aware_weeks: False -> the ISO week number only, i.e. the same week of different years is one week
+    """
+    df_eating, df_symptomreport = df_eating.copy(), df_symptomreport.copy()
+    def week(dates):
+        iso = dates.dt.isocalendar()
+        return iso['year'] * 100 + iso['week'] if year_aware_weeks else iso['week']
+    symptom_count = df_symptomreport['date'].count()
+    symptom_days = df_symptomreport['date'].nunique()
+    usage_days = df_eating.merge(df_symptomreport, on='date', how='outer')['date'].nunique()
+    symptom_days_perc = round(symptom_days*100/usage_days, 1)
+    df_symptomreport['week_no'] = week(pd.to_datetime(df_symptomreport['date']))
+    symptoms = df_symptomreport.groupby('week_no')['date'].nunique().to_frame().reset_index()
+    df_eating['week_no'] = week(pd.to_datetime(df_eating['date']))
+    weeks = pd.DataFrame(df_eating['week_no'].unique(), columns=['week_no'])
+    avg_symptom_days_per_week = round(weeks.merge(symptoms, how='left', on='week_no')['date'].mean(), 1)
+    df = df_eating[['date', 'daytime']].groupby('date')[['daytime']].sum().reset_index()
+    breakfast_perc, lunch_perc, dinner_perc = (round(df['daytime'].apply(lambda s: daytime in s).sum()*100/len(df), 1)
+                                               for daytime in ('BREAKFAST', 'LUNCH', 'DINNER'))
+    data = {'Überschrift': ['Dokumentierte Tage','Dokumentierte Symptome (Anzahl)','Tage mit Symptomen (Anzahl)','Tage mit Symptomen (Anteil)','Tage mit Symptomen pro Woche (⌀)','Häufigkeit Frühstück','Häufigkeit Mittagessen', 'Häufigkeit Abendessen'],
+            'Werte': [usage_days, symptom_count, symptom_days,str(symptom_days_perc) + '%', avg_symptom_days_per_week, str(breakfast_perc ) + '%', str(lunch_perc) + '%', str(dinner_perc) + '%']}
+    return pd.DataFrame(data)
+
+
+def make_statistics_table_from_day_table(df_eating, df_symptomreport, start_date, end_date):
+    """As unit 2 does it: the day table of the whole history, subset by the dates"""
+    df_days = subset_data_by_dates(compute_day_table(df_eating, df_symptomreport), start_date, end_date)
+    return make_statistics_table(df_days)
+
+
+def assert_same_table(df, expected):
+    assert_frame_equal(df.astype({'Werte': object}), expected.astype({'Werte': object}), check_dtype=False)
+
+
+DATE_RANGES = [('2023-01-01', '2023-07-19'),   # the whole history
+               ('2023-02-01', '2023-02-28'), ('2023-03-15', '2023-06-30'), ('2023-05-05', '2023-05-05')]
+
+
+@pytest.mark.parametrize('start_date, end_date', DATE_RANGES)
+def test_statistics_table(account, start_date, end_date):
+    # less than a year: the same table as before (the weeks cannot collide)
+    df_eating, df_symptoms = (subset_data_by_dates(df, start_date, end_date) for df in account)
+    assert_same_table(make_statistics_table_from_day_table(*account, start_date, end_date),
+                      make_statistics_table_from_long_frames(df_eating, df_symptoms, year_aware_weeks=False))
+
+
+def test_statistics_table_inputs_unchanged(account):
+    df_eating, df_symptoms = (df.copy() for df in account)
+    make_statistics_table_from_day_table(df_eating, df_symptoms, *DATE_RANGES[0])
+    assert_frame_equal(df_eating, account[0])
+    assert_frame_equal(df_symptoms, account[1])
+
+
+@pytest.mark.parametrize('n_days', [400, 1500])
+def test_statistics_table_weeks_of_different_years(n_days):
+    # the intended change: a week is keyed by the ISO year and week, i.e. e.g. week 5 of 2023 and of 2024
+    # are two weeks (they were one before, which overstated "Tage mit Symptomen pro Woche (⌀)")
+    df_eating, df_symptoms = make_synthetic_account(n_days=n_days)
+    start_date, end_date = df_eating['date'].min(), df_eating['date'].max()
+    df = make_statistics_table_from_day_table(df_eating, df_symptoms, start_date, end_date)
+    assert_same_table(df, make_statistics_table_from_long_frames(df_eating, df_symptoms, year_aware_weeks=True))
+
+    df_before = make_statistics_table_from_long_frames(df_eating, df_symptoms, year_aware_weeks=False)
+    per_week = df['Überschrift'] == 'Tage mit Symptomen pro Woche (⌀)'
+    assert_same_table(df[~per_week], df_before[~per_week])   # the other metrics are unchanged
+    assert df.loc[per_week, 'Werte'].item() < df_before.loc[per_week, 'Werte'].item()
+
+
+
+def make_diary_table_row_by_row(df_eating, df_symptomreport):
+    """
+    The reference: make_diary_table as it was before the ordered categorical (a sorting key and
+    the impairment formatted row by row), the input df's are copied (it added a column to df_symptomreport)
+    """
+    DATE, TIME, DAYTIME, SYMPTOM, IMPAIRMENT, TEMP = 'date', 'time', 'daytime', 'symptom', 'impairment', 'sorting'
+    MAPPING = OrderedDict([('AFTER_GETTING_UP', 'GETTING_UP'), ('AFTER_BREAKFAST', 'BREAKFAST'),
+                           ('AFTER_LUNCH', 'LUNCH'), ('AFTER_DINNER', 'DINNER'), ('UNKNOWN', 'UNKNOWN')])
+    df_symptomreport = df_symptomreport.copy()
+    df_eating_agg = df_eating[[DATE, DAYTIME, DISPLAYNAME]].groupby([DATE, DAYTIME]).agg(", ".join).reset_index()
+    df_symptomreport[DAYTIME] = df_symptomreport[TIME].map(MAPPING)
+    df_symptomreport_agg = (df_symptomreport[[DATE, DAYTIME, SYMPTOM, IMPAIRMENT]].groupby([DATE, DAYTIME])
+                            .agg({SYMPTOM: ", ".join, IMPAIRMENT: 'mean'}).reset_index())
+    values_list = list(MAPPING.values()) + list(set(df_symptomreport_agg[DAYTIME].unique()).difference(MAPPING.values()))
+    df_diary = df_symptomreport_agg.merge(df_eating_agg, how='outer', on=[DATE, DAYTIME])
+    df_diary[TEMP] = df_diary[DAYTIME].apply(lambda v: values_list.index(v))
+    df_diary = df_diary.sort_values([DATE, TEMP]).drop(TEMP, axis=1)
+    df_diary = df_diary.reindex(columns=[DATE, DAYTIME, DISPLAYNAME, SYMPTOM, IMPAIRMENT])
+    labels = ["Nach dem Aufstehen"] + list(MEALS_MAPPING.values()) + ["Unbekannt"]
+    df_diary[DAYTIME] = df_diary[DAYTIME].map(dict(zip(MAPPING.values(), labels)))
+    df_diary[IMPAIRMENT] = df_diary[IMPAIRMENT].apply(lambda v: str(round(v)) if not pd.isnull(v) else '')
+    return df_diary.reset_index(drop=True)
+
+
+def prettify_diary_table_row_by_row(df_diary):
+    """The reference for prettify_diary_table (strftime and duplicated on the rows in the date range)"""
+    df_diary = df_diary.copy()
+    df_diary['date'] = df_diary['date'].dt.strftime(r'%d/%m/%Y')
+    df_diary.loc[df_diary['date'].duplicated(), 'date'] = ''
+    df_diary.columns = ["Datum", "Zeit", "Lebensmittel", "Symptome", "Beeinträchtigungsgrad"]
+    return df_diary
+
+
+@pytest.mark.parametrize('start_date, end_date', DATE_RANGES)
+def test_diary_table(account, start_date, end_date):
+    # made once per account, then subset by the dates (as unit 3 does it, see get_diary)
+    df_diary = subset_data_by_dates(make_diary_table(*account), start_date, end_date)
+    expected = subset_data_by_dates(make_diary_table_row_by_row(*account), start_date, end_date)
+    assert_frame_equal(prettify_diary_table(df_diary.reset_index(drop=True)),
+                       prettify_diary_table_row_by_row(expected.reset_index(drop=True)), check_dtype=False)
+
+
+def test_diary_table_inputs_unchanged(account):
+    df_eating, df_symptoms = (df.copy() for df in account)
+    make_diary_table(df_eating, df_symptoms)
+    assert_frame_equal(df_eating, account[0])
+    assert_frame_equal(df_symptoms, account[1])
+
+
+
+def test_parse_filter_query():
+    assert parse_filter_query(None) == parse_filter_query('') == []
+    assert parse_filter_query('{Lebensmittel} contains Brot && {Beeinträchtigungsgrad} >= 3') == [
+        ('Lebensmittel', 'contains', 'Brot', True), ('Beeinträchtigungsgrad', '>=', '3', True)]
+    assert parse_filter_query('{Zeit} icontains "früh"') == [('Zeit', 'contains', 'früh', False)]
+    assert parse_filter_query('{Datum} datestartswith 2023-05') == [('Datum', 'datestartswith', '2023-05', True)]
+    assert parse_filter_query('{a} eq 1 && {b} ge 2') == [('a', '=', '1', True), ('b', '>=', '2', True)]
+    assert parse_filter_query('{a} ?? 1 && {b} ne x') == [('b', '!=', 'x', True)]   # not parsed -> skipped
+
+
+@pytest.fixture(scope='module')
+def diary(account):
+    df_diary = make_diary_table(*account)
+    df_diary.loc[df_diary.index[-1], 'impairment'] = 10   # 10 sorts as a number, not as text
+    return df_diary
+
+
+def diary_query(df_diary, sort_by=None, filter_query=None):
+    return query_frame(df_diary, sort_by, filter_query, columns=DIARY_COLUMNS)
+
+
+def test_query_frame_numbers(diary):
+    df = diary_query(diary, filter_query='{Beeinträchtigungsgrad} > 5')
+    assert len(df) and (df['impairment'] > 5).all() and 10 in df['impairment'].tolist()
+    assert len(df) == (diary['impairment'] > 5).sum()
+
+    df = diary_query(diary, sort_by=[{'column_id': 'Beeinträchtigungsgrad', 'direction': 'desc'}])
+    impairment = df['impairment'].dropna().tolist()
+    assert impairment[0] == 10 and impairment == sorted(impairment, reverse=True)
+    assert df['impairment'].iloc[len(impairment):].isna().all()   # the missing ones last
+
+
+def test_query_frame_times_of_day(diary):
+    # in the order of the day, not alphabetically
+    order = ["Nach dem Aufstehen", "Frühstück", "Mittagessen", "Abendessen", "Unbekannt"]
+    df = diary_query(diary, sort_by=[{'column_id': 'Zeit', 'direction': 'asc'}])
+    times = df['daytime'].dropna().astype(str).tolist()
+    assert times == sorted(times, key=order.index)
+
+    df = diary_query(diary, filter_query='{Zeit} > Frühstück')
+    assert set(df['daytime'].astype(str)) <= set(order[2:])
+    df = diary_query(diary, filter_query='{Zeit} icontains mittag')
+    assert len(df) and set(df['daytime'].astype(str)) == {"Mittagessen"}
+
+
+def test_query_frame_dates(diary):
+    assert len(diary_query(diary, filter_query='{Datum} datestartswith 2023')) == len(diary)
+    df = diary_query(diary, filter_query='{Datum} datestartswith 2023-02')
+    assert len(df) and (df['date'].dt.month == 2).all()
+    assert len(diary_query(diary, filter_query='{Datum} contains /02/2023')) == len(df)   # as shown
+    df = diary_query(diary, filter_query='{Datum} >= 2023-02-01 && {Datum} < 01/03/2023')
+    assert len(df) and (df['date'].dt.month == 2).all()
+    assert len(diary_query(diary, filter_query='{Datum} > no date')) == 0
+
+
+def test_query_frame_then_page(diary):
+    df = diary_query(diary, sort_by=[{'column_id': 'Beeinträchtigungsgrad', 'direction': 'desc'}],
+                     filter_query='{Beeinträchtigungsgrad} >= 1')
+    df_page, page_count, page_current = get_page(df, 0, 5)
+    assert page_count == -(-len(df) // 5) and page_current == 0
+    df_pretty = prettify_diary_table(df_page.copy())   # text for the visible rows only
+    assert df_pretty["Beeinträchtigungsgrad"].iloc[0] == '10'
+    assert df['impairment'].dtype == 'Int64' and isinstance(df['daytime'].dtype, pd.CategoricalDtype)
+
+
+def test_get_page():
+    df = pd.DataFrame({'a': range(23)})
+    page, page_count, page_current = get_page(df, 2, 10)
+    assert (page['a'].tolist(), page_count, page_current) == ([20, 21, 22], 3, 2)
+    assert get_page(df, 7, 10)[2] == 2      # clipped to the last page (e.g. after filtering)
+    assert get_page(df, None, 10)[2] == 0
+    page, page_count, page_current = get_page(df.iloc[:0], 3, 10)
+    assert (len(page), page_count, page_current) == (0, 1, 0)
@@ -9,12 +9,11 @@ Define your new unit here, and import it in app.py
 
 from dash import dcc, html
 from dash.dash_table import DataTable
-from PIL import Image
 import os
 
 from developer_toolkit import get_dash_components_from_unit
-from table_toolkit import instantiate_debug_table
-from constants import (DEBUG, BANNER_PATH, MIN_DATE, MAX_DATE, MEALS_MAPPING, ACCOUNT, 
+from table_toolkit import instantiate_debug_table, DIARY_COLUMNS
+from constants import (DEBUG, DIARY_PAGE_SIZE, BANNER_PATH, MIN_DATE, MAX_DATE, MEALS_MAPPING, ACCOUNT, 
                        TITLE_UNIT_1, TITLE_UNIT_2, TITLE_UNIT_3, TITLE_UNIT_4, TITLE_UNIT_5, 
                        TITLE_UNIT_6, TITLE_UNIT_7, TITLE_UNIT_8,
                        TEXT_UNIT_0, TEXT_UNIT_1, TEXT_UNIT_5, TEXT_UNIT_7, TEXT_FOOTER,
@@ -24,8 +23,8 @@ from constants import (DEBUG, BANNER_PATH, MIN_DATE, MAX_DATE, MEALS_MAPPING, AC
 
 #### Define your units here ####
 
-# The header / banner
-img = Image.open(BANNER_PATH) if os.path.exists(BANNER_PATH) else None
+# The header / banner: served as a static file from the assets folder (relative url: works behind a path prefix too)
+img = BANNER_PATH if os.path.exists(BANNER_PATH) else None
 
 header = html.Div(
     style=css,  # just to show how to use css here
@@ -38,12 +37,13 @@ unit_0 = html.Div([
         html.Div([
             dcc.Input(placeholder=f"{ACCOUNT}nummer", id="unit_0_inputbox", type='number', debounce=True),
             html.Button(TEXT_UNIT_0, id='unit_0_button', n_clicks=0),
-            html.P(id='unit_0_message_1', style={'color': 'red'})   # account not found message
+            html.P(id='unit_0_message_1', style={'color': 'red'}),  # account not found message
+            html.Progress(id='unit_0_progress', style={'display': 'none'})   # shown while loading (background callbacks only)
                 ]),
         html.H1("", id="unit_0_message_2", style={'textAlign':'center'}),  # "Informationen über..."
-        dcc.Store(id="store_1"),   # df_eating (the merged table)
-        dcc.Store(id="store_2"),   # df_symptomreport
-        dcc.Store(id="store_3")    # df_diary
+        dcc.Store(id="store_1"),   # df_eating (the merged table): token or json (see write_store on data_processing.py)
+        dcc.Store(id="store_2"),   # df_symptomreport (the diary is made from both on the server, see get_diary)
+        dcc.Store(id="store_subset")   # the handle of the df's subset by the selected dates (see update_subset on app.py)
     ], id='unit_0')
 
 
@@ -67,7 +67,7 @@ dropdown = dcc.Dropdown(options=[
     {'label':"3 Monate", 'value':C},
     {'label':"4 Wochen", 'value':D}, 
     {'label':"Eine Woche", 'value':E}
-                              ], value=A, id="unit_1_selector_2")
+                              ], value=A, id="unit_1_selector_2")   # the time spans: see assets/unit_1.js
 
 unit_1 = html.Div([
         html.H2(TITLE_UNIT_1),
@@ -90,9 +90,12 @@ unit_2 = html.Div([
 
 
 # UNIT3: Diary (graph + table)
-table = DataTable(  # the diary table
+table = DataTable(  # the diary table (paged, sorted and filtered on the server, see update_unit_3_table_0 on app.py)
+                    columns=[{'name': column, 'id': column} for column in DIARY_COLUMNS],
                     style_data={'whiteSpace': 'normal', 'height': 'auto'},
-                    page_action='none',
+                    page_action='custom', page_current=0, page_size=DIARY_PAGE_SIZE,
+                    sort_action='custom', sort_mode='multi', sort_by=[],
+                    filter_action='custom', filter_query='',
                     style_table={'height': '600px', 'overflowY': 'auto'},   # height of the scroll section
                     style_cell_conditional=[
                         {'if': {'column_id': 'Datum'}, 'width': '10%'},
@@ -196,6 +199,7 @@ unit_7 = html.Div([
                              value=2, included=False,
                              id="unit_7_selector_3")],
                   style={'width': "20%"}),
+        html.Progress(id="unit_7_progress", style={'display': 'none'}),   # background callbacks only
         dcc.Graph(id="unit_7_graph_1"),
         instantiate_debug_table(id="unit_7_table_1")
     ], id='unit_7')
@@ -211,6 +215,19 @@ unit_8 = html.Div([
     ], id='unit_8')
 
 
+# LAZY_UNITS (constants.py): units 2-8 on tabs, the content of the open tab is rendered by update_unit_tabs on app.py
+unit_tabs = dcc.Tabs(id='unit_tabs', value='unit_2', children=[
+        dcc.Tab(label=TITLE_UNIT_2, value='unit_2'),
+        dcc.Tab(label=TITLE_UNIT_3, value='unit_3'),
+        dcc.Tab(label=TITLE_UNIT_4, value='unit_4'),
+        dcc.Tab(label=TITLE_UNIT_5, value='unit_5'),
+        dcc.Tab(label=TITLE_UNIT_6, value='unit_6'),
+        dcc.Tab(label=TITLE_UNIT_7, value='unit_7'),
+        dcc.Tab(label=TITLE_UNIT_8, value='unit_8')])
+
+unit_tabs_content = html.Div(id='unit_tabs_content')
+
+
 # Footer
 footer = html.Div([  
         html.Br(), html.Hr(),
@@ -0,0 +1,17 @@
+"""
+The entry point for the WSGI servers in production (app.run on app.py is the development server)
+
+    $ gunicorn --preload --workers 4 --bind 0.0.0.0:8050 wsgi:server
+
+--preload: the app is made and warmed up (see create_server on app.py) once in the master process
+before forking the workers, i.e. they share it (copy-on-write) and start warm.
+The number of workers: about the number of cores (the callbacks are cpu-bound, pandas + plotly).
+
+Note: the caches on caching.py are per worker process unless their *_DIR is set on constants.py
+"""
+
+
+from app import create_server
+
+
+server = create_server()